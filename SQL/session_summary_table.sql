@@ -0,0 +1,7 @@
+CREATE TABLE IF NOT EXISTS session_summary (
+  session_id VARCHAR(64) PRIMARY KEY,
+  summary TEXT NOT NULL,
+  last_message_id INTEGER NOT NULL,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (session_id) REFERENCES CHAT_SESSION(session_id) ON DELETE CASCADE
+);
@@ -1,13 +1,13 @@
 import os
-from flask import Flask, request, jsonify
-from flask import Flask
+import threading
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from app.routes import routes, frontend
 import app.logging_config
 from app.rate_limiter import check_ip_rate_limit
-
-from app.rate_limiter import check_ip_rate_limit
+from app.resilience import start_request_deadline, clear_request_deadline
+from app.tracing import start_trace, clear_trace, current_trace, finish_trace, TRACE_HEADER
+from app.config import TTS_CACHE_ENABLED, TTS_PREWARM_ENABLED
 
 def create_app():
     base_dir = os.path.abspath(os.path.dirname(__file__))
@@ -20,19 +20,17 @@ def create_app():
         static_folder=static_path
     )
 
-    # register the IP rate limit before request processing for API routes
+    # every outbound call made while serving an API request shares one overall deadline and one trace;
+    # registered first so the rate limit checks below are part of the trace
     @app.before_request
-    def before_api_request():
-        # only apply this to API routes
+    def start_request_context():
         if request.path.startswith('/api/v1/'):
-            user_ip = request.remote_addr
-            # still need to get the true client IP from headers like 'X-Forwarded-For':
-            # user_ip = request.headers.get('X-Forwarded-For', request.remote_addr).split(',')[0].strip()
-
-            allowed_ip, ip_retry_after = check_ip_rate_limit(user_ip)
-            if not allowed_ip:
-                return jsonify({"error": f"Too many requests from your IP address. Please try again in {ip_retry_after} seconds."}), 429, {'Retry-After': str(ip_retry_after)}
-
+            start_request_deadline()
+            start_trace(f"{request.method} {request.path}", request.headers.get(TRACE_HEADER))
+        else:
+            # worker threads are reused, so don't let a previous request's deadline or trace leak in
+            clear_request_deadline()
+            clear_trace()
 
     # register the IP rate limit before request processing for API routes
     @app.before_request
@@ -47,15 +45,32 @@ def create_app():
             if not allowed_ip:
                 return jsonify({"error": f"Too many requests from your IP address. Please try again in {ip_retry_after} seconds."}), 429, {'Retry-After': str(ip_retry_after)}
 
+
+    # return the trace id and write the trace once the (possibly streamed) response is finished
+    @app.after_request
+    def attach_trace(response):
+        trace = current_trace()
+        if trace is not None and request.path.startswith('/api/v1/'):
+            trace.root.set("status_code", response.status_code)
+            response.headers[TRACE_HEADER] = trace.trace_id
+            response.call_on_close(lambda: finish_trace(trace))
+        return response
+
     # Enable CORS for WordPress integration
     CORS(app, resources={
         r"/api/*": {
             "origins": ["http://bravurwp.local", "https://bravurwp.local"],
             "methods": ["GET", "POST", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
+            "allow_headers": ["Content-Type", "Authorization", "Last-Event-ID"],
+            "expose_headers": ["X-Trace-Id", "X-Stream-Id"]
         }
     })
 
     app.register_blueprint(routes)
     app.register_blueprint(frontend)
+
+    # synthesize the fixed voice phrases into the TTS cache without delaying startup
+    if TTS_CACHE_ENABLED and TTS_PREWARM_ENABLED:
+        from app.speech import prewarm_tts_cache
+        threading.Thread(target=prewarm_tts_cache, name="tts-prewarm", daemon=True).start()
     return app
@@ -1,15 +1,319 @@
-class AgentConnector:
+import asyncio
+import contextvars
+import inspect
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from app.config import AGENT_DEFAULT_TIMEOUT, AGENT_MAX_WORKERS
+from app.metrics import observe_agent
+from app.resilience import bind_cancellation
+from app.tracing import span
+
+# Messages passed from an agent's producer to the consumer
+_CHUNK, _VALUE, _DONE, _ERROR = "chunk", "value", "done", "error"
+
+
+class AgentError(Exception):
+    """Base class for agent runtime failures."""
+
+
+class AgentNotFoundError(AgentError):
+    pass
+
+
+class AgentTimeoutError(AgentError):
+    pass
+
+
+class AgentBusyError(AgentError):
+    """Raised when an agent is at its concurrency limit for longer than the caller's deadline."""
+
+
+class AgentResult:
+    def __init__(self, agent, output=None, error=None, elapsed=0.0, parts=None):
+        self.agent = agent
+        self.output = output
+        self.error = error
+        self.elapsed = elapsed
+        self.parts = parts  # per-agent results of a merged fan-out
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return f"AgentResult(agent={self.agent!r}, ok={self.ok}, elapsed={self.elapsed:.3f})"
+
+
+class Agent:
+    """A registered handler with its own deadline, concurrency limit and counters."""
+
+    def __init__(self, name, handler, timeout=AGENT_DEFAULT_TIMEOUT, max_concurrency=None):
+        self.name = name
+        self.handler = handler
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self.stats = {"calls": 0, "ok": 0, "errors": 0, "timeouts": 0, "rejected": 0, "cancelled": 0,
+                      "in_flight": 0, "total_seconds": 0.0}
+        self._lock = threading.Lock()
+
+    def record(self, outcome, seconds):
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats[{"ok": "ok", "error": "errors", "timeout": "timeouts", "rejected": "rejected",
+                        "cancelled": "cancelled"}[outcome]] += 1
+            self.stats["total_seconds"] += seconds
+        observe_agent(self.name, outcome, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        completed = stats["calls"] - stats["rejected"]
+        stats["avg_seconds"] = stats.pop("total_seconds") / completed if completed else 0.0
+        stats["timeout"] = self.timeout
+        stats["max_concurrency"] = self.max_concurrency
+        return stats
+
+
+class _EventLoopThread:
+    """One background asyncio loop shared by all async agents."""
+
     def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="agent-asyncio", daemon=True).start()
+            return self._loop
+
+    def run(self, coroutine, cancelled):
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        while True:
+            try:
+                return future.result(timeout=0.1)
+            except FutureTimeoutError:
+                if cancelled.is_set():
+                    future.cancel()
+                    raise AgentTimeoutError("cancelled")
+
+
+class AgentConnector:
+    """
+    Runtime for chat agents. Handlers may be plain functions, generators (streamed chunk by chunk),
+    coroutines or async generators. Each call runs on a shared worker pool under the agent's deadline
+    and concurrency limit, so several agents can be fanned out without adding serial latency.
+    """
+
+    def __init__(self, max_workers=AGENT_MAX_WORKERS):
         self.agents = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent")
+        self._async = _EventLoopThread()
 
-    def register_agent(self, agent_name, handler_function):
-        self.agents[agent_name] = handler_function
+    def register_agent(self, agent_name, handler_function, timeout=AGENT_DEFAULT_TIMEOUT, max_concurrency=None):
+        self.agents[agent_name] = Agent(agent_name, handler_function, timeout, max_concurrency)
 
     def get_agent(self, agent_name):
-        return self.agents.get(agent_name)
+        agent = self.agents.get(agent_name)
+        return agent.handler if agent else None
 
     def process_request(self, agent_name, user_input, session_id=None):
-        agent = self.get_agent(agent_name)
-        if agent:
-            return agent(user_input, session_id)
-        return "Agent not found"
\ No newline at end of file
+        """Run one agent to completion and return its output (kept for existing callers)."""
+        if agent_name not in self.agents:
+            return "Agent not found"
+        result = self.run(agent_name, user_input, session_id)
+        if result.error is not None:
+            raise result.error
+        return result.output
+
+    def _agent(self, agent_name):
+        agent = self.agents.get(agent_name)
+        if agent is None:
+            raise AgentNotFoundError(f"Agent '{agent_name}' is not registered")
+        return agent
+
+    # --- execution ---
+
+    def _produce(self, agent, args, kwargs, out, cancelled):
+        """Runs on a worker thread: drives the handler and forwards its output to `out`."""
+        bind_cancellation(cancelled)  # outbound calls made by the handler stop once the caller gives up
+        try:
+            with span("agent", agent=agent.name):
+                result = agent.handler(*args, **kwargs)
+                if inspect.iscoroutine(result):
+                    out.put((agent.name, _VALUE, self._async.run(result, cancelled)))
+                elif inspect.isasyncgen(result):
+                    self._async.run(self._drain_async(agent.name, result, out, cancelled), cancelled)
+                elif inspect.isgenerator(result):
+                    try:
+                        for chunk in result:
+                            if cancelled.is_set():
+                                break
+                            out.put((agent.name, _CHUNK, chunk))
+                    finally:
+                        result.close()  # also closes upstream LLM streams when the caller gave up
+                else:
+                    out.put((agent.name, _VALUE, result))
+            out.put((agent.name, _DONE, None))
+        except BaseException as e:
+            out.put((agent.name, _ERROR, e))
+        finally:
+            with agent._lock:
+                agent.stats["in_flight"] -= 1
+            if agent.slots is not None:
+                agent.slots.release()
+
+    @staticmethod
+    async def _drain_async(agent_name, generator, out, cancelled):
+        try:
+            async for chunk in generator:
+                if cancelled.is_set():
+                    break
+                out.put((agent_name, _CHUNK, chunk))
+        finally:
+            await generator.aclose()
+
+    def _start(self, agent, args, kwargs, out, deadline):
+        """Take a concurrency slot and start the agent on the pool. Returns its cancel event."""
+        if agent.slots is not None and not agent.slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            agent.record("rejected", 0.0)
+            raise AgentBusyError(f"Agent '{agent.name}' is at its limit of {agent.max_concurrency} concurrent calls")
+        with agent._lock:
+            agent.stats["in_flight"] += 1
+        cancelled = threading.Event()
+        # a copy of the caller's context carries the request trace, deadline and metric labels
+        context = contextvars.copy_context()
+        self._executor.submit(context.run, self._produce, agent, args, kwargs, out, cancelled)
+        return cancelled
+
+    def stream(self, agent_name, *args, timeout=None, **kwargs):
+        """Yield the agent's output as it is produced; raises AgentTimeoutError past the agent's deadline."""
+        agent = self._agent(agent_name)
+        started = time.monotonic()
+        deadline = started + (timeout if timeout is not None else agent.timeout)
+        out = queue.Queue()
+        cancelled = self._start(agent, args, kwargs, out, deadline)
+        outcome = "cancelled"
+        try:
+            while True:
+                try:
+                    _, kind, payload = out.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    outcome = "timeout"
+                    raise AgentTimeoutError(f"Agent '{agent_name}' exceeded its {deadline - started:.1f}s deadline")
+                if kind == _DONE:
+                    outcome = "ok"
+                    return
+                if kind == _ERROR:
+                    outcome = "error"
+                    raise payload
+                yield payload
+        finally:
+            cancelled.set()
+            agent.record(outcome, time.monotonic() - started)
+
+    def run(self, agent_name, *args, timeout=None, **kwargs):
+        """Run one agent to completion. Streamed string chunks are joined; errors are returned, not raised."""
+        started = time.monotonic()
+        try:
+            output = self._collect(self.stream(agent_name, *args, timeout=timeout, **kwargs))
+        except AgentNotFoundError:
+            raise
+        except Exception as e:
+            return AgentResult(agent_name, error=e, elapsed=time.monotonic() - started)
+        return AgentResult(agent_name, output, elapsed=time.monotonic() - started)
+
+    @staticmethod
+    def _collect(chunks):
+        chunks = list(chunks)
+        if len(chunks) == 1 and not isinstance(chunks[0], str):
+            return chunks[0]
+        return "".join(str(chunk) for chunk in chunks)
+
+    def fan_out(self, agent_names, *args, policy="first", timeout=None, merge=None, **kwargs):
+        """
+        Run several agents concurrently on the same input.
+        policy="first": return the first successful, non-empty result and cancel the rest.
+        policy="merge": wait for all (each within its own deadline) and combine the successful outputs
+        with `merge(results)`, by default joining text outputs with blank lines.
+        """
+        if policy not in ("first", "merge"):
+            raise ValueError(f"Unknown fan-out policy '{policy}'")
+        agents = [self._agent(name) for name in agent_names]
+        started = time.monotonic()
+        out = queue.Queue()
+        deadlines, cancel_events, chunks, results = {}, {}, {}, {}
+
+        for agent in agents:
+            deadlines[agent.name] = started + (timeout if timeout is not None else agent.timeout)
+            try:
+                cancel_events[agent.name] = self._start(agent, args, kwargs, out, deadlines[agent.name])
+                chunks[agent.name] = []
+            except AgentBusyError as e:
+                results[agent.name] = AgentResult(agent.name, error=e)
+
+        def finish(agent, outcome, error=None):
+            elapsed = time.monotonic() - started
+            output = self._collect(chunks[agent.name]) if error is None else None
+            results[agent.name] = AgentResult(agent.name, output, error, elapsed)
+            cancel_events[agent.name].set()
+            agent.record(outcome, elapsed)
+
+        by_name = {agent.name: agent for agent in agents}
+        winner = None
+        while len(results) < len(agents) and winner is None:
+            pending = [name for name in cancel_events if name not in results]
+            next_deadline = min(deadlines[name] for name in pending)
+            try:
+                name, kind, payload = out.get(timeout=max(0.0, next_deadline - time.monotonic()))
+            except queue.Empty:
+                now = time.monotonic()
+                for name in pending:
+                    if deadlines[name] <= now:
+                        finish(by_name[name], "timeout", AgentTimeoutError(f"Agent '{name}' exceeded its deadline"))
+                continue
+            if name in results:
+                continue  # output of an agent that already timed out
+            if kind in (_CHUNK, _VALUE):
+                chunks[name].append(payload)
+            elif kind == _ERROR:
+                logging.warning(f"Agent '{name}' failed during fan-out: {payload}")
+                finish(by_name[name], "error", payload)
+            else:
+                finish(by_name[name], "ok")
+                if policy == "first" and results[name].output:
+                    winner = results[name]
+
+        # losers and stragglers are cancelled; their workers stop at the next chunk
+        for name, event in cancel_events.items():
+            if name not in results:
+                event.set()
+                by_name[name].record("cancelled", time.monotonic() - started)
+                results[name] = AgentResult(name, error=AgentError("cancelled"), elapsed=time.monotonic() - started)
+
+        elapsed = time.monotonic() - started
+        ordered = [results[name] for name in agent_names]
+        if policy == "first":
+            if winner is not None:
+                return winner
+            errors = "; ".join(f"{r.agent}: {r.error}" for r in ordered)
+            return AgentResult("+".join(agent_names), error=AgentError(f"No agent produced a result: {errors}"),
+                               elapsed=elapsed, parts=ordered)
+
+        successful = [r for r in ordered if r.ok]
+        if merge is not None:
+            merged = merge(successful)
+        else:
+            merged = "\n\n".join(str(r.output) for r in successful if r.output)
+        error = None if successful else AgentError("All agents failed")
+        return AgentResult("+".join(agent_names), merged, error, elapsed, parts=ordered)
+
+    def stats(self):
+        return {name: agent.snapshot() for name, agent in self.agents.items()}
@@ -0,0 +1,59 @@
+# app/audio_store.py
+import logging
+import os
+import re
+import secrets
+import shutil
+import time
+
+from app.config import STS_AUDIO_DIR, STS_AUDIO_TTL_SECONDS
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{16,64}\.[a-z0-9]{2,5}$")
+
+
+class AudioFileStore:
+    """
+    Reply audio kept on disk for a few minutes under an unguessable name, so /sts can hand out a URL
+    (served with Content-Length and Range support) instead of inlining the audio as base64.
+    """
+
+    def __init__(self, directory=STS_AUDIO_DIR, ttl_seconds=STS_AUDIO_TTL_SECONDS):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+
+    def adopt(self, path, extension):
+        """Move the file at `path` into the store; returns its name."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._sweep()
+        name = f"{secrets.token_urlsafe(18)}.{extension}"
+        shutil.move(path, os.path.join(self.directory, name))  # a rename when on the same filesystem
+        return name
+
+    def path(self, name):
+        """Path of a stored file that has not expired, or None."""
+        if not _NAME_PATTERN.match(name or ""):
+            return None
+        path = os.path.join(self.directory, name)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                return None
+        except OSError:
+            return None
+        return path
+
+    def _sweep(self):
+        cutoff = time.time() - self.ttl_seconds
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError as e:
+                logging.debug(f"Could not remove expired audio {name}: {e}")
+
+
+sts_audio_store = AudioFileStore()
@@ -0,0 +1,219 @@
+# app/bm25_index.py
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9À-ɏ]+")
+
+STOPWORDS = {
+    "en": frozenset("""
+        a an and are as at be been but by can do does for from has have how i if in into is it its me my no not
+        of on or our so such that the their them then there these they this to us was we what when where which
+        who why will with you your
+    """.split()),
+    "nl": frozenset("""
+        aan al als bij dan dat de deze die dit door een en er het hij hoe ik in is je jij kan kun kunt maar me
+        met mijn naar niet nog of om onder ons ook op over te tot u uit uw van voor waar wat we welke wie wij
+        worden wordt zijn zo
+    """.split()),
+}
+
+TITLE_WEIGHT = 2  # title terms count as if they appeared twice
+
+
+def _stem_en(token):
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        token = token[:-1]
+    for suffix in ("ing", "ed", "ly"):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)]
+            break
+    return token[:-1] if len(token) > 4 and token.endswith("e") else token
+
+
+def _stem_nl(token):
+    if token.endswith("heden") and len(token) > 7:
+        return token[:-5] + "heid"
+    for suffix in ("tjes", "tje", "jes", "je", "en", "es", "s", "e"):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)]
+            break
+    if len(token) > 3 and token[-1] == token[-2] and token[-1] not in "aeiou":
+        token = token[:-1]  # bakken -> bakk -> bak
+    return token
+
+
+STEMMERS = {"en": _stem_en, "nl": _stem_nl}
+
+
+def language_code(language):
+    """'nl-NL' -> 'nl'; anything else is analyzed as English."""
+    return "nl" if (language or "").lower().startswith("nl") else "en"
+
+
+def detect_language(text):
+    """Guess 'en' or 'nl' for a document from its stopwords."""
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    dutch = sum(t in STOPWORDS["nl"] for t in tokens)
+    english = sum(t in STOPWORDS["en"] for t in tokens)
+    return "nl" if dutch > english else "en"
+
+
+def analyze(text, language="en"):
+    stopwords, stem = STOPWORDS[language], STEMMERS[language]
+    return [stem(t) for t in _TOKEN_PATTERN.findall((text or "").lower()) if t not in stopwords]
+
+
+class BM25Index:
+    """
+    In-memory BM25 index over (title, content) documents, keyed by entry_id.
+    Postings are per-term arrays of document ordinals and term frequencies. Updating a document
+    tombstones its old ordinal and appends a new one; the arrays are compacted once a quarter of
+    the ordinals are dead.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._postings = {}  # term -> (array of ordinals, array of term frequencies)
+        self._df = Counter()  # live documents per term
+        self._lengths = array("I")
+        self._live = bytearray()
+        self._doc_terms = []  # ordinal -> terms, to keep df right on removal
+        self._entry_ids = []
+        self._ordinals = {}  # entry_id -> live ordinal
+        self._rows = {}  # entry_id -> (title, content)
+        self._total_length = 0
+        self.version = getattr(self, "version", 0) + 1  # bumped on every change, for derived indexes
+
+    def __len__(self):
+        return len(self._ordinals)
+
+    def __contains__(self, entry_id):
+        return entry_id in self._ordinals
+
+    def upsert(self, entry_id, title, content):
+        text = f"{title or ''}\n{content or ''}"
+        language = detect_language(text)
+        terms = Counter(analyze(content, language))
+        for term in analyze(title, language):
+            terms[term] += TITLE_WEIGHT
+        with self._lock:
+            self._remove(entry_id)
+            ordinal = len(self._entry_ids)
+            length = sum(terms.values())
+            for term, tf in terms.items():
+                docs, tfs = self._postings.setdefault(term, (array("I"), array("I")))
+                docs.append(ordinal)
+                tfs.append(tf)
+                self._df[term] += 1
+            self._lengths.append(length)
+            self._live.append(1)
+            self._doc_terms.append(tuple(terms))
+            self._entry_ids.append(entry_id)
+            self._ordinals[entry_id] = ordinal
+            self._rows[entry_id] = (title, content)
+            self._total_length += length
+            self.version += 1
+            self._maybe_compact()
+
+    def remove(self, entry_id):
+        with self._lock:
+            self._remove(entry_id)
+            self._maybe_compact()
+
+    def _remove(self, entry_id):
+        ordinal = self._ordinals.pop(entry_id, None)
+        if ordinal is None:
+            return
+        self._live[ordinal] = 0
+        self._total_length -= self._lengths[ordinal]
+        for term in self._doc_terms[ordinal]:
+            self._df[term] -= 1
+        del self._rows[entry_id]
+        self.version += 1
+
+    def documents(self):
+        """Snapshot of the indexed (entry_id, title, content) rows."""
+        with self._lock:
+            return [(entry_id, title, content) for entry_id, (title, content) in self._rows.items()]
+
+    def _maybe_compact(self):
+        if len(self._entry_ids) > 32 and len(self._ordinals) < 0.75 * len(self._entry_ids):
+            self._compact()
+
+    def _compact(self):
+        rows = [(entry_id, *self._rows[entry_id]) for entry_id in sorted(self._ordinals, key=self._ordinals.get)]
+        self._reset()
+        for entry_id, title, content in rows:
+            self.upsert(entry_id, title, content)
+
+    def sync(self, changed_rows, live_ids):
+        """Apply a refresh: (entry_id, title, content) rows that changed, and the ids that still exist."""
+        live_ids = set(live_ids)
+        with self._lock:
+            for entry_id in [e for e in self._ordinals if e not in live_ids]:
+                self.remove(entry_id)
+            for entry_id, title, content in changed_rows:
+                self.upsert(entry_id, title, content)
+
+    def _query_terms(self, query, language):
+        # Analyze with the conversation language first, then the other one: documents are stemmed with their own
+        terms = analyze(query, language_code(language))
+        for other in STEMMERS:
+            if other != language_code(language):
+                terms.extend(analyze(query, other))
+        return set(terms)
+
+    def scores(self, query, language="en-US"):
+        """BM25 score per entry_id for every live document matching at least one query term."""
+        with self._lock:
+            count = len(self._ordinals)
+            if not count:
+                return {}
+            avg_length = self._total_length / count or 1.0
+            k1, b = self.k1, self.b
+            accumulated = {}
+            for term in self._query_terms(query, language):
+                df = self._df.get(term, 0)
+                if not df:
+                    continue
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                docs, tfs = self._postings[term]
+                for ordinal, tf in zip(docs, tfs):
+                    if self._live[ordinal]:
+                        norm = k1 * (1 - b + b * self._lengths[ordinal] / avg_length)
+                        accumulated[ordinal] = accumulated.get(ordinal, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+            return {self._entry_ids[ordinal]: score for ordinal, score in accumulated.items()}
+
+    def search(self, query, top_k=5, language="en-US"):
+        """Top matches as (entry_id, title, content, score) rows, the same shape as the database searches."""
+        ranked = sorted(self.scores(query, language).items(), key=lambda item: -item[1])[:top_k]
+        with self._lock:
+            return [(entry_id, *self._rows[entry_id], score) for entry_id, score in ranked if entry_id in self._rows]
+
+    def rerank(self, query, rows, top_k=None, language="en-US", rrf_k=60):
+        """
+        Re-order vector search rows by reciprocal rank fusion of their vector rank and BM25 rank.
+        Rows keep their original shape; rows without any query term keep only their vector rank.
+        """
+        scores = self.scores(query, language)
+        lexical = {entry_id: rank for rank, entry_id in
+                   enumerate(sorted((r[0] for r in rows if r[0] in scores), key=lambda e: -scores[e]))}
+        fused = []
+        for vector_rank, row in enumerate(rows):
+            score = 1 / (rrf_k + vector_rank)
+            if row[0] in lexical:
+                score += 1 / (rrf_k + lexical[row[0]])
+            fused.append((score, -vector_rank, row))
+        fused.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        ranked = [row for _, _, row in fused]
+        return ranked[:top_k] if top_k else ranked
@@ -1,33 +1,46 @@
 # app/chatbot.py
+import contextvars
 import logging
 import re
 import json
 import threading
 import random  # From develop
 import textwrap  # From develop
+from collections import Counter
 from functools import lru_cache
 from hashlib import sha256
 from app.database import is_session_expired
 
-from groq import Groq
-from openai import OpenAI
-from fuzzywuzzy import fuzz
 from flask import session
 from app.agentConnector import AgentConnector
+from app.singleflight import SingleFlight
+from app.sse import StatusChunk
+from app.resilience import raise_if_cancelled
 
-from app.config import OPENAI_API_KEY, GROQ_API_KEY
 from app.database import (
     get_session_messages, store_message,
-    hybrid_search,
-    embed_query
+    hybrid_search
 )
 from app.web import search_web
+from app.config import (
+    CONTEXT_COMPRESSION_ENABLED, RAG_SOURCE_TOKEN_BUDGET, WEB_SOURCE_TOKEN_BUDGET,
+    FAQ_FAST_PATH_ENABLED, CHAT_COALESCE_ENABLED
+)
+from app.context_budget import (
+    count_tokens, count_message_tokens, pack_messages, history_budget,
+    format_session_messages, update_session_summary
+)
+from app.database import get_session_summary
+from app.text_features import TextMatcher
 
-# Initialize OpenAI client (for RAG response generation with GPT-4o Mini & embeddings via database.py)
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
-
-# Initialize Groq client (for fast intent classification & potentially IT Trends responses)
-groq_client = Groq(api_key=GROQ_API_KEY)
+# OpenAI (RAG response generation with GPT-4o Mini) and Groq (fast intent classification & IT Trends responses)
+# are reached through the gateway, which fails over and hedges between the two providers.
+from app.llm_providers import openai_client, groq_client
+from app.model_router import model_router
+from app.context_compression import compress_sources
+from app.faq_index import match_faq, normalize_question
+from app.metrics import chat_turn, stage_timer, set_intent, set_response_path
+from app.tracing import annotate_trace
 
 
 # --- Constants & Helpers ---
@@ -43,8 +56,50 @@ CONTEXTUAL_CUES_KEYWORDS = [
     "what about", "tell me more", "can you elaborate", "and about", "so about", "then about"
 ]
 
-# Session-based message tracking for variety
-session_unknown_messages = {}
+LAST_QUESTION_PROMPTS = ["what was my last question", "my previous question", "what did I ask before",
+                         "tell me my last question"]
+LAST_ANSWER_PROMPTS = ["your last answer", "what you said before"]
+SUMMARIZE_PROMPTS = ["summarize our talk", "recap this"]
+
+# Single words must match as whole words ("it" in "with" is no cue); phrases are matched as text
+CONTEXTUAL_CUE_WORDS = {cue for cue in CONTEXTUAL_CUES_KEYWORDS if " " not in cue}
+
+STRONG_CONTEXTUAL_PHRASES = ["more about that", "about that point", "the first one", "the second one",
+                             "the third one", "what about it", "and that"]
+
+GRATITUDE_QUESTION_PHRASES = ["how to say", "considered too casual", "thank you note",
+                              "thank-you email", "example of", "is thank", "best way to say"]
+GRATITUDE_EXAMPLES = ["thank you", "thanks", "thanks a lot", "much appreciated",
+                      "i appreciate it", "really appreciate your help",
+                      "i'm grateful", "thank u"]
+
+ANGRY_KEYWORDS = ["stupid", "hate", "idiot", "angry", "mad", "annoyed", "wtf", "useless", "terrible", "awful",
+                  "disappointed"]
+HAPPY_KEYWORDS = ["love", "great", "awesome", "thanks", "cool", "nice", "amazing", "perfect", "excellent"]
+
+# Compiled once: every branch of a turn reads the same per-request TextFeatures
+text_matcher = TextMatcher(
+    phrase_groups={
+        "strong_contextual": STRONG_CONTEXTUAL_PHRASES,
+        "contextual": [cue for cue in CONTEXTUAL_CUES_KEYWORDS if " " in cue],
+        "gratitude_question": GRATITUDE_QUESTION_PHRASES,
+        "angry": ANGRY_KEYWORDS,
+        "happy": HAPPY_KEYWORDS,
+        "mckinsey": ["mckinsey"],
+        "gartner": ["gartner"],
+    },
+    fuzzy_groups={
+        "memory": MEMORY_PROMPTS_KEYWORDS,
+        "last_question": LAST_QUESTION_PROMPTS,
+        "last_answer": LAST_ANSWER_PROMPTS,
+        "summarize": SUMMARIZE_PROMPTS,
+        "gratitude": GRATITUDE_EXAMPLES,
+    },
+    stripped_groups=("gratitude",)
+)
+
+# Session-based message tracking for variety lives in a bounded store (Redis or in-process LRU+TTL)
+from app.session_state import session_state_store
 
 # Pool of randomized unknown intent messages
 UNKNOWN_INTENT_MESSAGES = {
@@ -82,10 +137,47 @@ UNKNOWN_SUPPORT_ENDINGS = {
     ]
 }
 
+# Fixed replies: (contact details, closing line); the session ID suffix goes in between
+HUMAN_SUPPORT_REPLIES = {
+    "en-US": ("You can reach our human support team on WhatsApp at +31 6 12345678 or by email at support@bravur.com.",
+              " How can I help in the meantime? 😊"),
+    "nl-NL": ("Natuurlijk! Je kunt ons menselijke supportteam bereiken via WhatsApp op +31 6 12345678 of per e-mail "
+              "op support@bravur.com.",
+              " Hoe kan ik je ondertussen helpen? 😊")
+}
+
+POSITIVE_ACKNOWLEDGMENT_REPLIES = {
+    "en-US": "Glad you liked that! 😊 Let me know if you have more questions.",
+    "nl-NL": "Fijn dat je dat goed vond! 😊 Laat het me weten als je meer vragen hebt."
+}
+
+FRUSTRATION_REPLIES = {
+    "en-US": ("I'm sorry that wasn't helpful. 😔 I'm here to assist you — could you tell me more "
+              "so I can improve the answer or connect you with support?"),
+    "nl-NL": ("Het spijt me dat dat niet hielp. 😔 Ik ben hier om je te helpen — kun je me meer vertellen "
+              "zodat ik het antwoord kan verbeteren of je kan doorverbinden met support?")
+}
+
+
+def static_reply_phrases(language="en-US"):
+    """Every fixed reply fragment for `language` (pre-synthesized for the voice endpoint)."""
+    lang_code = language if language in UNKNOWN_INTENT_MESSAGES else "en-US"
+    return [*UNKNOWN_INTENT_MESSAGES[lang_code], *UNKNOWN_SUPPORT_ENDINGS[lang_code],
+            *HUMAN_SUPPORT_REPLIES[lang_code], POSITIVE_ACKNOWLEDGMENT_REPLIES[lang_code],
+            FRUSTRATION_REPLIES[lang_code]]
+
+
+# Set inside a pipeline run shared by identical concurrent turns of different sessions (see stream_chat_turn)
+_shared_run = contextvars.ContextVar("shared_run", default=False)
+# Stands in for the session ID mention in a shared run; each subscriber swaps in its own
+SESSION_SUFFIX_MARKER = "\ue000session-id\ue000"
+
 
 # Session ID suffix for human support jokes
 def get_session_id_suffix(session_id: str, language: str = "en-US") -> str:
     """Generate session ID mention for human support contact in the correct language, truncated to first 6 characters."""
+    if _shared_run.get():
+        return SESSION_SUFFIX_MARKER
     if not session_id or session_id == "default":
         return ""
 
@@ -108,51 +200,29 @@ def get_random_unknown_message(session_id: str, language: str = "en-US") -> str:
     lang_code = language if language in UNKNOWN_INTENT_MESSAGES else "en-US"
     logging.debug(f"get_random_unknown_message called with language: {language}, resolved to lang_code: {lang_code}")
 
-    # Ensure session_id structure exists
-    if session_id not in session_unknown_messages:
-        session_unknown_messages[session_id] = {}
-
-    # Ensure language-specific structure exists within the session
-    if lang_code not in session_unknown_messages[session_id]:
-        session_unknown_messages[session_id][lang_code] = {
-            'unused_messages': UNKNOWN_INTENT_MESSAGES[lang_code].copy(),
-            'unused_support_endings': UNKNOWN_SUPPORT_ENDINGS[lang_code].copy()
-        }
-
-    session_lang_data = session_unknown_messages[session_id][lang_code]
-
-    # If we've used all messages for this language, reset its pool
-    if not session_lang_data['unused_messages']:
-        logging.debug(f"Resetting unused messages for session {session_id}, lang {lang_code}")
-        session_lang_data['unused_messages'] = UNKNOWN_INTENT_MESSAGES[lang_code].copy()
-
-    # If we've used all support endings for this language, reset its pool
-    if not session_lang_data['unused_support_endings']:
-        logging.debug(f"Resetting unused support endings for session {session_id}, lang {lang_code}")
-        session_lang_data['unused_support_endings'] = UNKNOWN_SUPPORT_ENDINGS[lang_code].copy()
-
-    # Randomly select from unused messages and jokes for the current language
-    selected_message = random.choice(session_lang_data['unused_messages'])
-    selected_support_ending = random.choice(session_lang_data['unused_support_endings'])  # Changed from selected_joke
-
-    # Remove selected items from unused pools for the current language
-    try:
-        session_lang_data['unused_messages'].remove(selected_message)
-    except ValueError:  # Should not happen if reset logic is correct, but good for safety
-        logging.warning(
-            f"Could not remove selected_message for session {session_id}, lang {lang_code}. Pool might have been reset.")
-        session_lang_data['unused_messages'] = UNKNOWN_INTENT_MESSAGES[lang_code].copy()
-        if selected_message in session_lang_data['unused_messages']:
-            session_lang_data['unused_messages'].remove(selected_message)
-
-    try:
-        session_lang_data['unused_support_endings'].remove(selected_support_ending)
-    except ValueError:
-        logging.warning(
-            f"Could not remove selected_support_ending for session {session_id}, lang {lang_code}. Pool might have been reset.")
-        session_lang_data['unused_support_endings'] = UNKNOWN_SUPPORT_ENDINGS[lang_code].copy()  # Force reset
-        if selected_support_ending in session_lang_data['unused_support_endings']:
-            session_lang_data['unused_support_endings'].remove(selected_support_ending)
+    # Per-language pools are stored compactly as the indices not used yet in this session
+    state_key, state = load_variety_state(session_id)
+    session_lang_data = state.setdefault("unknown", {}).setdefault(lang_code, {})
+
+    # If we've used all messages or support endings for this language, reset that pool
+    message_count = len(UNKNOWN_INTENT_MESSAGES[lang_code])
+    support_ending_count = len(UNKNOWN_SUPPORT_ENDINGS[lang_code])
+    unused_messages = [i for i in session_lang_data.get("m", []) if i < message_count] or list(range(message_count))
+    unused_support_endings = [i for i in session_lang_data.get("e", []) if i < support_ending_count] or \
+        list(range(support_ending_count))
+
+    # Randomly select from unused messages and endings for the current language, then remove them from the pools
+    message_index = random.choice(unused_messages)
+    support_ending_index = random.choice(unused_support_endings)
+    unused_messages.remove(message_index)
+    unused_support_endings.remove(support_ending_index)
+    session_lang_data["m"] = unused_messages
+    session_lang_data["e"] = unused_support_endings
+    if state_key is not None:
+        session_state_store.save(state_key, state)
+
+    selected_message = UNKNOWN_INTENT_MESSAGES[lang_code][message_index]
+    selected_support_ending = UNKNOWN_SUPPORT_ENDINGS[lang_code][support_ending_index]
 
     # Add session ID suffix if session exists, using the correct language
     session_suffix = get_session_id_suffix(session_id, lang_code)
@@ -162,6 +232,14 @@ def get_random_unknown_message(session_id: str, language: str = "en-US") -> str:
     return final_message
 
 
+def load_variety_state(session_id):
+    """(key, state) of a session's variety pools; a shared run gets a throwaway state and a None key."""
+    if _shared_run.get():
+        return None, {}
+    state_key = session_id or "default"
+    return state_key, session_state_store.load(state_key)
+
+
 def log_async(fn, *args):
     threading.Thread(target=fn, args=args).start()
 
@@ -170,57 +248,84 @@ def strip_html_paragraphs(text):
     return re.sub(r"^<p>(.*?)</p>$", r"\1", text.strip(), flags=re.DOTALL)
 
 
-def estimate_tokens(text):
-    return max(1, int(len(text.split()) * 0.75))
+# --- compress_retrieved: query-relevant sentences of RAG documents and web snippets ---
+def compress_retrieved(query, texts, budget_per_source, model=None, fallback_words=None):
+    """
+    Cut retrieved documents/snippets down to the sentences most relevant to the query. With compression
+    disabled the texts pass through whole, or cut to their first `fallback_words` words if given.
+    """
+    if not CONTEXT_COMPRESSION_ENABLED:
+        if fallback_words is None:
+            return list(texts)
+        return [' '.join(text.split()[:fallback_words]) + "..." if len(text.split()) > fallback_words else text
+                for text in texts]
+    with stage_timer("context_compression", sources=len(texts)) as current:
+        compressed = compress_sources(query, texts, budget_per_source, model)
+        current.set("tokens_out", sum(count_tokens(t, model) for t in compressed))
+    return compressed
 
 
 # --- get_recent_conversation: (includes latest_language_message logic) ---
-def get_recent_conversation(session_id, max_tokens=400):
+def get_recent_conversation(session_id, max_tokens=None, model=None, language="en-US", fixed_messages=()):
+    """
+    Pack the newest turns into `max_tokens` exact model tokens (by default what the model's context
+    leaves after `fixed_messages`). Older turns are represented by the session's rolling summary,
+    which is brought up to date in the background.
+    """
     latest_language_message = None  # From develop
     if not session_id: return []
-
-    messages = get_session_messages(session_id)
-    formatted = []
-    for _, content, _, msg_type in messages:
-        if msg_type == "user":
-            formatted.append({"role": "user", "content": content})
-        elif msg_type == "bot":
-            formatted.append({"role": "assistant", "content": content})
-        elif msg_type == "system":
-            formatted.append({"role": "system", "content": content})
-            # Check if this system message is the language change one from develop
-            if "[SYSTEM] Language changed" in content:
-                latest_language_message = {"role": "system", "content": content}
-
-    total_tokens = 0
-    selected = []
-    for msg in reversed(formatted):
-        tokens = estimate_tokens(msg["content"])
-        if total_tokens + tokens > max_tokens: break
-        selected.insert(0, msg)
-        total_tokens += tokens
-
+    if max_tokens is None:
+        max_tokens = history_budget(model, fixed_messages)
+
+    formatted = format_session_messages(get_session_messages(session_id))
+    for msg in formatted:
+        # Check if this system message is the language change one from develop
+        if msg["role"] == "system" and "[SYSTEM] Language changed" in msg["content"]:
+            latest_language_message = {"role": "system", "content": msg["content"]}
+
+    selected, dropped = pack_messages(formatted, max_tokens, model)
+    summary_message = None
+    if dropped:
+        summary, last_summarized_id = get_session_summary(session_id)
+        if summary:
+            summary_message = {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+            summary_tokens = count_message_tokens([summary_message], model)
+            selected, dropped = pack_messages(formatted, max(0, max_tokens - summary_tokens), model)
+        if dropped[-1]["id"] > last_summarized_id:
+            log_async(update_session_summary, session_id, language, dropped[-1]["id"], formatted)
+
+    selected = [{"role": msg["role"], "content": msg["content"]} for msg in selected]
     # Inject language message if it exists and isn't already the first system message
     if latest_language_message:
         selected = [msg for msg in selected if latest_language_message["content"] not in msg.get("content", "")]
         selected.insert(0, latest_language_message)
+    if summary_message:
+        selected.insert(0, summary_message)
 
-    logging.debug(f"get_recent_conversation (session {session_id}, {len(selected)} msgs, ~{total_tokens} tokens)")
+    logging.debug(f"get_recent_conversation (session {session_id}, {len(selected)} msgs, "
+                  f"{count_message_tokens(selected, model)} tokens, {len(dropped)} summarized)")
     return selected
 
 
+# --- has_contextual_cues: any reference back to the conversation (CONTEXTUAL_CUES_KEYWORDS or a strong cue) ---
+def has_contextual_cues(user_input: str, features=None) -> bool:
+    features = features or text_matcher.analyze(user_input)
+    if features.has_phrase("contextual") or has_strong_contextual_cues(user_input, features):
+        return True
+    return any(word in CONTEXTUAL_CUE_WORDS for word in re.findall(r"[a-z']+", features.lower))
+
+
 # --- has_strong_contextual_cues ---
-def has_strong_contextual_cues(user_input: str) -> bool:
-    text_lower = user_input.lower()
-    if any(fuzz.partial_ratio(text_lower, prompt) > 85 for prompt in MEMORY_PROMPTS_KEYWORDS):
+def has_strong_contextual_cues(user_input: str, features=None) -> bool:
+    features = features or text_matcher.analyze(user_input)
+    text_lower = features.lower
+    if features.fuzzy_match("memory", 85):
         logging.debug(f"Strong Contextual Cue: Matched explicit memory prompt in '{user_input}'")
         return True
-    if any(phrase in text_lower for phrase in
-           ["more about that", "about that point", "the first one", "the second one", "the third one", "what about it",
-            "and that"]):
+    if features.has_phrase("strong_contextual"):
         logging.debug(f"Strong Contextual Cue: Matched phrase in '{user_input}'")
         return True
-    words = text_lower.split()
+    words = features.words
     if len(words) <= 3 and any(
             pronoun in words for pronoun in ["that", "it", "this", "those", "them"]) and not text_lower.startswith(
         ("what is", "what are")):
@@ -231,12 +336,13 @@ def has_strong_contextual_cues(user_input: str) -> bool:
 
 
 # --- STAGE 1: INITIAL STATELESS INTENT CLASSIFIER (using Groq) ---
-def initial_classify_intent(user_input: str, language: str = "en-US") -> str:
-    if is_gratitude_expression(user_input):
+def initial_classify_intent(user_input: str, language: str = "en-US", features=None) -> str:
+    features = features or text_matcher.analyze(user_input)
+    if is_gratitude_expression(user_input, features):
         logging.info(f"Fast classification: Gratitude detected in '{user_input}'")
         return "Gratitude"
 
-    mood = detect_mood(user_input)
+    mood = detect_mood(user_input, features)
     if mood == "happy" and len(user_input.split()) <= 4:
         logging.info(f"Fast classification: Positive Acknowledgment detected in '{user_input}'")
         return "Positive Acknowledgment"
@@ -279,14 +385,14 @@ User Query (in {language_name}): "{user_input}"
 Strictly respond with ONLY one category name from the list above.
 Classified Intent:"""
     try:
-        classification_model = "llama-3.3-70b-versatile"
+        classification_route = model_router.route("classify")
 
-        logging.info(f"INITIAL CLASSIFICATION for: '{user_input}' using model {classification_model}")
-        chat_completion = groq_client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt_content}],
-            model=classification_model, temperature=0.0, max_tokens=30
+        logging.info(f"INITIAL CLASSIFICATION for: '{user_input}' using model {classification_route[1]}")
+        llm_response = model_router.complete(
+            "classify", [{"role": "user", "content": prompt_content}], temperature=0.0, max_tokens=30,
+            route=classification_route
         )
-        llm_response = chat_completion.choices[0].message.content.strip().replace("'", "").replace('"', '')
+        llm_response = llm_response.strip().replace("'", "").replace('"', '')
         logging.info(f"INITIAL LLM raw response: '{llm_response}'")
         if llm_response in intent_categories_initial:
             logging.info(f"INITIAL classified intent as: '{llm_response}'")
@@ -299,17 +405,16 @@ Classified Intent:"""
 
 
 # --- STAGE 2: CONTEXTUAL RESOLUTION / META QUESTION HANDLER:
-def resolve_contextual_query(user_input: str, recent_convo: list, session_id: str, language: str = "en-US"):
+def resolve_contextual_query(user_input: str, recent_convo: list, session_id: str, language: str = "en-US",
+                             features=None):
 
     language_name = "Dutch" if language == "nl-NL" else "English"
-    lower_user_input = user_input.lower()
+    features = features or text_matcher.analyze(user_input)
 
-    if any(fuzz.partial_ratio(lower_user_input, prompt) > 80 for prompt in MEMORY_PROMPTS_KEYWORDS):
+    if features.fuzzy_match("memory", 80):
         logging.info(f"CONTEXTUAL RESOLUTION: Handling explicit memory prompt: '{user_input}'")
         # Last Question
-        if any(fuzz.partial_ratio(lower_user_input, p) > 80 for p in
-               ["what was my last question", "my previous question", "what did I ask before",
-                "tell me my last question"]):
+        if features.fuzzy_match("last_question", 80):
             user_qs = [m['content'] for m in recent_convo if m['role'] == 'user']
             if len(user_qs) > 1:
                 if language == "nl-NL":
@@ -322,25 +427,19 @@ def resolve_contextual_query(user_input: str, recent_convo: list, session_id: st
             else:
                 return {"type": "direct_answer", "content": "Hmm, I couldn't find your previous question."}
         # Last Answer
-        if any(fuzz.partial_ratio(lower_user_input, p) > 80 for p in ["your last answer", "what you said before"]):
+        if features.fuzzy_match("last_answer", 80):
             for msg in reversed(recent_convo):
                 if msg['role'] == 'assistant': return {"type": "direct_answer",
                                                        "content": f"My last reply was: \"{msg['content']}\""}
             return {"type": "direct_answer", "content": "I couldn't recall what I said last time."}
-        # Summarize
-        if any(fuzz.partial_ratio(lower_user_input, p) > 80 for p in ["summarize our talk", "recap this"]):
-            summary_prompt_messages = [{"role": "system",
-                                        "content": f"Give a short and friendly summary of this conversation about Bravur/IT in {language_name}."}] + recent_convo
-            try:
-                completion = groq_client.chat.completions.create(messages=summary_prompt_messages,
-                                                                 model="llama-3.3-70b-versatile", temperature=0.5,
-                                                                 max_tokens=200)
-                summary = completion.choices[0].message.content.strip()
+        # Summarize: answered from the stored rolling summary, folding in only the turns it doesn't cover yet
+        if features.fuzzy_match("summarize", 80):
+            # the user is waiting for this one, so it runs as an interactive stage (not background "summarize")
+            summary = update_session_summary(session_id, language, stage="summarize_reply")
+            if summary:
                 return {"type": "direct_answer", "content": f"Here's a friendly summary of our chat: 😊\n{summary}"}
-            except Exception as e:
-                logging.error(f"Summarization error: {e}");
-                return {"type": "refined_intent", "intent": "Unknown",
-                        "query": user_input}
+            logging.error(f"Summarization error: no summary available for session {session_id}")
+            return {"type": "refined_intent", "intent": "Unknown", "query": user_input}
         logging.info(f"Memory prompt '{user_input}' not directly handled by simple checks, attempting LLM refinement.")
 
     # LLM for general contextual refinement
@@ -366,11 +465,12 @@ Your Task: Based on the Conversation History and the User's Current Query, decid
 Strictly respond with ONLY one category name: Company Info, IT Trends, Human Support Service Request, Unknown.
 Refined Intent:"""
     try:
-        model = "llama-3.3-70b-versatile"
-        logging.info(f"CONTEXTUAL REFINEMENT (LLM Pass) for: '{user_input}' using model {model}")
-        completion = groq_client.chat.completions.create(
-            messages=[{"role": "user", "content": refinement_prompt}], model=model, temperature=0.0, max_tokens=30)
-        llm_response = completion.choices[0].message.content.strip().replace("'", "").replace('"', '')
+        refine_route = model_router.route("refine")
+        logging.info(f"CONTEXTUAL REFINEMENT (LLM Pass) for: '{user_input}' using model {refine_route[1]}")
+        llm_response = model_router.complete(
+            "refine", [{"role": "user", "content": refinement_prompt}], temperature=0.0, max_tokens=30,
+            route=refine_route)
+        llm_response = llm_response.strip().replace("'", "").replace('"', '')
         logging.info(f"CONTEXTUAL REFINEMENT LLM raw response: '{llm_response}'")
         if llm_response in intent_categories_refined:
             logging.info(f"CONTEXTUAL REFINEMENT successfully refined intent to: '{llm_response}'")
@@ -384,38 +484,21 @@ Refined Intent:"""
 
 
 # --- Helper functions for tone/formatting ---
-def detect_mood(user_input: str) -> str:
-    angry_keywords = ["stupid", "hate", "idiot", "angry", "mad", "annoyed", "wtf", "useless", "terrible", "awful", "disappointed"]
-    happy_keywords = ["love", "great", "awesome", "thanks", "cool", "nice", "amazing", "perfect", "excellent"]
-    input_lower = user_input.lower()
-    if any(word in input_lower for word in angry_keywords): return "angry"
-    if any(word in input_lower for word in happy_keywords): return "happy"
+def detect_mood(user_input: str, features=None) -> str:
+    features = features or text_matcher.analyze(user_input)
+    if features.has_phrase("angry"): return "angry"
+    if features.has_phrase("happy"): return "happy"
     return "neutral"
 
-def is_gratitude_expression(user_input: str) -> bool:
-    text = user_input.lower().strip()
+def is_gratitude_expression(user_input: str, features=None) -> bool:
+    features = features or text_matcher.analyze(user_input)
 
     # Block if it's clearly a question about gratitude
-    if text.endswith("?") or any(
-            phrase in text for phrase in [
-                "how to say", "considered too casual", "thank you note",
-                "thank-you email", "example of", "is thank", "best way to say"
-            ]
-    ):
+    if features.stripped.endswith("?") or features.has_phrase("gratitude_question"):
         return False
 
     # Fuzzy match common gratitude intent templates
-    gratitude_examples = [
-        "thank you", "thanks", "thanks a lot", "much appreciated",
-        "i appreciate it", "really appreciate your help",
-        "i'm grateful", "thank u"
-    ]
-
-    for example in gratitude_examples:
-        if fuzz.partial_ratio(text, example) > 85:
-            return True
-
-    return False
+    return features.fuzzy_match("gratitude", 85)
 
 def clean_and_clip_reply(reply, max_sentences=3, max_chars=300):  # Increased limits slightly
     # Remove duplicate consecutive phrases/lines robustly
@@ -444,9 +527,30 @@ def clean_and_clip_reply(reply, max_sentences=3, max_chars=300):  # Increased li
     return final_clipped.strip() if final_clipped else "I'm not sure how to respond to that, but I'm here to help with Bravur topics!"
 
 
+def coalescing_key(user_input, session_id, language):
+    """
+    Key under which identical concurrent turns may share one pipeline run, or None if the turn needs
+    its own session's state. Turns with any contextual cue refer back to their conversation and are
+    never shared. Decided from the text alone, so it costs no database lookups.
+    """
+    if not CHAT_COALESCE_ENABLED or not session_id:
+        return None
+    if has_contextual_cues(user_input):
+        return None
+    normalized = normalize_question(user_input)
+    return (normalized, language) if normalized else None
+
+
+def format_faq_answer(faq):
+    """An FAQ row's content as a reply, cited like the RAG answers."""
+    return f"{clean_and_clip_reply(faq.content, max_sentences=4, max_chars=450)} (Row ID: {faq.entry_id}) ✨"
+
+
 # === MAIN STREAMING HANDLER: Your structure, with develop's tone/formatting integrated ===
+@chat_turn
 def company_info_handler_streaming(user_input: str, session_id: str = None, language: str = "en-US"):
     if session_id and is_session_expired(session_id):
+        set_response_path("session_expired")
         yield "⏳ Your session has expired after 3 days. Please start a new session to continue chatting with me. 😊"
         return
 
@@ -454,52 +558,71 @@ def company_info_handler_streaming(user_input: str, session_id: str = None, lang
     logging.info(
         f"--- START HANDLER: Query='{user_input}', Session={session_id}, Lang={language} ({language_name}) ---")
 
+    # Keyword/fuzzy features are computed once and shared by every branch below
+    features = text_matcher.analyze(user_input)
+
+    # --- FAQ fast path: a literal FAQ title is answered from its row, without classification or an LLM call ---
+    if FAQ_FAST_PATH_ENABLED:
+        with stage_timer("faq_lookup") as current:
+            faq = match_faq(user_input, language)
+            current.set("matched", faq is not None)
+        if faq is not None:
+            logging.info(f"Handling as: FAQ fast path {faq}")
+            set_intent("Company Info")
+            set_response_path("faq")
+            annotate_trace(faq_entry_id=faq.entry_id, faq_match=faq.method)
+            yield format_faq_answer(faq)
+            return
+
     # Make sure initial_classify_intent and resolve_contextual_query are passed the 'language'
-    detected_intent = initial_classify_intent(user_input, language)  # Pass language
-    user_mood = detect_mood(user_input)
+    with stage_timer("intent_classification"):
+        detected_intent = initial_classify_intent(user_input, language, features)  # Pass language
+    set_intent(detected_intent)
+    raise_if_cancelled("turn after classification")
+    user_mood = detect_mood(user_input, features)
     logging.info(f"User mood detected as: {user_mood}")
 
     # --- Human Support (Internationalize this response too) ---
     if detected_intent == "Human Support Service Request":
         logging.info(f"Handling as: Human Support (Initial)")
+        set_response_path("human_support")
         truncated_session_suffix = get_session_id_suffix(session_id, language)
 
-        if language == "nl-NL":
-            reply = "Natuurlijk! Je kunt ons menselijke supportteam bereiken via WhatsApp op +31 6 12345678 of per e-mail op support@bravur.com."
-            reply += f"{truncated_session_suffix} Hoe kan ik je ondertussen helpen? 😊"
-        else:
-            reply = ("You can reach our human support team on WhatsApp at +31 6 12345678 "
-                     "or by email at support@bravur.com.")
-            reply += f"{truncated_session_suffix} How can I help in the meantime? 😊"
-        yield reply
+        contact, closing = HUMAN_SUPPORT_REPLIES["nl-NL" if language == "nl-NL" else "en-US"]
+        yield contact + truncated_session_suffix + closing
         return
 
     # --- Contextual Check / Refinement ---
-    if detected_intent == "Previous Conversation Query" or \
-            (detected_intent == "Unknown" and has_strong_contextual_cues(user_input)):
+    strong_cues = detected_intent == "Unknown" and has_strong_contextual_cues(user_input, features)
+    if detected_intent == "Previous Conversation Query" or strong_cues:
         logging.info(
-            f"Triggering Contextual Resolution (Initial: {detected_intent}, Cues: {has_strong_contextual_cues(user_input)}) for: '{user_input}'")
-        recent_convo_for_context = get_recent_conversation(session_id)
-        if recent_convo_for_context or any(
-                fuzz.partial_ratio(user_input.lower(), p) > 80 for p in MEMORY_PROMPTS_KEYWORDS):
+            f"Triggering Contextual Resolution (Initial: {detected_intent}, Cues: {strong_cues}) for: '{user_input}'")
+        recent_convo_for_context = get_recent_conversation(session_id, language=language)
+        if recent_convo_for_context or features.fuzzy_match("memory", 80):
             # Pass language to the context resolver
-            context_result = resolve_contextual_query(user_input, recent_convo_for_context, session_id, language)
+            with stage_timer("contextual_refinement"):
+                context_result = resolve_contextual_query(user_input, recent_convo_for_context, session_id, language,
+                                                          features)
             # ... (rest of context_result handling) ...
             logging.info(f"Context resolution result: {context_result}")
             if context_result["type"] == "direct_answer":
                 logging.info(f"Handling as: Direct Answer from Context: '{context_result['content'][:100]}...'")
+                set_response_path("context")
                 yield clean_and_clip_reply(context_result["content"], max_sentences=3, max_chars=350);
                 return
             elif context_result["type"] == "refined_intent":
                 detected_intent = context_result["intent"]
+                set_intent(detected_intent)
         else:
             logging.info(f"Contextual cues, but no history. Treating as Unknown.")
             detected_intent = "Unknown"
+            set_intent(detected_intent)
     # Runtime memory of past gratitude replies
     recent_gratitude_replies = []
 
     if detected_intent == "Gratitude":
         logging.info(f"Handling as: Gratitude in {language_name}")
+        set_response_path("gratitude")
 
         # --- Language-Specific Prompts and Fallbacks for Gratitude ---
         if language == "nl-NL":
@@ -542,34 +665,30 @@ def company_info_handler_streaming(user_input: str, session_id: str = None, lang
             {"role": "user", "content": user_input}
         ]
 
-        # Session-based tracking for gratitude replies per language
-        session_key = f"{session_id or 'default'}_{language}"  # Use 'default' if session_id is None
-        if session_key not in session_unknown_messages:
-            session_unknown_messages[session_key] = {'recent_gratitude_replies': []}
-        elif 'recent_gratitude_replies' not in session_unknown_messages[session_key]:
-            session_unknown_messages[session_key]['recent_gratitude_replies'] = []
-
-        recent_gratitude_replies_for_lang = session_unknown_messages[session_key]['recent_gratitude_replies']
+        # Session-based tracking for gratitude replies per language (short hashes of the last replies)
+        state_key, gratitude_state = load_variety_state(session_id)
+        recent_gratitude_replies_for_lang = gratitude_state.setdefault("gratitude", {}).setdefault(language, [])
 
         try:
             reply = None
             MAX_TRIES = 5  # Try a few times to get a unique response
 
             for _ in range(MAX_TRIES):
-                completion = groq_client.chat.completions.create(
-                    messages=gratitude_prompt_messages,
-                    model="llama-3.3-70b-versatile",  # Smaller, faster model is fine for this
+                candidate = model_router.complete(
+                    "gratitude", gratitude_prompt_messages,
                     temperature=random.uniform(0.75, 0.95),  # Encourage more variety
                     max_tokens=60
-                )
-                candidate = completion.choices[0].message.content.strip()
+                ).strip()
 
                 # Simple check for variety
-                if candidate and candidate not in recent_gratitude_replies_for_lang:
+                candidate_hash = sha256(candidate.encode("utf-8")).hexdigest()[:12]
+                if candidate and candidate_hash not in recent_gratitude_replies_for_lang:
                     reply = candidate
-                    recent_gratitude_replies_for_lang.append(reply)
+                    recent_gratitude_replies_for_lang.append(candidate_hash)
                     if len(recent_gratitude_replies_for_lang) > 10:  # Keep memory of last 10
                         recent_gratitude_replies_for_lang.pop(0)
+                    if state_key is not None:
+                        session_state_store.save(state_key, gratitude_state)
                     break
 
             if not reply:  # Fallback if LLM struggles or repeats too much
@@ -586,34 +705,32 @@ def company_info_handler_streaming(user_input: str, session_id: str = None, lang
 
     if detected_intent == "Positive Acknowledgment":
         logging.info(f"Handling as: Positive Acknowledgment in {language_name}")
-        if language == "nl-NL":
-            reply = "Fijn dat je dat goed vond! 😊 Laat het me weten als je meer vragen hebt."
-        else: # Default to English
-            reply = "Glad you liked that! 😊 Let me know if you have more questions."
-        yield reply
+        set_response_path("canned")
+        yield POSITIVE_ACKNOWLEDGMENT_REPLIES["nl-NL" if language == "nl-NL" else "en-US"]
         return
 
     if detected_intent == "Frustration":
         logging.info(f"Handling as: Frustration in {language_name}")
-        if language == "nl-NL":
-            reply = ("Het spijt me dat dat niet hielp. 😔 Ik ben hier om je te helpen — kun je me meer vertellen "
-                     "zodat ik het antwoord kan verbeteren of je kan doorverbinden met support?")
-        else: # Default to English
-            reply = ("I'm sorry that wasn't helpful. 😔 I'm here to assist you — could you tell me more "
-                     "so I can improve the answer or connect you with support?")
-        yield reply
+        set_response_path("canned")
+        yield FRUSTRATION_REPLIES["nl-NL" if language == "nl-NL" else "en-US"]
         return
 
     logging.info(f"Proceeding with final intent: '{detected_intent}' for query: '{user_input}'")
 
     if detected_intent == "Unknown":
         logging.info(f"Handling as: Unknown (Final)")
+        set_response_path("canned")
         # Using randomized unknown messages with jokes
-        random_message = get_random_unknown_message(session_id or "default", language)
+        random_message = get_random_unknown_message(session_id, language)
         yield random_message
         return
 
-    recent_convo_for_response = get_recent_conversation(session_id)
+    response_stage = "rag" if detected_intent == "Company Info" else "it_trends"
+    response_route = model_router.route(response_stage)
+    response_model = response_route[1]
+    annotate_trace(response_model=response_model)
+    recent_convo_for_response = get_recent_conversation(session_id, model=response_model, language=language,
+                                                        fixed_messages=[{"role": "user", "content": user_input}])
 
     # --- Determine Tone Instruction (from develop) ---
     tone_instruction = "Maintain a helpful, professional, and friendly tone. "
@@ -626,30 +743,30 @@ def company_info_handler_streaming(user_input: str, session_id: str = None, lang
     final_response_chunks = []
     if detected_intent == "IT Trends":
         logging.info(f"Handling as: IT Trends (SerperAPI) for query: '{user_input}'")
-        yield "Searching the web for the latest IT trends... 🌐\n"
+        set_response_path("it_trends")
+        yield StatusChunk("Searching the web for the latest IT trends... 🌐\n")
 
         site_constraints_list = []
-        user_input_lower = user_input.lower()
-        if "mckinsey" in user_input_lower:
+        if features.has_phrase("mckinsey"):
             site_constraints_list.append("site:mckinsey.com")
-        if "gartner" in user_input_lower:
+        if features.has_phrase("gartner"):
             site_constraints_list.append("site:gartner.com")
 
         site_constraint_query_str = " OR ".join(site_constraints_list) if site_constraints_list else None
 
+        raise_if_cancelled("web search")
         search_data = search_web(user_input, site_constraint=site_constraint_query_str)
 
         search_snippets = []
         if search_data.get("error"):
             logging.warning(f"SerperAPI search returned an error: {search_data['error']}")
         elif "organic" in search_data and search_data["organic"]:
-            results = search_data["organic"][:5]  # Process top 5 relevant results
-            for r_item in results:
-                title = r_item.get('title', 'N/A')
-                link = r_item.get('link', 'N/A')
-                snippet_text = r_item.get('snippet', 'N/A')
-                if title and link and snippet_text:  # Ensure essential parts are present
-                    search_snippets.append(f"Title: {title}\nLink: {link}\nSnippet: {snippet_text}")
+            results = [r for r in search_data["organic"][:5]  # Process top 5 relevant results
+                       if r.get('title') and r.get('link') and r.get('snippet')]  # Ensure essential parts are present
+            snippets = compress_retrieved(user_input, [r['snippet'] for r in results],
+                                          WEB_SOURCE_TOKEN_BUDGET, response_model)
+            for r_item, snippet_text in zip(results, snippets):
+                search_snippets.append(f"Title: {r_item['title']}\nLink: {r_item['link']}\nSnippet: {snippet_text}")
         else:
             logging.info(f"No organic results from SerperAPI search for '{user_input}'.")
 
@@ -667,7 +784,7 @@ def company_info_handler_streaming(user_input: str, session_id: str = None, lang
             )
         else:  # No useful search results or search failed
             # Give feedback about search failure before general knowledge answer
-            yield "I couldn't find specific details from a web search for that IT trend. I'll provide a general overview based on my knowledge.\n"
+            yield StatusChunk("I couldn't find specific details from a web search for that IT trend. I'll provide a general overview based on my knowledge.\n")
             it_trends_sys_prompt = (
                 f"You are a knowledgeable AI assistant for Bravur. {tone_instruction} "
                 f"A web search for '{user_input}' did not return specific results. "
@@ -682,27 +799,26 @@ def company_info_handler_streaming(user_input: str, session_id: str = None, lang
 
         try:
             logging.info(
-                f"Using Groq Llama 3 70B for IT Trend (Serper/Fallback) response generation. System prompt starts with: {it_trends_sys_prompt[:200]}...")
-            stream = groq_client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=messages_for_llm,
+                f"Using {response_model} for IT Trend (Serper/Fallback) response generation. System prompt starts with: {it_trends_sys_prompt[:200]}...")
+            stream = model_router.stream(
+                "it_trends", messages_for_llm,
                 max_tokens=450,
                 temperature=0.5,
-                stream=True
+                route=response_route
             )
-            for chunk_obj in stream:
-                if chunk_obj.choices[0].delta.content:
-                    final_response_chunks.append(chunk_obj.choices[0].delta.content)
-                    yield chunk_obj.choices[0].delta.content
+            for content in stream:
+                final_response_chunks.append(content)
+                yield content
         except Exception as e:
             logging.error(f"LLM Error (IT Trends with Serper/Fallback): {e}")
             yield "[Error generating IT trends response]"
 
     elif detected_intent == "Company Info":  # Also catches refined "Previous Conversation Query" that became Company Info
         logging.info(f"Handling as: RAG Path for Intent='{detected_intent}'")
-        query_embedding = embed_query(user_input)  # From database.py (OpenAI)
-        search_results = []
-        if query_embedding: search_results = hybrid_search(user_input, top_k=3)  # From database.py
+        set_response_path("rag")
+        # Vector search re-ranked with BM25; falls back to the in-memory keyword index without an embedding
+        raise_if_cancelled("retrieval")
+        search_results = hybrid_search(user_input, top_k=3, language=language)  # From database.py
 
         if not search_results:
             logging.info(
@@ -711,10 +827,11 @@ def company_info_handler_streaming(user_input: str, session_id: str = None, lang
             semantic_context_str = "No specific Bravur documents were found to be highly relevant for this query."
         else:
             semantic_context_parts = []
-            for item in search_results:
+            summaries = compress_retrieved(user_input, [item[2] for item in search_results],
+                                           RAG_SOURCE_TOKEN_BUDGET, response_model, fallback_words=50)
+            for item, summary_content in zip(search_results, summaries):
                 entry_id, title, content, _ = item
                 title_str = f"Title: {title}\n" if title else ""
-                summary_content = ' '.join(content.split()[:50]) + "..."
                 semantic_context_parts.append(f"Row ID: {entry_id}\n{title_str}Summary: {summary_content}")
             semantic_context_str = "\n\n---\n\n".join(semantic_context_parts)
 
@@ -730,17 +847,16 @@ def company_info_handler_streaming(user_input: str, session_id: str = None, lang
         messages = [{"role": "system", "content": rag_system_prompt}] + recent_convo_for_response + [
             {"role": "user", "content": user_input}]
         try:
-            # Using OpenAI GPT-4o Mini for final RAG response as requested
-            stream = openai_client.chat.completions.create(model="gpt-4o-mini", messages=messages, max_tokens=300,
-                                                           temperature=0.5, stream=True)
-            for chunk in stream:
-                if chunk.choices[0].delta.content: final_response_chunks.append(chunk.choices[0].delta.content); yield \
-                    chunk.choices[0].delta.content
+            # The router picks the RAG model (GPT-4o Mini by default, see model_routes.json)
+            stream = model_router.stream("rag", messages, max_tokens=300, temperature=0.5, route=response_route)
+            for content in stream:
+                final_response_chunks.append(content); yield content
         except Exception as e:
             logging.error(f"LLM Error (RAG): {e}");
             yield "[Error generating RAG response]"
     else:  # Fallback if intent is somehow not covered
         logging.warning(f"Fell through main intent handling for '{detected_intent}'. Query: '{user_input}'")
+        set_response_path("fallback")
         if language == "nl-NL":
             yield f"Ik weet niet zeker hoe ik daarmee kan helpen. Ik kan Bravur of algemene IT-onderwerpen in het {language_name} bespreken."
         else:
@@ -753,5 +869,57 @@ def company_info_handler_streaming(user_input: str, session_id: str = None, lang
         logging.info(f"Final assembled response before potential clipping: '{full_bot_reply[:300]}...'")
     return
 
+BRAVUR_INFORMATION_AGENT = "Bravur_Information_Agent"
+
 agent_connector = AgentConnector()
-agent_connector.register_agent("Bravur_Information_Agent", company_info_handler_streaming)
+agent_connector.register_agent(BRAVUR_INFORMATION_AGENT, company_info_handler_streaming)
+
+chat_flights = SingleFlight()
+_solo_turns = Counter()  # coalescing key -> turns running on their own session right now
+_solo_turns_lock = threading.Lock()
+
+
+def stream_chat_turn(user_input, session_id, language):
+    """
+    Stream the reply to one chat turn. A turn runs on its own session unless an identical stateless turn
+    is already running: then it shares a single session-less run with every other such duplicate, and
+    the session-specific parts of the reply (the session ID mention) are filled in per subscriber.
+    """
+    key = coalescing_key(user_input, session_id, language)
+    if key is None:
+        return agent_connector.stream(BRAVUR_INFORMATION_AGENT, user_input, session_id, language)
+    with _solo_turns_lock:
+        duplicate = _solo_turns[key] > 0 or chat_flights.in_flight(key)
+    if not duplicate or is_session_expired(session_id):
+        return _solo_turn(key, user_input, session_id, language)
+    chunks, _ = chat_flights.stream(key, _shared_turn, user_input, language)
+    annotate_trace(coalesced=True)
+    return _personalize(chunks, session_id, language)
+
+
+def _solo_turn(key, user_input, session_id, language):
+    with _solo_turns_lock:
+        _solo_turns[key] += 1
+    try:
+        yield from agent_connector.stream(BRAVUR_INFORMATION_AGENT, user_input, session_id, language)
+    finally:
+        with _solo_turns_lock:
+            _solo_turns[key] -= 1
+            if not _solo_turns[key]:
+                del _solo_turns[key]
+
+
+def _shared_turn(user_input, language):
+    _shared_run.set(True)  # runs in the flight's own copy of the leader's context
+    yield from agent_connector.stream(BRAVUR_INFORMATION_AGENT, user_input, None, language)
+
+
+def _personalize(chunks, session_id, language):
+    suffix = get_session_id_suffix(session_id, language)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str) and SESSION_SUFFIX_MARKER in chunk:
+                chunk = chunk.replace(SESSION_SUFFIX_MARKER, suffix)
+            yield chunk
+    finally:
+        chunks.close()
@@ -10,6 +10,121 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
 SERPER_API_KEY = os.getenv("SERPER_API_KEY")
 
+# LLM provider settings (base URLs can point at local mock servers for testing)
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", 20))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", 2.0))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", 0.3))
+
+# Client-side LLM rate limits per provider (applied per model), shared across workers through Redis
+GROQ_RPM_LIMIT = int(os.getenv("GROQ_RPM_LIMIT", 30))
+GROQ_TPM_LIMIT = int(os.getenv("GROQ_TPM_LIMIT", 12000))
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", 500))
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", 200000))
+LLM_SCHEDULER_BACKEND = os.getenv("LLM_SCHEDULER_BACKEND", "redis")  # "redis" or "memory"
+LLM_SCHEDULER_MAX_WAIT = float(os.getenv("LLM_SCHEDULER_MAX_WAIT", 10))
+
+# Outbound call resilience: overall request deadline, circuit breakers and retry budget
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", 45))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RECOVERY_SECONDS = float(os.getenv("BREAKER_RECOVERY_SECONDS", 30))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", 0.1))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 0.2))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 2.0))
+
+# Serper web search client
+SERPER_CONNECT_TIMEOUT = float(os.getenv("SERPER_CONNECT_TIMEOUT", 2))
+SERPER_READ_TIMEOUT = float(os.getenv("SERPER_READ_TIMEOUT", 5))
+SERPER_CACHE_TTL_SECONDS = int(os.getenv("SERPER_CACHE_TTL_SECONDS", 900))
+SERPER_STALE_TTL_SECONDS = int(os.getenv("SERPER_STALE_TTL_SECONDS", 86400))
+SERPER_CACHE_MAX_ENTRIES = int(os.getenv("SERPER_CACHE_MAX_ENTRIES", 500))
+
+# Server-Sent Events chat mode: idle heartbeat interval and how long finished streams stay resumable
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+SSE_REPLAY_TTL_SECONDS = int(os.getenv("SSE_REPLAY_TTL_SECONDS", 120))
+# A turn whose SSE client stays disconnected this long is cancelled (a reconnect within it resumes instead)
+SSE_ABANDON_SECONDS = float(os.getenv("SSE_ABANDON_SECONDS", 10))
+
+# Identical concurrent stateless chat turns (first turns / no contextual cues) share one pipeline run
+CHAT_COALESCE_ENABLED = os.getenv("CHAT_COALESCE_ENABLED", "true").lower() == "true"
+
+# Agent runtime (AgentConnector): default per-agent deadline and the shared worker pool size
+AGENT_DEFAULT_TIMEOUT = float(os.getenv("AGENT_DEFAULT_TIMEOUT", 60))
+AGENT_MAX_WORKERS = int(os.getenv("AGENT_MAX_WORKERS", 32))
+
+# Per-stage model routing: candidate models per pipeline stage, re-read when the file changes
+MODEL_ROUTES_PATH = os.getenv("MODEL_ROUTES_PATH", os.path.join(os.path.dirname(__file__), "model_routes.json"))
+MODEL_ROUTES_RELOAD_SECONDS = float(os.getenv("MODEL_ROUTES_RELOAD_SECONDS", 5))
+
+# Request tracing: completed traces are appended as JSON lines to a rotating local file
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "logs/traces.jsonl")
+TRACE_LOG_MAX_BYTES = int(os.getenv("TRACE_LOG_MAX_BYTES", 10 * 1024 * 1024))
+TRACE_LOG_BACKUP_COUNT = int(os.getenv("TRACE_LOG_BACKUP_COUNT", 5))
+
+# Conversation context budgeting (exact tokens)
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 400))
+SUMMARY_FOLD_MAX_TOKENS = int(os.getenv("SUMMARY_FOLD_MAX_TOKENS", 3000))
+
+# In-process BM25 index over bravur_data: keyword fallback and lexical re-ranking of vector hits
+BM25_ENABLED = os.getenv("BM25_ENABLED", "true").lower() == "true"
+BM25_REFRESH_SECONDS = int(os.getenv("BM25_REFRESH_SECONDS", 300))
+BM25_RERANK_CANDIDATES = int(os.getenv("BM25_RERANK_CANDIDATES", 10))
+
+# FAQ fast path: answer questions matching a bravur_data title directly from the row, without an LLM call
+FAQ_FAST_PATH_ENABLED = os.getenv("FAQ_FAST_PATH_ENABLED", "true").lower() == "true"
+FAQ_FUZZY_THRESHOLD = float(os.getenv("FAQ_FUZZY_THRESHOLD", 0.92))
+FAQ_EMBEDDING_CANDIDATE_THRESHOLD = float(os.getenv("FAQ_EMBEDDING_CANDIDATE_THRESHOLD", 0.7))
+FAQ_EMBEDDING_THRESHOLD = float(os.getenv("FAQ_EMBEDDING_THRESHOLD", 0.9))
+
+# Query-focused compression of retrieved content: token budget per RAG document / web search result
+CONTEXT_COMPRESSION_ENABLED = os.getenv("CONTEXT_COMPRESSION_ENABLED", "true").lower() == "true"
+RAG_SOURCE_TOKEN_BUDGET = int(os.getenv("RAG_SOURCE_TOKEN_BUDGET", 60))
+WEB_SOURCE_TOKEN_BUDGET = int(os.getenv("WEB_SOURCE_TOKEN_BUDGET", 40))
+
+# Per-session variety state (unknown-intent messages, gratitude replies): "redis" or "memory"
+SESSION_STATE_BACKEND = os.getenv("SESSION_STATE_BACKEND", "redis")
+SESSION_STATE_MAX_ENTRIES = int(os.getenv("SESSION_STATE_MAX_ENTRIES", 10000))
+SESSION_STATE_TTL_SECONDS = int(os.getenv("SESSION_STATE_TTL_SECONDS", 72 * 3600))  # sessions expire after 3 days
+SESSION_STATE_MAX_BYTES = int(os.getenv("SESSION_STATE_MAX_BYTES", 1024))
+
+# Azure Speech: access tokens are valid ~10 minutes and are refreshed in the background before they expire;
+# requests reuse pooled keep-alive connections per Azure endpoint
+AZURE_TOKEN_LIFETIME_SECONDS = float(os.getenv("AZURE_TOKEN_LIFETIME_SECONDS", 600))
+AZURE_TOKEN_REFRESH_SECONDS = float(os.getenv("AZURE_TOKEN_REFRESH_SECONDS", 480))
+AZURE_HTTP_POOL_SIZE = int(os.getenv("AZURE_HTTP_POOL_SIZE", 10))
+
+# Text-to-speech cache: synthesized audio keyed by text, voice and format, in memory and on disk (both
+# bounded in bytes); the fixed reply phrases are synthesized into it in the background at startup
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "cache/tts")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+TTS_CACHE_MEMORY_MAX_BYTES = int(os.getenv("TTS_CACHE_MEMORY_MAX_BYTES", 32 * 1024 * 1024))
+TTS_PREWARM_ENABLED = os.getenv("TTS_PREWARM_ENABLED", "true").lower() == "true"
+
+# Streaming voice mode (/sts with stream=sse): reply sentences are synthesized on a shared pool while the
+# reply is still streaming; shorter sentences are merged with the next one
+TTS_PIPELINE_WORKERS = int(os.getenv("TTS_PIPELINE_WORKERS", 4))
+TTS_SENTENCE_MIN_CHARS = int(os.getenv("TTS_SENTENCE_MIN_CHARS", 20))
+
+# /sts with response_format=url: the reply audio is kept on disk and downloadable this long
+STS_AUDIO_DIR = os.getenv("STS_AUDIO_DIR", "cache/sts_audio")
+STS_AUDIO_TTL_SECONDS = int(os.getenv("STS_AUDIO_TTL_SECONDS", 600))
+
+# Upload transcoding: ffmpeg runs through pipes, at most TRANSCODE_WORKERS processes at once; an upload
+# waits up to TRANSCODE_QUEUE_TIMEOUT_SECONDS for a worker and each ffmpeg run may take TRANSCODE_TIMEOUT_SECONDS
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", os.cpu_count() or 2))
+TRANSCODE_TIMEOUT_SECONDS = float(os.getenv("TRANSCODE_TIMEOUT_SECONDS", 20))
+TRANSCODE_QUEUE_TIMEOUT_SECONDS = float(os.getenv("TRANSCODE_QUEUE_TIMEOUT_SECONDS", 10))
+TRANSCODE_STRATEGY_CACHE_SIZE = int(os.getenv("TRANSCODE_STRATEGY_CACHE_SIZE", 256))
+
+# Keep a copy of every WebM upload in debug_audio/ for manual inspection (off unless debugging)
+STT_DEBUG_AUDIO_ENABLED = os.getenv("STT_DEBUG_AUDIO_ENABLED", "false").lower() == "true"
+
 # Database Credentials
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
@@ -22,4 +137,28 @@ REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_USER = os.getenv("REDIS_USER", None)
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
-REDIS_DB = int(os.getenv("REDIS_DB", 0))
\ No newline at end of file
+REDIS_DB = int(os.getenv("REDIS_DB", 0))
+
+# Redis connection pool (connections are opened on first use) and degraded mode: after
+# REDIS_FAILURE_THRESHOLD consecutive failed or slow calls, Redis-backed features switch to in-process
+# fallbacks until REDIS_RECOVERY_CHECKS consecutive health pings succeed
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 1.0))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 0.5))
+REDIS_HEALTH_INTERVAL_SECONDS = float(os.getenv("REDIS_HEALTH_INTERVAL_SECONDS", 2))
+REDIS_SLOW_MS = float(os.getenv("REDIS_SLOW_MS", 250))
+REDIS_FAILURE_THRESHOLD = int(os.getenv("REDIS_FAILURE_THRESHOLD", 3))
+REDIS_RECOVERY_CHECKS = int(os.getenv("REDIS_RECOVERY_CHECKS", 3))
+RATE_LIMIT_FALLBACK_MAX_KEYS = int(os.getenv("RATE_LIMIT_FALLBACK_MAX_KEYS", 50000))
+
+# Rate limiting algorithm per scope: "fixed_window", "gcra" (smooth, one timestamp per key)
+# or "sliding_log" (exact, one entry per request; for strict low-limit scopes)
+RATE_LIMIT_IP_ALGORITHM = os.getenv("RATE_LIMIT_IP_ALGORITHM", "fixed_window")
+RATE_LIMIT_SESSION_ALGORITHM = os.getenv("RATE_LIMIT_SESSION_ALGORITHM", "fixed_window")
+RATE_LIMIT_FINGERPRINT_ALGORITHM = os.getenv("RATE_LIMIT_FINGERPRINT_ALGORITHM", "fixed_window")
+# IP limit tiers: each worker answers from local token buckets holding RATE_LIMIT_IP_LOCAL_SHARE of the
+# IP budget, and adds its counts to the global Redis total every RATE_LIMIT_IP_SYNC_SECONDS
+RATE_LIMIT_IP_LOCAL_TIER = os.getenv("RATE_LIMIT_IP_LOCAL_TIER", "true").lower() == "true"
+RATE_LIMIT_IP_LOCAL_SHARE = float(os.getenv("RATE_LIMIT_IP_LOCAL_SHARE", 0.25))
+RATE_LIMIT_IP_SYNC_SECONDS = float(os.getenv("RATE_LIMIT_IP_SYNC_SECONDS", 0.5))
+RATE_LIMIT_IP_MAX_TRACKED = int(os.getenv("RATE_LIMIT_IP_MAX_TRACKED", 100000))
\ No newline at end of file
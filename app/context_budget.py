@@ -0,0 +1,162 @@
+# app/context_budget.py
+import logging
+import re
+import threading
+from functools import lru_cache
+
+from app.config import HISTORY_TOKEN_BUDGET, SUMMARY_FOLD_MAX_TOKENS
+from app.database import get_session_summary, upsert_session_summary, get_session_messages
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to the heuristic counter below
+    tiktoken = None
+
+# tiktoken has no Llama tokenizer; cl100k_base is the closest BPE and is within a few percent for Llama 3
+MODEL_ENCODINGS = {
+    "gpt-4o-mini": "o200k_base",
+    "llama-3.3-70b-versatile": "cl100k_base",
+    "llama-3.1-8b-instant": "cl100k_base",
+}
+DEFAULT_ENCODING = "o200k_base"
+
+MODEL_CONTEXT_LIMITS = {
+    "gpt-4o-mini": 128000,
+    "llama-3.3-70b-versatile": 128000,
+    "llama-3.1-8b-instant": 128000,
+}
+DEFAULT_CONTEXT_LIMIT = 8192
+
+# Chat format overhead: role/separator tokens per message, plus priming for the reply
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9]+|[^\sA-Za-z0-9]")
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(encoding_name):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        # Encodings are downloaded on first use; keep working offline with the heuristic
+        logging.warning(f"tiktoken encoding '{encoding_name}' unavailable, using heuristic token counts: {e}")
+        return None
+
+
+def _heuristic_tokens(text):
+    """Conservative BPE approximation: ~4 chars per ASCII token, 1 per symbol, 2 per non-BMP char (emoji)."""
+    tokens = 0
+    for piece in _WORD_PATTERN.findall(text):
+        if piece.isascii():
+            tokens += 1 + (len(piece) - 1) // 4
+        else:
+            tokens += 2 if ord(piece) > 0xFFFF else 1
+    return tokens
+
+
+def count_tokens(text, model=None):
+    """Count tokens in text with the tokenizer of the given model."""
+    if not text:
+        return 0
+    encoding = _get_encoding(MODEL_ENCODINGS.get(model, DEFAULT_ENCODING))
+    if encoding is None:
+        return _heuristic_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model=None):
+    """Count the prompt tokens a list of chat messages costs, including per-message overhead."""
+    return REPLY_PRIMING_TOKENS + sum(
+        MESSAGE_OVERHEAD_TOKENS + count_tokens(msg["content"], model) for msg in messages
+    )
+
+
+def history_budget(model=None, fixed_messages=(), max_output_tokens=0, cap=HISTORY_TOKEN_BUDGET):
+    """Tokens left for conversation history after the fixed prompt and the reply, capped at `cap`."""
+    limit = MODEL_CONTEXT_LIMITS.get(model, DEFAULT_CONTEXT_LIMIT)
+    available = limit - count_message_tokens(list(fixed_messages), model) - max_output_tokens
+    return max(0, min(cap, available))
+
+
+def pack_messages(messages, budget, model=None):
+    """
+    Select the newest messages whose exact token cost fits in `budget`.
+    Returns (selected, dropped), both in chronological order.
+    """
+    total = 0
+    cutoff = len(messages)
+    for index in range(len(messages) - 1, -1, -1):
+        tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(messages[index]["content"], model)
+        if total + tokens > budget:
+            break
+        total += tokens
+        cutoff = index
+    return messages[cutoff:], messages[:cutoff]
+
+
+# --- Rolling per-session summaries ---
+_folds_in_progress = set()
+_folds_lock = threading.Lock()
+
+
+def _format_turns(messages):
+    return "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+
+
+def _fold_into_summary(summary, turns, language, stage="summarize"):
+    from app.model_router import model_router
+
+    language_name = "Dutch" if language == "nl-NL" else "English"
+    prompt = [
+        {"role": "system",
+         "content": f"You maintain a running summary of a chat between a user and Bravur's AI assistant "
+                    f"about Bravur and IT topics. Update the summary with the new turns. Keep it short "
+                    f"(max 5 sentences), friendly and factual, and write it in {language_name}."},
+        {"role": "user",
+         "content": f"Current summary:\n{summary or '(none yet)'}\n\nNew turns:\n{_format_turns(turns)}"},
+    ]
+    return model_router.complete(stage, prompt, temperature=0.3, max_tokens=200).strip()
+
+
+def update_session_summary(session_id, language="en-US", upto_message_id=None, messages=None, stage="summarize"):
+    """
+    Fold every message after the stored watermark (up to upto_message_id) into the session summary.
+    Only the new turns are sent to the LLM (as `stage`); returns the up-to-date summary or None.
+    """
+    with _folds_lock:
+        if session_id in _folds_in_progress:
+            logging.debug(f"Summary fold already running for session {session_id}")
+            return get_session_summary(session_id)[0]
+        _folds_in_progress.add(session_id)
+
+    try:
+        summary, last_message_id = get_session_summary(session_id)
+        if messages is None:
+            messages = format_session_messages(get_session_messages(session_id))
+        pending = [msg for msg in messages
+                   if msg["id"] > last_message_id and (upto_message_id is None or msg["id"] <= upto_message_id)]
+
+        while pending:
+            batch, _ = pack_messages(list(reversed(pending)), SUMMARY_FOLD_MAX_TOKENS)
+            batch = list(reversed(batch)) or pending[:1]
+            summary = _fold_into_summary(summary, batch, language, stage)
+            last_message_id = batch[-1]["id"]
+            upsert_session_summary(session_id, summary, last_message_id)
+            pending = pending[len(batch):]
+        return summary
+    except Exception as e:
+        logging.error(f"Failed to update summary for session {session_id}: {e}")
+        return None
+    finally:
+        with _folds_lock:
+            _folds_in_progress.discard(session_id)
+
+
+def format_session_messages(rows):
+    """Turn (message_id, content, timestamp, message_type) rows into chat messages carrying their id."""
+    roles = {"user": "user", "bot": "assistant", "system": "system"}
+    return [{"id": message_id, "role": roles[msg_type], "content": content}
+            for message_id, content, _, msg_type in rows if msg_type in roles]
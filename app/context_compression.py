@@ -0,0 +1,84 @@
+# app/context_compression.py
+import math
+import re
+
+from app.context_budget import count_tokens
+
+# Sentence ends followed by whitespace, or line breaks (bullets, headings)
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_TERM_PATTERN = re.compile(r"[a-z0-9À-ɏ]+")
+STEM_LENGTH = 6  # crude prefix stemming: "services"/"service", "trends"/"trending"
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how i in is it its me my of on or our so that the
+their them they this to us was we what when where which who why will with you your about tell more
+de het een en van in is op te dat die voor met zijn wat hoe wie waar welke je jij u uw ik mij wij ons
+er niet maar ook als bij aan naar om over meer kun kunt kan
+""".split())
+
+LEAD_SENTENCE_BONUS = 0.1  # first sentences tend to say what a document is about
+
+
+def split_sentences(text):
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text or "") if s and s.strip()]
+
+
+def query_terms(text):
+    return {t[:STEM_LENGTH] for t in _TERM_PATTERN.findall((text or "").lower()) if t not in STOPWORDS}
+
+
+class _Sentence:
+    __slots__ = ("source", "position", "text", "terms", "score", "tokens")
+
+    def __init__(self, source, position, text):
+        self.source = source
+        self.position = position
+        self.text = text
+        self.terms = query_terms(text)
+        self.score = 0.0
+        self.tokens = 0
+
+
+def _score(query, sources):
+    """Split sources into sentences scored by IDF-weighted query-term overlap (IDF over all sentences)."""
+    sentences = [[_Sentence(i, n, s) for n, s in enumerate(split_sentences(text))] for i, text in enumerate(sources)]
+    flat = [s for group in sentences for s in group]
+    wanted = query_terms(query)
+    if flat and wanted:
+        idf = {term: math.log(1 + len(flat) / (1 + sum(term in s.terms for s in flat))) for term in wanted}
+        for s in flat:
+            overlap = sum(idf[term] for term in wanted & s.terms)
+            s.score = overlap / math.sqrt(1 + len(s.terms)) + (LEAD_SENTENCE_BONUS if s.position == 0 else 0.0)
+    return sentences
+
+
+def _pack(sentences, budget, model):
+    """Best-scoring sentences that fit `budget` tokens, in their original order."""
+    chosen, used = [], 0
+    for s in sorted(sentences, key=lambda s: (-s.score, s.position)):
+        if chosen and s.score <= 0:
+            break  # off-topic filler isn't worth prompt tokens
+        s.tokens = count_tokens(s.text, model) + 1  # +1 for the joining space
+        if used + s.tokens <= budget:
+            chosen.append(s)
+            used += s.tokens
+    if not chosen and sentences:
+        # a single sentence longer than the whole budget: keep its leading words
+        best = max(sentences, key=lambda s: (s.score, -s.position))
+        words, text = best.text.split(), ""
+        for word in words:
+            candidate = f"{text} {word}".strip()
+            if count_tokens(candidate + " ...", model) > budget:
+                break
+            text = candidate
+        return f"{text} ..." if text else ""
+    return " ".join(s.text for s in sorted(chosen, key=lambda s: s.position))
+
+
+def compress_sources(query, sources, budget_per_source, model=None):
+    """
+    Query-focused compression of retrieved texts: each source is cut down to the sentences that best
+    match the query, within `budget_per_source` tokens. Returns one compressed string per source.
+    Local and lexical only, so it costs well under a millisecond for a handful of sources.
+    """
+    return [_pack(group, budget_per_source, model) for group in _score(query, sources)]
@@ -1,19 +1,28 @@
 from flask import request, jsonify, Response, stream_with_context
+import base64
+import contextvars
 import logging
+import threading
+import time
 from typing import Tuple, Dict, Any, Generator, Optional, Union
-from app.chatbot import company_info_handler_streaming
+from app.chatbot import stream_chat_turn
+from app.agentConnector import AgentTimeoutError
 from app.database import create_chat_session, store_message, is_session_active
-from app.rate_limiter import (
-    check_session_rate_limit, get_session_rate_status,
-    check_fingerprint_rate_limit, get_fingerprint_rate_status,
-    check_ip_rate_limit, r as redis_client
-)
+from app.rate_limiter import check_rate_limit
 from app.utils import get_client_ip
+from app.tracing import trace_attribute
+from app.sse import StatusChunk, event_streams, extract_citations, parse_last_event_id
+from app.metrics import observe_cancelled_turn, stage_timer
+from app.config import SSE_ABANDON_SECONDS
+from app.tts_pipeline import SentenceSplitter, SpeechPipeline
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Appended to a partial reply that was stored because the client went away mid-answer
+CANCELLED_REPLY_MARKER = " [cancelled by client]"
+
 
 def handle_chat() -> Tuple[Dict[str, Any], int]:
     """
@@ -29,6 +38,10 @@ def handle_chat() -> Tuple[Dict[str, Any], int]:
     Returns:
         Tuple[Dict[str, Any], int]: Response data and HTTP status code
     """
+    # A reconnecting SSE client resumes its stream instead of starting a new turn
+    if request.headers.get("Last-Event-ID"):
+        return resume_sse_chat(request.headers["Last-Event-ID"])
+
     # Debug logging
     logger.debug("=== CHAT REQUEST DEBUG ===")
     logger.debug(f"Content-Type: {request.content_type}")
@@ -72,11 +85,21 @@ def handle_chat() -> Tuple[Dict[str, Any], int]:
     store_message(session_id, user_input, "user")
 
     # Handle response based on request type
+    if _wants_sse(json_data):
+        return handle_sse_chat(user_input, session_id, language)
     if request_type in ["wordpress", "json"]:
         return handle_wordpress_chat(user_input, session_id, language)
     return handle_streaming_chat(user_input, session_id, language)
 
 
+def _wants_sse(json_data: Optional[Dict]) -> bool:
+    """SSE mode is chosen with `Accept: text/event-stream` or a `stream=sse` field."""
+    if "text/event-stream" in request.headers.get("Accept", ""):
+        return True
+    fields = json_data if isinstance(json_data, dict) else request.form
+    return fields.get("stream") == "sse"
+
+
 def _extract_request_data(json_data: Optional[Dict]) -> Tuple[str, str, str, str, str]:
     """
     Extract and validate request data from different sources.
@@ -155,32 +178,16 @@ def _check_rate_limits(session_id: str, fingerprint: Optional[str]) -> Optional[
     Returns:
         None if rate limits pass, or error response tuple if limits exceeded
     """
-    allowed = True
-    retry_after = 0
-    captcha_required = False
-    rate_status = None
-
+    # one atomic Redis call per request decides, counts and reports on the scope
     if fingerprint:
-        allowed, retry_after, captcha_required = check_fingerprint_rate_limit(fingerprint)
-        rate_status = get_fingerprint_rate_status(fingerprint)
-        rate_id = fingerprint
-        rate_type = 'fingerprint'
-        count = redis_client.get(f"rate_limit:fingerprint:{fingerprint}") or 0
-        logger.info(f"🔢 Fingerprint {fingerprint} has made {count} requests so far.")
+        rate_type, rate_id = 'fingerprint', fingerprint
     elif session_id:
-        allowed, retry_after, captcha_required = check_session_rate_limit(session_id)
-        rate_status = get_session_rate_status(session_id)
-        rate_id = session_id
-        rate_type = 'session'
-        count = redis_client.get(f"rate_limit:session:{session_id}") or 0
-        logger.info(f"🔢 Session {session_id} has made {count} requests so far.")
+        rate_type, rate_id = 'session', session_id
     else:
-        user_ip = get_client_ip()
-        allowed, retry_after = check_ip_rate_limit(user_ip)
-        captcha_required = False
-        rate_status = None
-        rate_id = user_ip
-        rate_type = 'ip'
+        rate_type, rate_id = 'ip', get_client_ip()
+    with stage_timer(f"rate_limit_{rate_type}"):
+        result = check_rate_limit(rate_type, rate_id)
+    allowed, retry_after, captcha_required = result.allowed, result.retry_after, result.captcha_required
 
     if not allowed:
         return jsonify({
@@ -191,8 +198,8 @@ def _check_rate_limits(session_id: str, fingerprint: Optional[str]) -> Optional[
         return jsonify({
             "error": "CAPTCHA required before continuing",
             "captcha_required": True,
-            "count": rate_status['count'] if rate_status else None,
-            "limit": rate_status['limit'] if rate_status else None,
+            "count": result.count,
+            "limit": result.limit,
             "rate_type": rate_type
         }), 403
 
@@ -215,8 +222,9 @@ def handle_wordpress_chat(user_input: str, session_id: str, language: str) -> Tu
     try:
         logger.info(f"Processing WordPress chat for session {session_id}")
         full_reply = ""
-        for chunk in company_info_handler_streaming(user_input, session_id, language):
-            full_reply += chunk
+        for chunk in stream_chat_turn(user_input, session_id, language):
+            if not isinstance(chunk, StatusChunk):  # progress text is only useful while streaming
+                full_reply += chunk
 
         if full_reply.strip():
             store_message(session_id, full_reply.strip(), "bot")
@@ -226,6 +234,7 @@ def handle_wordpress_chat(user_input: str, session_id: str, language: str) -> Tu
             "response": full_reply.strip() or "Sorry, I couldn't generate a response.",
             "session_id": session_id,
             "language": language,
+            "response_path": trace_attribute("response_path"),
             "status": "success"
         })
     except Exception as e:
@@ -249,12 +258,194 @@ def handle_streaming_chat(user_input: str, session_id: str,
 
     def generate() -> Generator[str, None, None]:
         full_reply = ""
+        cancelled = False
+        chunks = stream_chat_turn(user_input, session_id, language)
         try:
-            for chunk in company_info_handler_streaming(user_input, session_id, language):
-                full_reply += chunk
+            for chunk in chunks:
+                if not isinstance(chunk, StatusChunk):
+                    full_reply += chunk
                 yield chunk
+        except GeneratorExit:
+            # The client disconnected: closing the pipeline stops the LLM stream and any pending search
+            cancelled = True
+            observe_cancelled_turn("stream")
+            logger.info(f"Client left streaming chat for session {session_id}; cancelling the turn")
+        except AgentTimeoutError as e:
+            logger.error(f"Streaming chat for session {session_id} timed out: {e}")
+            yield "\n\nSorry, this is taking longer than expected. Please try again in a moment."
         finally:
+            chunks.close()
             if full_reply.strip():
-                store_message(session_id, full_reply.strip(), "bot")
+                store_message(session_id, full_reply.strip() + (CANCELLED_REPLY_MARKER if cancelled else ""), "bot")
 
-    return Response(stream_with_context(generate()), mimetype="text/plain")
\ No newline at end of file
+    return Response(stream_with_context(generate()), mimetype="text/plain")
+
+
+def handle_sse_chat(user_input: str, session_id: str, language: str) -> Response:
+    """
+    Stream the reply as Server-Sent Events: `status`, `token`, `citation`, `metrics` and `done`.
+    The turn runs on a background thread that records every event in a short-lived replay buffer,
+    so a client that reconnects with Last-Event-ID picks up where it left off.
+    """
+    stream = event_streams.create()
+    stream.publish("status", {"stage": "started", "session_id": session_id, "stream_id": stream.stream_id})
+    context = contextvars.copy_context()  # the request trace follows the turn into the worker thread
+    threading.Thread(target=context.run, args=(_publish_chat_turn, stream, user_input, session_id, language),
+                     name="sse-turn", daemon=True).start()
+    return _sse_response(stream)
+
+
+def _publish_chat_turn(stream, user_input: str, session_id: str, language: str) -> None:
+    started = time.monotonic()
+    first_token_at = None
+    full_reply = ""
+    cancelled = False
+    chunks = stream_chat_turn(user_input, session_id, language)
+    try:
+        for chunk in chunks:
+            if stream.abandoned(SSE_ABANDON_SECONDS):
+                # Nobody has been listening (or reconnected) for a while: stop paying for the rest
+                cancelled = True
+                observe_cancelled_turn("sse")
+                logger.info(f"SSE client for session {session_id} left; cancelling the turn")
+                break
+            if isinstance(chunk, StatusChunk):
+                stream.publish("status", {"stage": "progress", "message": chunk.strip()})
+                continue
+            if first_token_at is None:
+                first_token_at = time.monotonic()
+            full_reply += chunk
+            stream.publish("token", {"text": chunk})
+    except AgentTimeoutError as e:
+        logger.error(f"SSE chat for session {session_id} timed out: {e}")
+        stream.publish("error", {"message": "Sorry, this is taking longer than expected. Please try again in a moment."})
+    except Exception as e:
+        logger.error(f"Error in SSE chat for session {session_id}: {e}")
+        stream.publish("error", {"message": "Internal server error"})
+    finally:
+        chunks.close()
+        if full_reply.strip():
+            store_message(session_id, full_reply.strip() + (CANCELLED_REPLY_MARKER if cancelled else ""), "bot")
+            citations = extract_citations(full_reply)
+            if citations["row_ids"] or citations["links"]:
+                stream.publish("citation", citations)
+        elapsed = time.monotonic() - started
+        stream.publish("metrics", {
+            "elapsed_ms": round(elapsed * 1000),
+            "first_token_ms": round((first_token_at - started) * 1000) if first_token_at else None,
+            "response_path": trace_attribute("response_path"),
+            "coalesced": trace_attribute("coalesced", False),
+        })
+        stream.publish("done", {"session_id": session_id, "response_path": trace_attribute("response_path"),
+                                "cancelled": cancelled})
+        stream.close()
+
+
+def handle_voice_sse_chat(user_text: str, session_id: str, language: str, intro: str = "",
+                          audio_format: str = "wav") -> Response:
+    """
+    Voice mode of the SSE chat: besides `token` events, every finished sentence of the reply is
+    synthesized while the rest is still streaming and sent as an `audio` event, in order, so the
+    client can start playing after the first sentence. `intro` is spoken (and stored) before the reply.
+    """
+    stream = event_streams.create()
+    stream.publish("status", {"stage": "started", "session_id": session_id, "stream_id": stream.stream_id,
+                              "user_text": user_text, "is_first_interaction": bool(intro)})
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run,
+                     args=(_publish_voice_turn, stream, user_text, session_id, language, intro, audio_format),
+                     name="sse-voice-turn", daemon=True).start()
+    return _sse_response(stream)
+
+
+def _publish_voice_turn(stream, user_text: str, session_id: str, language: str, intro: str,
+                        audio_format: str = "wav") -> None:
+    from app.speech import synthesize_text, TTS_AUDIO_FORMATS
+
+    started = time.monotonic()
+    first_audio_at = None
+    full_reply = intro
+    cancelled = False
+    splitter = SentenceSplitter()
+
+    def publish_audio(index, text, audio):
+        nonlocal first_audio_at
+        if audio is not None and first_audio_at is None:
+            first_audio_at = time.monotonic()
+        stream.publish("audio", {
+            "index": index,
+            "text": text,
+            "mime_type": TTS_AUDIO_FORMATS[audio_format][1],
+            "audio_base64": base64.b64encode(audio).decode("ascii") if audio is not None else None,
+        })
+
+    pipeline = SpeechPipeline(lambda text, lang: synthesize_text(text, lang, audio_format), language, publish_audio)
+    if intro.strip():
+        pipeline.submit(intro.strip())
+
+    chunks = stream_chat_turn(user_text, session_id, language)
+    try:
+        for chunk in chunks:
+            if stream.abandoned(SSE_ABANDON_SECONDS):
+                cancelled = True
+                observe_cancelled_turn("sse_voice")
+                logger.info(f"SSE voice client for session {session_id} left; cancelling the turn")
+                break
+            if isinstance(chunk, StatusChunk):
+                stream.publish("status", {"stage": "progress", "message": chunk.strip()})
+                continue
+            full_reply += chunk
+            stream.publish("token", {"text": chunk})
+            sentence = splitter.feed(chunk)
+            if sentence:
+                pipeline.submit(sentence)
+    except AgentTimeoutError as e:
+        logger.error(f"SSE voice chat for session {session_id} timed out: {e}")
+        stream.publish("error", {"message": "Sorry, this is taking longer than expected. Please try again in a moment."})
+    except Exception as e:
+        logger.error(f"Error in SSE voice chat for session {session_id}: {e}")
+        stream.publish("error", {"message": "Internal server error"})
+    finally:
+        chunks.close()
+        if cancelled:
+            pipeline.cancel()
+        else:
+            rest = splitter.flush()
+            if rest:
+                pipeline.submit(rest)
+            pipeline.wait()
+        if full_reply.strip():
+            store_message(session_id, full_reply.strip() + (CANCELLED_REPLY_MARKER if cancelled else ""), "bot")
+        stream.publish("metrics", {
+            "elapsed_ms": round((time.monotonic() - started) * 1000),
+            "first_audio_ms": round((first_audio_at - started) * 1000) if first_audio_at else None,
+            "response_path": trace_attribute("response_path"),
+        })
+        stream.publish("done", {"session_id": session_id, "response_path": trace_attribute("response_path"),
+                                "cancelled": cancelled})
+        stream.close()
+
+
+def resume_sse_chat(last_event_id: str) -> Union[Response, Tuple[Dict[str, Any], int]]:
+    """Replay the events after Last-Event-ID and keep following the stream if it is still running."""
+    stream_id, sequence = parse_last_event_id(last_event_id)
+    stream = event_streams.get(stream_id) if stream_id else None
+    if stream is None:
+        return jsonify({"error": "This stream can no longer be resumed.", "resumable": False}), 410
+    return _sse_response(stream, after=sequence)
+
+
+def follow_sse_chat(stream_id: str) -> Union[Response, Tuple[Dict[str, Any], int]]:
+    """Replay a stream from its first event (a client reconnecting without Last-Event-ID)."""
+    stream = event_streams.get(stream_id)
+    if stream is None:
+        return jsonify({"error": "This stream can no longer be resumed.", "resumable": False}), 410
+    return _sse_response(stream, after=-1)
+
+
+def _sse_response(stream, after: int = -1) -> Response:
+    return Response(stream_with_context(stream.follow(after)), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # keep nginx from buffering the event stream
+        "X-Stream-Id": stream.stream_id,
+    })
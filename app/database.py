@@ -1,13 +1,22 @@
 # app/database.py (UPDATED CONTENT)
 import psycopg2
 import logging
+import threading
+import time
 from datetime import datetime, timedelta, timezone
-from app.config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, OPENAI_API_KEY
+from app.config import (
+    DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, OPENAI_API_KEY,
+    BM25_ENABLED, BM25_REFRESH_SECONDS, BM25_RERANK_CANDIDATES
+)
 from openai import OpenAI
 import secrets
+from app.bm25_index import BM25Index
+from app.resilience import call_with_resilience
+from app.metrics import timed, stage_timer
+from app.tracing import annotate
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Initialize OpenAI client (retries are handled by the resilience layer)
+client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
 
 # Get a PostgreSQL connection using config values
 def get_db_connection():
@@ -85,12 +94,19 @@ def create_chat_session():
         print(f"DEBUG: Successfully created session_id: {session_id}")
         logging.info(f"Created new chat session: {session_id}")
 
-        # Initialize Redis limit (session_id is treated as a string key by Redis, so this is fine)
+        # Initialize Redis limit (session_id is treated as a string key by Redis, so this is fine).
+        # Optional: the limiter falls back to SESSION_MAX_REQUESTS, so a degraded Redis mustn't fail the session
         from app.rate_limiter import r, SESSION_MAX_REQUESTS
+        from app.redis_client import redis_available, redis_health
         meta_key = f"rate_limit:meta:{session_id}"
-        if not r.hexists(meta_key, "limit"):
-            r.hset(meta_key, mapping={"limit": SESSION_MAX_REQUESTS})
-            print(f"DEBUG: Redis meta limit set for session {session_id} → {SESSION_MAX_REQUESTS}")
+        if redis_available():
+            try:
+                if not r.hexists(meta_key, "limit"):
+                    r.hset(meta_key, mapping={"limit": SESSION_MAX_REQUESTS})
+                    print(f"DEBUG: Redis meta limit set for session {session_id} → {SESSION_MAX_REQUESTS}")
+            except Exception as e:
+                redis_health.record_failure(e)
+                logging.error(f"Could not set the Redis session limit for {session_id}: {e}")
 
         return session_id
 
@@ -103,6 +119,7 @@ def create_chat_session():
         return None
 
 # Store a user/bot message in the message table
+@timed("store_message")
 def store_message(session_id, content, message_type="user"):
     if not session_id:
         logging.error("No session ID")
@@ -168,7 +185,67 @@ def get_session_messages(session_id):
             conn.close()
         return []
 
+# Fetch the stored rolling summary for a session as (summary, last_message_id), or (None, 0)
+def get_session_summary(session_id):
+    if not session_id or session_id == "None" or session_id == "null":
+        return None, 0
+
+    conn = get_db_connection()
+    if conn is None:
+        return None, 0
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT summary, last_message_id FROM session_summary WHERE session_id = %s",
+            (session_id,)
+        )
+        row = cursor.fetchone()
+        cursor.close()
+        conn.close()
+        if row is None:
+            return None, 0
+        return row[0], row[1]
+    except Exception as e:
+        logging.error(f"Failed to retrieve session summary: {e}")
+        if conn:
+            conn.close()
+        return None, 0
+
+# Insert or update the rolling summary of a session up to last_message_id
+def upsert_session_summary(session_id, summary, last_message_id):
+    conn = get_db_connection()
+    if conn is None:
+        return False
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO session_summary (session_id, summary, last_message_id, updated_at)
+            VALUES (%s, %s, %s, NOW())
+            ON CONFLICT (session_id) DO UPDATE
+            SET summary = EXCLUDED.summary,
+                last_message_id = EXCLUDED.last_message_id,
+                updated_at = NOW()
+            WHERE session_summary.last_message_id < EXCLUDED.last_message_id
+            """,
+            (session_id, summary, last_message_id)
+        )
+        conn.commit()
+        cursor.close()
+        conn.close()
+        logging.info(f"Stored summary for session {session_id} up to message {last_message_id}")
+        return True
+    except Exception as e:
+        logging.error(f"Failed to store session summary: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return False
+
 # Use pgvector similarity search to find best semantic matches
+@timed("semantic_search")
 def semantic_search(query_embedding, top_k=5):
     conn = get_db_connection()
     if conn is None:
@@ -189,31 +266,46 @@ def semantic_search(query_embedding, top_k=5):
         rows = cursor.fetchall()
         cursor.close()
         conn.close()
+        annotate(top_k=top_k, rows=len(rows))
         return rows
     except Exception as e:
         logging.error(f"Semantic search failed: {e}")
         return []
 
+@timed("embedding")
 def embed_query(query):
     try:
-        response = client.embeddings.create(
+        response = call_with_resilience("openai_embeddings", lambda timeout: client.embeddings.create(
             input=query,
-            model="text-embedding-3-large"
-        )
+            model="text-embedding-3-large",
+            timeout=timeout
+        ))
         return response.data[0].embedding
     except Exception as e:
         logging.error(f"Error embedding query: {e}")
         return None
 
-# Run both semantic and fallback keyword search if needed
-def hybrid_search(query, top_k=5):
+# Run semantic search re-ranked with BM25, or the keyword fallback if there are no vector hits
+def hybrid_search(query, top_k=5, language="en-US"):
     embedding = embed_query(query)
     if embedding:
-        results = semantic_search(embedding, top_k=top_k)
+        use_index = BM25_ENABLED and ensure_lexical_index()
+        results = semantic_search(embedding, top_k=max(top_k, BM25_RERANK_CANDIDATES) if use_index else top_k)
         if results:
-            return results
+            if not use_index:
+                return results
+            with stage_timer("lexical_rerank", candidates=len(results)):
+                return lexical_index.rerank(query, results, top_k=top_k, language=language)
+    return keyword_search(query, top_k, language)
+
+# Keyword search: served from the in-memory BM25 index, with full-text search in Postgres as a fallback
+@timed("keyword_search")
+def keyword_search(query, top_k=5, language="en-US"):
+    if BM25_ENABLED and ensure_lexical_index():
+        rows = lexical_index.search(query, top_k=top_k, language=language)
+        annotate(top_k=top_k, rows=len(rows), source="bm25")
+        return rows
 
-    # Fallback to full-text search using tsvector
     conn = get_db_connection()
     if conn is None:
         logging.error("No DB connection for fallback search")
@@ -233,11 +325,76 @@ def hybrid_search(query, top_k=5):
         rows = cursor.fetchall()
         cursor.close()
         conn.close()
+        annotate(top_k=top_k, rows=len(rows), source="postgres")
         return rows
     except Exception as e:
         logging.error(f"Fallback search failed: {e}")
         return []
 
+# === In-memory BM25 index over bravur_data ===
+lexical_index = BM25Index()
+_lexical_versions = {}  # entry_id -> last_updated_content seen by the index
+_lexical_state = {"loaded": False, "refreshed_at": 0.0, "attempted_at": float("-inf")}
+_lexical_refresh_lock = threading.Lock()
+
+def refresh_lexical_index():
+    """Re-index only the rows whose last_updated_content changed, and drop deleted rows."""
+    conn = get_db_connection()
+    if conn is None:
+        logging.error("No DB connection for BM25 index refresh")
+        return False
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT entry_id, last_updated_content FROM bravur_data;")
+        versions = dict(cursor.fetchall())
+        changed = [entry_id for entry_id, updated in versions.items() if _lexical_versions.get(entry_id) != updated
+                   or entry_id not in lexical_index]
+        rows = []
+        if changed:
+            cursor.execute("SELECT entry_id, title, content FROM bravur_data WHERE entry_id = ANY(%s);", (changed,))
+            rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+    except Exception as e:
+        logging.error(f"BM25 index refresh failed: {e}")
+        return False
+
+    lexical_index.sync(rows, versions.keys())
+    _lexical_versions.clear()
+    _lexical_versions.update(versions)
+    _lexical_state["loaded"] = True
+    _lexical_state["refreshed_at"] = time.monotonic()
+    if rows:
+        logging.info(f"BM25 index refreshed: {len(rows)} rows (re)indexed, {len(lexical_index)} documents")
+    return True
+
+def _refresh_in_background():
+    try:
+        refresh_lexical_index()
+    finally:
+        _lexical_refresh_lock.release()
+
+def ensure_lexical_index():
+    """True when the index can serve queries. Builds it on first use; later refreshes run in the background."""
+    if not _lexical_state["loaded"]:
+        # after a failed build (database down), retry at most every 30s instead of on every query
+        if time.monotonic() - _lexical_state["attempted_at"] < 30:
+            return False
+        with _lexical_refresh_lock:
+            if not _lexical_state["loaded"]:
+                _lexical_state["attempted_at"] = time.monotonic()
+                refresh_lexical_index()
+        return _lexical_state["loaded"]
+    if time.monotonic() - _lexical_state["refreshed_at"] > BM25_REFRESH_SECONDS \
+            and _lexical_refresh_lock.acquire(blocking=False):
+        threading.Thread(target=_refresh_in_background, name="bm25-refresh", daemon=True).start()
+    return True
+
+def lexical_index_status():
+    """Size and load state of the BM25 index, for the health endpoint."""
+    return {"documents": len(lexical_index), "loaded": _lexical_state["loaded"]}
+
 # Update rows in bravur_data that are missing vector embeddings
 def update_pending_embeddings():
     conn = get_db_connection()
@@ -0,0 +1,132 @@
+# app/faq_index.py
+import logging
+import math
+import re
+import threading
+
+from rapidfuzz import fuzz, process
+
+from app.bm25_index import detect_language, language_code
+from app.config import (
+    FAQ_FUZZY_THRESHOLD, FAQ_EMBEDDING_CANDIDATE_THRESHOLD, FAQ_EMBEDDING_THRESHOLD
+)
+from app.database import embed_query, lexical_index, ensure_lexical_index
+
+QUESTION_WORDS = frozenset("""
+what where who how which when why does do is are can could will wat waar wie hoe welke wanneer waarom doet
+kan kunnen is zijn heeft hebben
+""".split())
+
+
+def normalize_question(text):
+    text = re.sub(r"\b(what|where|who|how|when)['’]s\b", r"\1 is", (text or "").lower())
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def is_question_title(title):
+    words = normalize_question(title).split()
+    return bool(words) and ((title or "").strip().endswith("?") or words[0] in QUESTION_WORDS)
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class FAQMatch:
+    def __init__(self, entry_id, title, content, confidence, method):
+        self.entry_id = entry_id
+        self.title = title
+        self.content = content
+        self.confidence = confidence
+        self.method = method  # "exact", "fuzzy" or "embedding"
+
+    def __repr__(self):
+        return f"FAQMatch(entry_id={self.entry_id!r}, method={self.method!r}, confidence={self.confidence:.2f})"
+
+
+class FAQIndex:
+    """
+    Question-shaped bravur_data titles, for answering a literal FAQ straight from its row.
+    Matching tries a normalized exact title match, then fuzzy matching; a near-miss fuzzy candidate
+    is confirmed with embeddings (query vs. title), which costs one embedding call instead of a full turn.
+    """
+
+    def __init__(self, embed=None, fuzzy_threshold=FAQ_FUZZY_THRESHOLD,
+                 embedding_candidate_threshold=FAQ_EMBEDDING_CANDIDATE_THRESHOLD,
+                 embedding_threshold=FAQ_EMBEDDING_THRESHOLD):
+        self.embed = embed
+        self.fuzzy_threshold = fuzzy_threshold
+        self.embedding_candidate_threshold = embedding_candidate_threshold
+        self.embedding_threshold = embedding_threshold
+        self.source_version = None
+        self._entries = {}  # language -> {normalized title: (entry_id, title, content)}
+        self._title_embeddings = {}  # entry_id -> embedding of its title, computed on first need
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._entries.values())
+
+    def rebuild(self, rows, source_version=None):
+        entries = {}
+        for entry_id, title, content in rows:
+            if not content or not is_question_title(title):
+                continue
+            language = detect_language(f"{title}\n{content}")
+            entries.setdefault(language, {})[normalize_question(title)] = (entry_id, title, content)
+        with self._lock:
+            self._entries = entries
+            self._title_embeddings = {}
+            self.source_version = source_version
+
+    def match(self, query, language="en-US"):
+        """The FAQ row answering `query` with very high confidence, or None."""
+        entries = self._entries.get(language_code(language), {})
+        normalized = normalize_question(query)
+        if not entries or not normalized:
+            return None
+
+        if normalized in entries:
+            return FAQMatch(*entries[normalized], 1.0, "exact")
+
+        best = process.extractOne(normalized, list(entries), scorer=fuzz.token_sort_ratio)
+        if best is None:
+            return None
+        title_key, score = best[0], best[1] / 100
+        if score >= self.fuzzy_threshold:
+            return FAQMatch(*entries[title_key], score, "fuzzy")
+        if self.embed is not None and score >= self.embedding_candidate_threshold:
+            similarity = self._embedding_similarity(query, entries[title_key])
+            if similarity >= self.embedding_threshold:
+                return FAQMatch(*entries[title_key], similarity, "embedding")
+        return None
+
+    def _embedding_similarity(self, query, entry):
+        entry_id, title, _ = entry
+        try:
+            title_embedding = self._title_embeddings.get(entry_id)
+            if title_embedding is None:
+                title_embedding = self.embed(title)
+                if title_embedding is None:
+                    return 0.0
+                self._title_embeddings[entry_id] = title_embedding
+            query_embedding = self.embed(query)
+            return _cosine(query_embedding, title_embedding) if query_embedding else 0.0
+        except Exception as e:
+            logging.warning(f"FAQ embedding match failed: {e}")
+            return 0.0
+
+
+faq_index = FAQIndex(embed=embed_query)
+
+
+def match_faq(query, language="en-US"):
+    """Match against the FAQ rows, rebuilding them from the BM25 index whenever that has changed."""
+    if not ensure_lexical_index():
+        return None
+    if faq_index.source_version != lexical_index.version:
+        faq_index.rebuild(lexical_index.documents(), lexical_index.version)
+        logging.info(f"FAQ index rebuilt with {len(faq_index)} question titles")
+    return faq_index.match(query, language)
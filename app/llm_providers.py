@@ -0,0 +1,318 @@
+# app/llm_providers.py
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from groq import Groq
+from openai import OpenAI
+
+from app.config import (
+    OPENAI_API_KEY, GROQ_API_KEY, GROQ_BASE_URL, OPENAI_BASE_URL,
+    LLM_REQUEST_TIMEOUT, LLM_HEDGE_ENABLED, LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_DEFAULT_DELAY, LLM_HEDGE_MIN_DELAY
+)
+from app.resilience import get_breaker, remaining_time, raise_if_cancelled
+from app.metrics import observe_llm, observe_cancelled_stream
+from app.tracing import span, record_span
+from app.context_budget import count_message_tokens, count_tokens
+from app.llm_scheduler import llm_scheduler, SchedulerTimeoutError, STAGE_PRIORITIES, PRIORITY_INTERACTIVE
+
+# Default model per provider, also used as the equivalent model when failing over
+DEFAULT_MODELS = {
+    "groq": "llama-3.3-70b-versatile",
+    "openai": "gpt-4o-mini",
+}
+
+
+class LLMUnavailableError(Exception):
+    """Raised when none of the candidate providers could serve a request."""
+
+
+class LatencyTracker:
+    """Rolling window of latencies per (provider, model, metric) with percentile lookups."""
+
+    def __init__(self, window_size=200):
+        self._samples = defaultdict(lambda: deque(maxlen=window_size))
+        self._lock = threading.Lock()
+
+    def record(self, provider, model, metric, seconds):
+        with self._lock:
+            self._samples[(provider, model, metric)].append(seconds)
+        observe_llm(provider, model, metric, seconds)
+
+    def count(self, provider, model, metric):
+        with self._lock:
+            return len(self._samples.get((provider, model, metric), ()))
+
+    def percentile(self, provider, model, metric, pct):
+        with self._lock:
+            samples = sorted(self._samples.get((provider, model, metric), ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self):
+        """Return {"provider:model": {metric: {"count", "p50", "p95", "p99"}}} for logging/metrics."""
+        with self._lock:
+            keys = list(self._samples.keys())
+        result = {}
+        for provider, model, metric in keys:
+            result.setdefault(f"{provider}:{model}", {})[metric] = {
+                "count": self.count(provider, model, metric),
+                "p50": self.percentile(provider, model, metric, 50),
+                "p95": self.percentile(provider, model, metric, 95),
+                "p99": self.percentile(provider, model, metric, 99),
+            }
+        return result
+
+
+class LLMProvider:
+    """Thin wrapper around an OpenAI-compatible chat completions client."""
+
+    def __init__(self, name, client, default_model):
+        self.name = name
+        self.client = client
+        self.default_model = default_model
+
+    def create(self, model, messages, temperature, max_tokens, stream=False, timeout=None):
+        return self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=stream,
+            timeout=timeout
+        )
+
+
+class _StreamHandle:
+    """An opened upstream stream whose first content chunk has already been read."""
+
+    def __init__(self, provider, model, stream, iterator, first_text, started):
+        self.provider = provider
+        self.model = model
+        self.stream = stream
+        self.iterator = iterator
+        self.first_text = first_text
+        self.started = started
+
+    def close(self):
+        close = getattr(self.stream, "close", None)
+        if close:
+            try:
+                close()
+            except Exception as e:
+                logging.debug(f"Error closing {self.provider} stream: {e}")
+
+
+def _discard_result(future):
+    """Done-callback for losing hedged attempts: release any stream they opened."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    result = future.result()
+    if isinstance(result, _StreamHandle):
+        result.close()
+
+
+class LLMGateway:
+    """
+    Routes chat completions to a primary provider with failover to the other providers
+    and hedged second requests when the primary is slower than its own recent p95.
+    """
+
+    def __init__(self, providers, tracker=None, request_timeout=LLM_REQUEST_TIMEOUT,
+                 hedge_enabled=LLM_HEDGE_ENABLED, hedge_min_samples=LLM_HEDGE_MIN_SAMPLES,
+                 hedge_default_delay=LLM_HEDGE_DEFAULT_DELAY, hedge_min_delay=LLM_HEDGE_MIN_DELAY,
+                 max_workers=16, scheduler=None):
+        self.providers = providers
+        self.tracker = tracker or LatencyTracker()
+        self.request_timeout = request_timeout
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.scheduler = scheduler
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+
+    def candidates(self, provider, model=None):
+        """Ordered (provider, model) pairs: the requested one first, then the other providers."""
+        primary = self.providers[provider]
+        result = [(primary, model or primary.default_model)]
+        for name, other in self.providers.items():
+            if name != provider:
+                result.append((other, other.default_model))
+        return result
+
+    def hedge_delay(self, provider_name, model):
+        """Time to wait for a first token before hedging: the current p95, or a default while warming up."""
+        if self.tracker.count(provider_name, model, "ttft") < self.hedge_min_samples:
+            delay = self.hedge_default_delay
+        else:
+            delay = self.tracker.percentile(provider_name, model, "ttft", 95)
+        return max(delay, self.hedge_min_delay)
+
+    def complete(self, stage, messages, provider="groq", model=None, temperature=0.0, max_tokens=256):
+        """Return the message content of a non-streaming completion."""
+        return self._run(stage, self.candidates(provider, model), self._complete_attempt,
+                         messages, temperature, max_tokens)
+
+    def stream(self, stage, messages, provider="groq", model=None, temperature=0.5, max_tokens=300):
+        """Yield content deltas of a streaming completion from whichever provider answers first."""
+        handle = self._run(stage, self.candidates(provider, model), self._stream_attempt,
+                           messages, temperature, max_tokens)
+        streamed = []
+        try:
+            if handle.first_text:
+                streamed.append(handle.first_text)
+                yield handle.first_text
+            for chunk in handle.iterator:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    streamed.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        except GeneratorExit:
+            # the consumer went away (client disconnected): closing the stream below stops generation
+            self._record_abandoned_stream(handle, "".join(streamed), max_tokens)
+            raise
+        finally:
+            self.tracker.record(handle.provider, handle.model, "total", time.monotonic() - handle.started)
+            record_span("llm_stream", handle.started, stage=stage, provider=handle.provider, model=handle.model)
+            handle.close()
+
+    @staticmethod
+    def _record_abandoned_stream(handle, text, max_tokens):
+        generated = count_tokens(text, handle.model)
+        saved = max(0, max_tokens - generated)
+        elapsed = time.monotonic() - handle.started
+        # at the rate this stream was producing tokens, the rest would have taken saved / rate seconds
+        seconds_freed = saved * elapsed / generated if generated else 0.0
+        observe_cancelled_stream(handle.provider, handle.model, saved, seconds_freed)
+        logging.info(f"Closed abandoned {handle.provider}/{handle.model} stream after {generated} tokens "
+                     f"(~{saved} tokens not generated)")
+
+    def _complete_attempt(self, provider, model, timeout, messages, temperature, max_tokens):
+        started = time.monotonic()
+        completion = provider.create(model, messages, temperature, max_tokens, timeout=timeout)
+        elapsed = time.monotonic() - started
+        self.tracker.record(provider.name, model, "ttft", elapsed)
+        self.tracker.record(provider.name, model, "total", elapsed)
+        return completion.choices[0].message.content or ""
+
+    def _stream_attempt(self, provider, model, timeout, messages, temperature, max_tokens):
+        started = time.monotonic()
+        stream = provider.create(model, messages, temperature, max_tokens, stream=True, timeout=timeout)
+        iterator = iter(stream)
+        for chunk in iterator:
+            if chunk.choices and chunk.choices[0].delta.content:
+                self.tracker.record(provider.name, model, "ttft", time.monotonic() - started)
+                return _StreamHandle(provider.name, model, stream, iterator, chunk.choices[0].delta.content, started)
+        return _StreamHandle(provider.name, model, stream, iterator, "", started)
+
+    def _guarded(self, stage, attempt, provider, model, timeout, messages, temperature, max_tokens):
+        """Wait for rate-limit admission, run one attempt and feed its outcome to the provider's circuit breaker."""
+        with span("llm", stage=stage, provider=provider.name, model=model) as current:
+            if self.scheduler is not None:
+                tokens = count_message_tokens(messages, model) + max_tokens
+                priority = STAGE_PRIORITIES.get(stage, PRIORITY_INTERACTIVE)
+                waited = self.scheduler.acquire(provider.name, model, tokens, priority, timeout=timeout)
+                self.tracker.record(provider.name, model, "queue_wait", waited)
+                current.set("estimated_tokens", tokens)
+                current.set("queue_wait_ms", round(waited * 1000, 1))
+                timeout -= waited
+                if timeout <= 0:
+                    raise SchedulerTimeoutError(f"No time left for {provider.name}/{model} after queueing {waited:.2f}s")
+
+            breaker = get_breaker(provider.name)
+            try:
+                result = attempt(provider, model, timeout, messages, temperature, max_tokens)
+            except Exception:
+                breaker.record_failure()
+                raise
+            breaker.record_success()
+            return result
+
+    def _run(self, stage, candidates, attempt, *args):
+        raise_if_cancelled(f"LLM call for '{stage}'")
+        fallbacks = list(candidates)
+        pending = {}
+        errors = []
+
+        # Bounded by the request deadline when one is active (executor threads don't see it, so compute here)
+        attempt_timeout = self.request_timeout
+        remaining = remaining_time()
+        if remaining is not None:
+            attempt_timeout = min(attempt_timeout, remaining)
+        if attempt_timeout <= 0:
+            raise LLMUnavailableError(f"Request deadline exceeded before '{stage}'")
+
+        def launch(reason):
+            while fallbacks:
+                provider, model = fallbacks.pop(0)
+                if not get_breaker(provider.name).allow():
+                    errors.append(f"{provider.name}: circuit open")
+                    logging.warning(f"LLM {stage}: skipping {provider.name}, circuit breaker is open")
+                    continue
+                if reason != "primary":
+                    logging.warning(f"LLM {stage}: {reason} to {provider.name}/{model}")
+                # run in a copy of the caller's context so the attempt's span joins the request trace
+                context = contextvars.copy_context()
+                future = self._executor.submit(context.run, self._guarded, stage, attempt, provider, model,
+                                               attempt_timeout, *args)
+                pending[future] = (provider.name, model)
+                return provider.name, model
+            return None
+
+        launched = launch("primary")
+        primary_name, primary_model = launched or (candidates[0][0].name, candidates[0][1])
+        hedge_delay = self.hedge_delay(primary_name, primary_model) \
+            if self.hedge_enabled and fallbacks else None
+        deadline = time.monotonic() + attempt_timeout
+
+        while pending:
+            timeout = max(0.0, deadline - time.monotonic())
+            if hedge_delay is not None:
+                timeout = min(timeout, hedge_delay)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                if hedge_delay is not None and fallbacks:
+                    hedge_delay = None
+                    launch(f"{primary_name}/{primary_model} slower than {timeout:.2f}s, hedging")
+                    continue
+                errors.append(f"timed out after {attempt_timeout:.1f}s")
+                break
+
+            for future in done:
+                provider_name, model = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.warning(f"LLM {stage}: {provider_name}/{model} failed: {e}")
+                    errors.append(f"{provider_name}/{model}: {e}")
+                    if fallbacks:
+                        hedge_delay = None
+                        launch("failing over")
+                    continue
+
+                for other in pending:
+                    other.add_done_callback(_discard_result)
+                if provider_name != primary_name:
+                    logging.info(f"LLM {stage}: served by {provider_name}/{model} instead of {primary_name}")
+                return result
+
+        for other in pending:
+            other.add_done_callback(_discard_result)
+        raise LLMUnavailableError(f"No LLM provider could serve '{stage}': {'; '.join(errors)}")
+
+
+# Clients have SDK retries disabled: the gateway fails over to the other provider instead.
+groq_client = Groq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL, max_retries=0)
+openai_client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0)
+
+llm_gateway = LLMGateway({
+    "groq": LLMProvider("groq", groq_client, DEFAULT_MODELS["groq"]),
+    "openai": LLMProvider("openai", openai_client, DEFAULT_MODELS["openai"]),
+}, scheduler=llm_scheduler)
@@ -0,0 +1,220 @@
+# app/llm_scheduler.py
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from app.config import (
+    GROQ_RPM_LIMIT, GROQ_TPM_LIMIT, OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT,
+    LLM_SCHEDULER_BACKEND, LLM_SCHEDULER_MAX_WAIT
+)
+from app.redis_client import get_redis, redis_available, redis_health
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# Stages that never block a user waiting for a reply ("summarize_reply", asked for by the user, is interactive)
+STAGE_PRIORITIES = {
+    "summarize": PRIORITY_BACKGROUND,
+    "shadow": PRIORITY_BACKGROUND,  # model router agreement checks
+}
+
+# (requests/min, tokens/min) per provider; individual models can be overridden in MODEL_LIMITS
+PROVIDER_LIMITS = {
+    "groq": (GROQ_RPM_LIMIT, GROQ_TPM_LIMIT),
+    "openai": (OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT),
+}
+MODEL_LIMITS = {}
+
+# Refills both buckets of one provider/model from Redis server time and takes 1 request + N tokens
+# if both have room. Returns 0 when admitted, otherwise the milliseconds until there will be room.
+TOKEN_BUCKET_SCRIPT = """
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local cost = math.min(tonumber(ARGV[3]), tpm)
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local data = redis.call('HMGET', KEYS[1], 'req', 'tok', 'ts')
+local ts = tonumber(data[3]) or now
+local elapsed = math.max(0, now - ts)
+local req = math.min(rpm, (tonumber(data[1]) or rpm) + elapsed * rpm / 60000)
+local tok = math.min(tpm, (tonumber(data[2]) or tpm) + elapsed * tpm / 60000)
+local wait = 0
+if req < 1 then wait = math.max(wait, (1 - req) * 60000 / rpm) end
+if tok < cost then wait = math.max(wait, (cost - tok) * 60000 / tpm) end
+if wait > 0 then return math.ceil(wait) end
+redis.call('HSET', KEYS[1], 'req', tostring(req - 1), 'tok', tostring(tok - cost), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], 120000)
+return 0
+"""
+
+
+class SchedulerTimeoutError(Exception):
+    """Raised when a call could not be admitted within its rate limits before the wait ran out."""
+
+
+class LocalTokenBuckets:
+    """In-process requests/min + tokens/min buckets; used alone or as the fallback when Redis is down."""
+
+    backend = "memory"
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key, rpm, tpm, tokens):
+        """Take 1 request and `tokens` tokens. Returns 0 when admitted, else seconds until there is room."""
+        cost = min(tokens, tpm)
+        now = time.monotonic()
+        with self._lock:
+            req, tok, ts = self._buckets.get(key, (rpm, tpm, now))
+            elapsed = now - ts
+            req = min(rpm, req + elapsed * rpm / 60)
+            tok = min(tpm, tok + elapsed * tpm / 60)
+            wait = 0.0
+            if req < 1:
+                wait = max(wait, (1 - req) * 60 / rpm)
+            if tok < cost:
+                wait = max(wait, (cost - tok) * 60 / tpm)
+            if wait > 0:
+                self._buckets[key] = (req, tok, now)
+                return wait
+            self._buckets[key] = (req - 1, tok - cost, now)
+            return 0.0
+
+
+class RedisTokenBuckets:
+    """Buckets shared by every worker, updated atomically by a Lua script."""
+
+    backend = "redis"
+    key_prefix = "llm_bucket:"
+
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+        self._script = None
+        self.fallback = LocalTokenBuckets()
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis()
+        return self._redis
+
+    def try_acquire(self, key, rpm, tpm, tokens):
+        if not redis_available():
+            return self.fallback.try_acquire(key, rpm, tpm, tokens)
+        try:
+            if self._script is None:
+                self._script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+            wait_ms = self._script(keys=[self.key_prefix + key], args=[rpm, tpm, tokens])
+            return int(wait_ms) / 1000
+        except Exception as e:
+            redis_health.record_failure(e)
+            logging.error(f"LLM rate limit buckets unavailable in Redis, using local buckets: {e}")
+            return self.fallback.try_acquire(key, rpm, tpm, tokens)
+
+
+class _KeyQueue:
+    """Waiters for one provider/model, ordered by (priority, arrival)."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.heap = []
+        self.admitted = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class LLMScheduler:
+    """
+    Admits LLM calls within each provider/model's requests/min and tokens/min limits. Calls that
+    don't fit wait in a priority queue, so interactive stages are admitted before background ones.
+    """
+
+    def __init__(self, buckets=None, provider_limits=None, model_limits=None, max_wait=LLM_SCHEDULER_MAX_WAIT):
+        self.buckets = buckets if buckets is not None else LocalTokenBuckets()
+        self.provider_limits = provider_limits if provider_limits is not None else PROVIDER_LIMITS
+        self.model_limits = model_limits if model_limits is not None else MODEL_LIMITS
+        self.max_wait = max_wait
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def limits(self, provider, model):
+        return self.model_limits.get((provider, model)) or self.provider_limits.get(provider)
+
+    def _queue(self, key):
+        with self._lock:
+            if key not in self._queues:
+                self._queues[key] = _KeyQueue()
+            return self._queues[key]
+
+    def acquire(self, provider, model, tokens, priority=PRIORITY_INTERACTIVE, timeout=None):
+        """Block until the call may be sent; returns the seconds spent queued."""
+        limits = self.limits(provider, model)
+        if limits is None:
+            return 0.0
+        rpm, tpm = limits
+        key = f"{provider}:{model}"
+        queue = self._queue(key)
+        started = time.monotonic()
+        deadline = started + min(self.max_wait, timeout if timeout is not None else self.max_wait)
+        entry = (priority, next(self._sequence))
+
+        with queue.condition:
+            heapq.heappush(queue.heap, entry)
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if queue.heap[0] == entry:
+                        wait = self.buckets.try_acquire(key, rpm, tpm, tokens)
+                        if wait <= 0:
+                            waited = time.monotonic() - started
+                            queue.admitted += 1
+                            queue.total_wait += waited
+                            queue.max_wait = max(queue.max_wait, waited)
+                            if waited > 1:
+                                logging.warning(f"LLM call to {key} queued {waited:.2f}s for rate limits")
+                            return waited
+                        if remaining <= 0:
+                            break
+                        queue.condition.wait(min(wait, remaining))
+                    else:
+                        if remaining <= 0:
+                            break
+                        queue.condition.wait(remaining)
+                queue.timeouts += 1
+                raise SchedulerTimeoutError(
+                    f"Rate limits for {key} left no room for {tokens} tokens within {deadline - started:.1f}s")
+            finally:
+                queue.heap.remove(entry)
+                heapq.heapify(queue.heap)
+                queue.condition.notify_all()
+
+    def stats(self):
+        """Queue depth and wait times per provider/model, to see saturation before the provider rejects us."""
+        with self._lock:
+            queues = dict(self._queues)
+        result = {"backend": self.buckets.backend, "queues": {}}
+        for key, queue in queues.items():
+            with queue.condition:
+                result["queues"][key] = {
+                    "queued": len(queue.heap),
+                    "admitted": queue.admitted,
+                    "timeouts": queue.timeouts,
+                    "avg_wait": queue.total_wait / queue.admitted if queue.admitted else 0.0,
+                    "max_wait": queue.max_wait,
+                }
+        return result
+
+
+def create_llm_scheduler(backend=LLM_SCHEDULER_BACKEND):
+    if backend == "redis":
+        return LLMScheduler(RedisTokenBuckets())
+    return LLMScheduler(LocalTokenBuckets())
+
+
+llm_scheduler = create_llm_scheduler()
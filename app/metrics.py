@@ -0,0 +1,247 @@
+# app/metrics.py
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+)
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+
+from app.tracing import span, annotate_trace
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+KNOWN_LANGUAGES = {"en-US", "nl-NL"}
+
+STAGE_DURATION = Histogram(
+    "bravur_stage_duration_seconds", "Duration of one pipeline stage of a chat or speech turn",
+    ["stage", "intent", "language"], buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter(
+    "bravur_stage_errors_total", "Pipeline stages that raised an exception",
+    ["stage", "intent", "language"]
+)
+CHAT_TURNS = Counter(
+    "bravur_chat_turns_total", "Chat turns handled, by final intent",
+    ["intent", "language"]
+)
+CHAT_RESPONSES = Counter(
+    "bravur_chat_responses_total", "Chat turns by the path that produced the reply (faq, rag, it_trends, ...)",
+    ["path", "language"]
+)
+LLM_LATENCY = Histogram(
+    "bravur_llm_latency_seconds", "LLM time to first token, total generation and rate-limit queue wait",
+    ["provider", "model", "metric"], buckets=LATENCY_BUCKETS
+)
+AGENT_DURATION = Histogram(
+    "bravur_agent_duration_seconds", "Agent executions by outcome (ok, error, timeout, rejected, cancelled)",
+    ["agent", "outcome"], buckets=LATENCY_BUCKETS
+)
+
+CANCELLED_TURNS = Counter(
+    "bravur_cancelled_turns_total", "Chat turns whose client disconnected before the reply finished",
+    ["mode"]
+)
+CANCELLED_TOKENS_SAVED = Counter(
+    "bravur_cancelled_tokens_saved_total",
+    "Completion tokens not generated because an abandoned stream was closed (max_tokens minus tokens streamed)",
+    ["provider", "model"]
+)
+CANCELLED_WORKER_SECONDS = Counter(
+    "bravur_cancelled_worker_seconds_freed_total",
+    "Estimated generation time saved by closing the upstream streams of abandoned turns",
+    ["provider", "model"]
+)
+TRANSCODE_DURATION = Histogram(
+    "bravur_transcode_duration_seconds", "ffmpeg runs converting uploads to WAV, by strategy and outcome",
+    ["strategy", "outcome"], buckets=LATENCY_BUCKETS
+)
+TRANSCODE_QUEUE_WAIT = Histogram(
+    "bravur_transcode_queue_wait_seconds", "Time an upload waited for a free transcoding worker",
+    buckets=LATENCY_BUCKETS
+)
+
+# Labels of the turn being handled; a mutable dict so the intent can be refined after the turn started
+_turn_labels = ContextVar("turn_labels", default=None)
+
+
+def _normalize_language(language):
+    return language if language in KNOWN_LANGUAGES else "other"
+
+
+def start_turn(language, intent="unclassified"):
+    labels = {"intent": intent, "language": _normalize_language(language)}
+    _turn_labels.set(labels)
+    annotate_trace(intent=intent, language=language)
+    return labels
+
+
+def set_intent(intent):
+    labels = _turn_labels.get()
+    if labels is not None:
+        labels["intent"] = intent
+    annotate_trace(intent=intent)
+
+
+def set_response_path(path):
+    """Record which path served the turn's reply, e.g. "faq" for the no-LLM fast path."""
+    labels = _turn_labels.get()
+    if labels is not None:
+        labels["path"] = path
+    annotate_trace(response_path=path)
+
+
+def finish_turn():
+    labels = _turn_labels.get()
+    if labels is not None:
+        CHAT_TURNS.labels(labels["intent"], labels["language"]).inc()
+        CHAT_RESPONSES.labels(labels.get("path", "other"), labels["language"]).inc()
+
+
+def current_labels():
+    labels = _turn_labels.get()
+    if labels is None:
+        return "none", "other"
+    return labels["intent"], labels["language"]
+
+
+@contextmanager
+def stage_timer(stage, **attributes):
+    """
+    Time a block as `stage`, labelled with the intent and language of the current turn.
+    The block is also recorded as a trace span, which is yielded for extra attributes.
+    """
+    started = time.perf_counter()
+    with span(stage, **attributes) as current:
+        try:
+            yield current
+        except Exception:
+            STAGE_ERRORS.labels(stage, *current_labels()).inc()
+            raise
+        finally:
+            STAGE_DURATION.labels(stage, *current_labels()).observe(time.perf_counter() - started)
+
+
+def timed(stage):
+    """Decorator form of stage_timer."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def chat_turn(fn):
+    """Decorator for a streaming turn handler(user_input, session_id, language): labels and times the whole turn."""
+    @wraps(fn)
+    def wrapper(user_input, session_id=None, language="en-US"):
+        start_turn(language)
+        try:
+            with stage_timer("turn"):
+                yield from fn(user_input, session_id, language)
+        finally:
+            finish_turn()
+    return wrapper
+
+
+def observe_llm(provider, model, metric, seconds):
+    LLM_LATENCY.labels(provider, model, metric).observe(seconds)
+
+
+def observe_cancelled_turn(mode):
+    CANCELLED_TURNS.labels(mode).inc()
+
+
+def observe_cancelled_stream(provider, model, tokens_saved, seconds_freed):
+    CANCELLED_TOKENS_SAVED.labels(provider, model).inc(tokens_saved)
+    CANCELLED_WORKER_SECONDS.labels(provider, model).inc(seconds_freed)
+
+
+def observe_agent(agent, outcome, seconds):
+    AGENT_DURATION.labels(agent, outcome).observe(seconds)
+
+
+def observe_transcode(strategy, outcome, seconds):
+    TRANSCODE_DURATION.labels(strategy, outcome).observe(seconds)
+
+
+def observe_transcode_wait(seconds):
+    TRANSCODE_QUEUE_WAIT.observe(seconds)
+
+
+class RuntimeStatsCollector:
+    """Exports the in-process stats (breakers, LLM queues, search cache, transcoding, session state) at scrape time."""
+
+    def describe(self):
+        # No static description, so registering doesn't trigger a collect (and its imports) at startup
+        return []
+
+    def collect(self):
+        from app.resilience import breaker_snapshot
+        from app.llm_scheduler import llm_scheduler
+        from app.web import serper_client
+        from app.session_state import session_state_store
+        from app.transcoder import transcoder
+
+        breaker_open = GaugeMetricFamily(
+            "bravur_circuit_breaker_open", "1 when the dependency's circuit breaker is open or half-open",
+            labels=["dependency"])
+        breaker_failures = CounterMetricFamily(
+            "bravur_dependency_failures", "Failed calls per outbound dependency", labels=["dependency"])
+        for name, state in breaker_snapshot().items():
+            breaker_open.add_metric([name], 0 if state["state"] == "closed" else 1)
+            breaker_failures.add_metric([name], state["failures"])
+        yield breaker_open
+        yield breaker_failures
+
+        queued = GaugeMetricFamily(
+            "bravur_llm_queue_depth", "LLM calls waiting for rate-limit admission", labels=["key"])
+        timeouts = CounterMetricFamily(
+            "bravur_llm_queue_timeouts", "LLM calls that could not be admitted in time", labels=["key"])
+        for key, stats in llm_scheduler.stats()["queues"].items():
+            queued.add_metric([key], stats["queued"])
+            timeouts.add_metric([key], stats["timeouts"])
+        yield queued
+        yield timeouts
+
+        search = CounterMetricFamily(
+            "bravur_web_search_lookups", "Serper lookups by cache outcome", labels=["outcome"])
+        for outcome, count in serper_client.stats.items():
+            search.add_metric([outcome], count)
+        yield search
+
+        transcoding = transcoder.snapshot()
+        yield GaugeMetricFamily("bravur_transcode_queue_depth", "Uploads waiting for a transcoding worker",
+                                value=transcoding["queued"])
+        yield GaugeMetricFamily("bravur_transcode_active", "ffmpeg processes currently running",
+                                value=transcoding["active"])
+
+        session_stats = session_state_store.stats()
+        for field in ("entries", "bytes", "evictions", "writes", "bytes_written"):
+            if field in session_stats:
+                yield GaugeMetricFamily(f"bravur_session_state_{field}", f"Session state store {field}",
+                                        value=session_stats[field])
+
+
+def _build_registry():
+    # Under gunicorn with PROMETHEUS_MULTIPROC_DIR set, aggregate the histograms of all workers
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    registry.register(RuntimeStatsCollector())
+    return registry
+
+
+metrics_registry = _build_registry()
+
+
+def render_metrics():
+    """Return (body, content_type) for the /metrics endpoint."""
+    return generate_latest(metrics_registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,229 @@
+# app/model_router.py
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from rapidfuzz import fuzz
+
+from app.config import MODEL_ROUTES_PATH, MODEL_ROUTES_RELOAD_SECONDS
+
+# Used until the routes file has been loaded, and for stages it doesn't list
+DEFAULT_ROUTE = {"provider": "groq", "model": "llama-3.3-70b-versatile"}
+MAX_SHADOWS_IN_FLIGHT = 4
+
+
+def _normalize_label(text):
+    return re.sub(r"[^a-z0-9 ]", "", (text or "").lower()).strip()
+
+
+def outputs_agree(mode, candidate, reference, similarity_threshold=0.6):
+    """Whether a candidate model's output is an acceptable substitute for the reference model's."""
+    if mode == "exact":
+        return _normalize_label(candidate) == _normalize_label(reference)
+    if mode == "nonempty":
+        return bool(candidate and candidate.strip())
+    return fuzz.token_set_ratio(candidate or "", reference or "") / 100 >= similarity_threshold
+
+
+class _RouteStats:
+    """Rolling latency and agreement-with-reference samples for one (stage, model)."""
+
+    def __init__(self, window=200):
+        self.latencies = deque(maxlen=window)
+        self.agreements = deque(maxlen=window)
+
+    def p50(self):
+        samples = sorted(self.latencies)
+        return samples[len(samples) // 2] if samples else None
+
+    def agreement(self):
+        return sum(self.agreements) / len(self.agreements) if self.agreements else None
+
+
+class ModelRouter:
+    """
+    Routes each pipeline stage to the fastest candidate model whose answers agree with the stage's
+    reference model (the last candidate) at least `agreement_threshold` of the time. Agreement is
+    measured by occasionally re-running a request on another candidate in the background ("shadowing").
+    The routes file is re-read when it changes, so routing can be tuned without a restart.
+    """
+
+    def __init__(self, gateway=None, path=MODEL_ROUTES_PATH, reload_seconds=MODEL_ROUTES_RELOAD_SECONDS):
+        self._gateway = gateway
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.config = {"enabled": False, "stages": {}}
+        self._mtime = None
+        self._checked_at = 0.0
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._shadow_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="shadow")
+        self._shadows_in_flight = 0
+        self.reload()
+
+    @property
+    def gateway(self):
+        if self._gateway is None:
+            from app.llm_providers import llm_gateway
+            self._gateway = llm_gateway
+        return self._gateway
+
+    # --- configuration ---
+
+    def reload(self):
+        """Load the routes file; an invalid file is logged and the previous routes are kept."""
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, encoding="utf-8") as f:
+                config = json.load(f)
+            for stage, route in config.get("stages", {}).items():
+                if not route.get("candidates"):
+                    raise ValueError(f"stage '{stage}' has no candidates")
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not load model routes from {self.path}, keeping current routes: {e}")
+            return False
+        with self._lock:
+            self.config = config
+            self._mtime = mtime
+        logging.info(f"Loaded model routes for stages: {', '.join(config.get('stages', {}))}")
+        return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_seconds:
+            return
+        self._checked_at = now
+        try:
+            if os.path.getmtime(self.path) != self._mtime:
+                self.reload()
+        except OSError:
+            pass
+
+    def _candidates(self, stage):
+        route = self.config.get("stages", {}).get(stage)
+        if not route:
+            return [(DEFAULT_ROUTE["provider"], DEFAULT_ROUTE["model"])]
+        return [(c["provider"], c["model"]) for c in route["candidates"]]
+
+    def _route_stats(self, stage, candidate):
+        key = (stage, candidate)
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = _RouteStats()
+            return self._stats[key]
+
+    # --- routing ---
+
+    def route(self, stage):
+        """(provider, model) to use for `stage` right now."""
+        self._maybe_reload()
+        candidates = self._candidates(stage)
+        reference = candidates[-1]
+        if not self.config.get("enabled", True) or len(candidates) == 1:
+            return reference
+
+        threshold = self.config.get("agreement_threshold", 0.95)
+        min_samples = self.config.get("min_samples", 30)
+        best, best_latency = reference, self._route_stats(stage, reference).p50()
+        for candidate in candidates[:-1]:
+            stats = self._route_stats(stage, candidate)
+            agreement = stats.agreement()
+            if len(stats.agreements) < min_samples or agreement is None or agreement < threshold:
+                continue
+            latency = stats.p50()
+            if latency is not None and (best_latency is None or latency < best_latency):
+                best, best_latency = candidate, latency
+        return best
+
+    def complete(self, stage, messages, temperature=0.0, max_tokens=256, route=None):
+        """Run `stage` on `route` (a (provider, model) from route(), so callers log what actually served it)."""
+        provider, model = route or self.route(stage)
+        started = time.monotonic()
+        output = self.gateway.complete(stage, messages, provider=provider, model=model,
+                                       temperature=temperature, max_tokens=max_tokens)
+        self._route_stats(stage, (provider, model)).latencies.append(time.monotonic() - started)
+        self._maybe_shadow(stage, (provider, model), messages, temperature, max_tokens, output)
+        return output
+
+    def stream(self, stage, messages, temperature=0.5, max_tokens=300, route=None):
+        provider, model = route or self.route(stage)
+        started = time.monotonic()
+        chunks = []
+        for chunk in self.gateway.stream(stage, messages, provider=provider, model=model,
+                                         temperature=temperature, max_tokens=max_tokens):
+            chunks.append(chunk)
+            yield chunk
+        self._route_stats(stage, (provider, model)).latencies.append(time.monotonic() - started)
+        self._maybe_shadow(stage, (provider, model), messages, temperature, max_tokens, "".join(chunks))
+
+    # --- agreement tracking ---
+
+    def _maybe_shadow(self, stage, served, messages, temperature, max_tokens, output):
+        candidates = self._candidates(stage)
+        if len(candidates) < 2 or not self.config.get("enabled", True):
+            return
+        reference = candidates[-1]
+        if served == reference:
+            # explore: compare the least-tested cheaper candidate against this reference answer
+            candidate = min(candidates[:-1], key=lambda c: len(self._route_stats(stage, c).agreements))
+        else:
+            candidate = served  # keep verifying the candidate we're routing to
+        warming_up = len(self._route_stats(stage, candidate).agreements) < self.config.get("min_samples", 30)
+        rate = self.config.get("warmup_shadow_rate" if warming_up else "shadow_rate", 0.05)
+        if random.random() >= rate:
+            return
+        with self._lock:
+            if self._shadows_in_flight >= MAX_SHADOWS_IN_FLIGHT:
+                return
+            self._shadows_in_flight += 1
+        self._shadow_executor.submit(self._shadow, stage, served, candidate, reference, messages,
+                                     temperature, max_tokens, output)
+
+    def _shadow(self, stage, served, candidate, reference, messages, temperature, max_tokens, output):
+        try:
+            other = reference if served == candidate else candidate
+            started = time.monotonic()
+            # "shadow" runs at background priority in the LLM scheduler
+            other_output = self.gateway.complete("shadow", messages, provider=other[0], model=other[1],
+                                                 temperature=temperature, max_tokens=max_tokens)
+            self._route_stats(stage, other).latencies.append(time.monotonic() - started)
+            candidate_output, reference_output = (output, other_output) if served == candidate \
+                else (other_output, output)
+            self.record_agreement(stage, candidate, candidate_output, reference_output)
+        except Exception as e:
+            logging.warning(f"Shadow comparison for stage '{stage}' failed: {e}")
+        finally:
+            with self._lock:
+                self._shadows_in_flight -= 1
+
+    def record_agreement(self, stage, candidate, candidate_output, reference_output):
+        mode = self.config.get("stages", {}).get(stage, {}).get("agreement", "similarity")
+        agreed = outputs_agree(mode, candidate_output, reference_output, self.config.get("similarity_threshold", 0.6))
+        self._route_stats(stage, candidate).agreements.append(1 if agreed else 0)
+        return agreed
+
+    def stats(self):
+        with self._lock:
+            items = list(self._stats.items())
+        result = {}
+        for (stage, (provider, model)), stats in items:
+            agreement = stats.agreement()
+            p50 = stats.p50()
+            result.setdefault(stage, {"routed_to": None, "models": {}})["models"][f"{provider}:{model}"] = {
+                "samples": len(stats.latencies),
+                "p50_seconds": round(p50, 3) if p50 is not None else None,
+                "comparisons": len(stats.agreements),
+                "agreement": round(agreement, 3) if agreement is not None else None,
+            }
+        for stage in result:
+            result[stage]["routed_to"] = ":".join(self.route(stage))
+        return result
+
+
+model_router = ModelRouter()
@@ -1,32 +1,19 @@
+import math
+import threading
 import time
 import logging
-import redis
-import os
-from app.config import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD, REDIS_USER
-
-try:
-    r = redis.StrictRedis(
-        host=REDIS_HOST,
-        port=int(REDIS_PORT),
-        db=int(REDIS_DB),
-        username=REDIS_USER,
-        password=REDIS_PASSWORD,
-        decode_responses=True,
-        ssl=False,
-        socket_connect_timeout=5,  # seconds
-        socket_timeout=5,         # seconds
-        retry_on_timeout=True
-    )
-
-    r.ping()
-    print(f"Redis Connection Status: Successfully connected to Redis :)")
-    logging.info("Successfully connected to Redis for rate limiting using environment variables.")
-except redis.exceptions.ConnectionError as e:
-    logging.error(f"Could not connect to Redis for rate limiting. "
-                  f"Check REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD in your environment/config. "
-                  f"Error: {e}")
-    print(f"Redis Connection Status: ERROR - Could not connect to Redis: {e}")
-    raise Exception("Redis connection failed for rate limiting. Please check your Redis configuration.")
+import uuid
+from collections import Counter, OrderedDict
+from typing import NamedTuple
+from app.config import (
+    RATE_LIMIT_IP_ALGORITHM, RATE_LIMIT_SESSION_ALGORITHM, RATE_LIMIT_FINGERPRINT_ALGORITHM, RATE_LIMIT_FALLBACK_MAX_KEYS,
+    RATE_LIMIT_IP_LOCAL_TIER, RATE_LIMIT_IP_LOCAL_SHARE, RATE_LIMIT_IP_SYNC_SECONDS, RATE_LIMIT_IP_MAX_TRACKED
+)
+from app.metrics import timed
+from app.redis_client import get_redis, redis_available, redis_health
+
+# Shared pooled client; nothing connects until the first command
+r = get_redis()
 
 # Rate limit configuration
 SESSION_MAX_REQUESTS = 40
@@ -39,59 +26,342 @@ FINGERPRINT_MAX_REQUESTS = 5
 FINGERPRINT_WINDOW_SECONDS = 3600
 
 
-def check_session_rate_limit(session_id: str) -> tuple[bool, int, bool]:
-    key = f"rate_limit:session:{session_id}"
-    count = r.incr(key)
+# Each algorithm is one Lua script, so a check is a single atomic round trip:
+# KEYS[1] = state key, KEYS[2] = optional hash holding a per-identifier "limit" override
+# ARGV = default limit, window seconds, captcha ratio (0 = no CAPTCHA for this scope),
+#        cost (1 = count this request, 0 = only report), unique request id
+# Returns {allowed, retry_after, count, limit, captcha_required}; a CAPTCHA takes precedence over a denial
+_SCRIPT_PREAMBLE = """
+local limit = tonumber(ARGV[1])
+if KEYS[2] then limit = tonumber(redis.call('HGET', KEYS[2], 'limit')) or limit end
+local window, ratio, cost = tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local function decide(count, retry_after)
+    if ratio > 0 and count >= math.floor(limit * ratio) then return {1, 0, count, limit, 1} end
+    if count > limit then return {0, math.max(1, retry_after), count, limit, 0} end
+    return {1, 0, count, limit, 0}
+end
+"""
+
+# Fixed window: INCR + EXPIRE. Cheapest, but allows up to 2x the limit around a window boundary.
+FIXED_WINDOW_SCRIPT = _SCRIPT_PREAMBLE + """
+local count
+if cost > 0 then
+    count = redis.call('INCR', KEYS[1])
+    if count == 1 then redis.call('EXPIRE', KEYS[1], window) end
+else
+    count = tonumber(redis.call('GET', KEYS[1])) or 0
+end
+return decide(count, redis.call('TTL', KEYS[1]))
+"""
+
+# GCRA: one "theoretical arrival time" per key. Requests are spaced window/limit apart on average,
+# with a burst of at most `limit`; the count is how many intervals that time is ahead of now.
+GCRA_SCRIPT = _SCRIPT_PREAMBLE + """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local window_ms = window * 1000
+local interval = window_ms / limit
+local tat = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now)
+local count = math.ceil((tat - now) / interval - 1e-9)
+if cost == 0 then return decide(count, 0) end
+local new_tat = tat + interval
+if new_tat - now > window_ms then
+    return decide(count + 1, math.ceil((new_tat - window_ms - now) / 1000))
+end
+redis.call('SET', KEYS[1], string.format('%d', math.ceil(new_tat)), 'PX', math.ceil(new_tat - now))
+return decide(count + 1, 0)
+"""
+
+# Sliding log: a sorted set of request timestamps within the window. Exact, but O(limit) memory,
+# so it is meant for strict low-limit scopes.
+SLIDING_LOG_SCRIPT = _SCRIPT_PREAMBLE + """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local window_ms = window * 1000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window_ms)
+local count = redis.call('ZCARD', KEYS[1])
+if cost == 0 then return decide(count, 0) end
+if count >= limit then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return decide(count + 1, math.ceil((tonumber(oldest[2]) + window_ms - now) / 1000))
+end
+redis.call('ZADD', KEYS[1], now, ARGV[5])
+redis.call('PEXPIRE', KEYS[1], window_ms)
+return decide(count + 1, 0)
+"""
+
+RATE_LIMIT_SCRIPTS = {
+    "fixed_window": FIXED_WINDOW_SCRIPT,
+    "gcra": GCRA_SCRIPT,
+    "sliding_log": SLIDING_LOG_SCRIPT,
+}
+
+# State key per algorithm; fixed windows keep the original key names
+_KEY_PREFIXES = {"fixed_window": "rate_limit", "gcra": "rate_limit:gcra", "sliding_log": "rate_limit:log"}
+
+CAPTCHA_RATIO = 0.9  # ask for a CAPTCHA from 90% of the limit on
+
+# scope -> (default limit, window seconds, captcha ratio, has per-identifier limit override, algorithm)
+RATE_LIMIT_SCOPES = {
+    "session": (SESSION_MAX_REQUESTS, SESSION_WINDOW_SECONDS, CAPTCHA_RATIO, True, RATE_LIMIT_SESSION_ALGORITHM),
+    "ip": (IP_MAX_REQUESTS, IP_WINDOW_SECONDS, 0, False, RATE_LIMIT_IP_ALGORITHM),
+    "fingerprint": (FINGERPRINT_MAX_REQUESTS, FINGERPRINT_WINDOW_SECONDS, CAPTCHA_RATIO, False,
+                    RATE_LIMIT_FINGERPRINT_ALGORITHM),
+}
+
+for _scope, _settings in RATE_LIMIT_SCOPES.items():
+    if _settings[4] not in RATE_LIMIT_SCRIPTS:
+        raise ValueError(f"Unknown rate limit algorithm '{_settings[4]}' for scope '{_scope}'")
+
+# sent by SHA, loaded on first use
+_scripts = {algorithm: r.register_script(script) for algorithm, script in RATE_LIMIT_SCRIPTS.items()}
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    retry_after: int
+    count: int
+    limit: int
+    captcha_required: bool
+
+
+def _state_key(scope: str, identifier: str) -> str:
+    return f"{_KEY_PREFIXES[RATE_LIMIT_SCOPES[scope][4]]}:{scope}:{identifier}"
+
+
+class LocalFixedWindowLimiter:
+    """
+    In-process stand-in for the Redis scripts while Redis is degraded: fixed windows per key, with the
+    same result contract. Counts are per worker, and the least recently used keys beyond `max_keys`
+    are dropped so a flood of identifiers can't grow memory without bound.
+    """
+
+    def __init__(self, max_keys=RATE_LIMIT_FALLBACK_MAX_KEYS):
+        self.max_keys = max_keys
+        self._windows = OrderedDict()  # key -> (count, window end)
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window, captcha_ratio, cost=1) -> RateLimitResult:
+        now = time.monotonic()
+        with self._lock:
+            count, window_end = self._windows.pop(key, (0, now + window))
+            if window_end <= now:
+                count, window_end = 0, now + window
+            count += cost
+            self._windows[key] = (count, window_end)
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+        if captcha_ratio > 0 and count >= math.floor(limit * captcha_ratio):
+            return RateLimitResult(True, 0, count, limit, True)
+        if count > limit:
+            return RateLimitResult(False, max(1, math.ceil(window_end - now)), count, limit, False)
+        return RateLimitResult(True, 0, count, limit, False)
+
+    def reset(self, key):
+        with self._lock:
+            self._windows.pop(key, None)
+
+    def __len__(self):
+        return len(self._windows)
+
+
+fallback_limiter = LocalFixedWindowLimiter()
+
+
+def _run_limiter(scope: str, identifier: str, cost: int) -> RateLimitResult:
+    limit, window, captcha_ratio, has_override, algorithm = RATE_LIMIT_SCOPES[scope]
+    keys = [_state_key(scope, identifier)]
+    if redis_available():
+        if has_override:
+            keys.append(f"rate_limit:meta:{identifier}")
+        try:
+            allowed, retry_after, count, limit, captcha = _scripts[algorithm](
+                keys=keys, args=[limit, window, captcha_ratio, cost, uuid.uuid4().hex])
+            return RateLimitResult(bool(allowed), int(retry_after), int(count), int(limit), bool(captcha))
+        except Exception as e:
+            redis_health.record_failure(e)
+            logging.error(f"Redis rate limit check for {scope} failed, using the in-process limiter: {e}")
+    return fallback_limiter.hit(keys[0], limit, window, captcha_ratio, cost)
+
 
-    if count == 1:
-        r.expire(key, SESSION_WINDOW_SECONDS)
+def check_rate_limit(scope: str, identifier: str) -> RateLimitResult:
+    """Count one request for `identifier` in `scope` and decide on it, in one Redis call."""
+    result = _run_limiter(scope, identifier, cost=1)
+    logging.info(f"{scope.capitalize()} {identifier} current request count: {result.count}")
+    return result
 
-    logging.info(f"Session {session_id} current request count: {count}")
 
-    limit = int(r.hget(f"rate_limit:meta:{session_id}", "limit") or SESSION_MAX_REQUESTS)
-    if count >= int(limit * 0.9):
-        return True, 0, True  # allowed, no retry, captcha required
+def peek_rate_limit(scope: str, identifier: str) -> RateLimitResult:
+    """The current count and CAPTCHA state for `identifier` in `scope`, without counting a request."""
+    return _run_limiter(scope, identifier, cost=0)
 
-    if count > limit:
-        remaining_time = r.ttl(key)
-        return False, max(0, remaining_time), False
 
-    return True, 0, False
+def _reset_scope(scope: str, identifier: str) -> None:
+    key = _state_key(scope, identifier)
+    fallback_limiter.reset(key)
+    if not redis_available():
+        return
+    try:
+        if RATE_LIMIT_SCOPES[scope][4] == "fixed_window":
+            r.set(key, 0, ex=RATE_LIMIT_SCOPES[scope][1])
+        else:
+            r.delete(key)
+    except Exception as e:
+        redis_health.record_failure(e)
+        logging.error(f"Could not reset the {scope} rate limit in Redis: {e}")
+
+
+def _rate_status(scope: str, identifier: str) -> dict:
+    result = peek_rate_limit(scope, identifier)
+    return {
+        "success": True,
+        "count": result.count,
+        "limit": result.limit,
+        "captcha_required": result.captcha_required
+    }
+
+
+@timed("rate_limit_session")
+def check_session_rate_limit(session_id: str) -> tuple[bool, int, bool]:
+    result = check_rate_limit("session", session_id)
+    return result.allowed, result.retry_after, result.captcha_required
 
 
 def mark_captcha_solved(session_id: str) -> int:
     meta_key = f"rate_limit:meta:{session_id}"
-    r.hset(meta_key, mapping={"limit": SESSION_MAX_REQUESTS})
-    r.set(f"rate_limit:session:{session_id}", 0, ex=SESSION_WINDOW_SECONDS)
+    if redis_available():
+        try:
+            r.hset(meta_key, mapping={"limit": SESSION_MAX_REQUESTS})
+        except Exception as e:
+            redis_health.record_failure(e)
+            logging.error(f"Could not store the session limit in Redis: {e}")
+    _reset_scope("session", session_id)
     logging.info(f"CAPTCHA solved for session {session_id}. Limit reset to: {SESSION_MAX_REQUESTS}")
     return SESSION_MAX_REQUESTS
 
 
 def get_session_rate_status(session_id: str) -> dict:
-    meta_key = f"rate_limit:meta:{session_id}"
-    limit = int(r.hget(meta_key, "limit") or SESSION_MAX_REQUESTS)
-    count = int(r.get(f"rate_limit:session:{session_id}") or 0)
-    return {
-        "success": True,
-        "count": count,
-        "limit": limit,
-        "captcha_required": count >= int(limit * 0.9)
-    }
+    return _rate_status("session", session_id)
 
 
-def check_ip_rate_limit(user_ip: str) -> tuple[bool, int]:
-    key = f"rate_limit:ip:{user_ip}"
-    count = r.incr(key)
+class LocalTokenBucketTier:
+    """
+    First tier of the IP limit: an in-process token bucket per IP holding `share` of the global budget,
+    so flood traffic is rejected without touching Redis. Admitted requests are counted locally and
+    added to a per-window Redis counter in one pipeline every `sync_seconds`; an IP whose global count
+    reaches the limit is then blocked locally until the window ends. The global limit is therefore
+    enforced approximately (within one sync interval), while each worker's share is enforced exactly.
+    """
 
-    if count == 1:
-        r.expire(key, IP_WINDOW_SECONDS)
+    key_prefix = "rate_limit:ip_window"
 
-    logging.info(f"IP {user_ip} current request count: {count}")
+    def __init__(self, limit=IP_MAX_REQUESTS, window_seconds=IP_WINDOW_SECONDS, share=RATE_LIMIT_IP_LOCAL_SHARE,
+                 sync_seconds=RATE_LIMIT_IP_SYNC_SECONDS, max_tracked=RATE_LIMIT_IP_MAX_TRACKED, redis_client=None):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.capacity = max(1.0, limit * share)
+        self.refill_rate = self.capacity / window_seconds  # tokens per second
+        self.sync_seconds = sync_seconds
+        self.max_tracked = max_tracked
+        self.redis = redis_client if redis_client is not None else r
+        self.stats = {"allowed": 0, "rejected_locally": 0, "blocked_globally": 0, "syncs": 0, "sync_errors": 0,
+                      "sync_skipped": 0}
+        self._buckets = {}  # ip -> (tokens, updated at)
+        self._pending = Counter()  # admitted requests not yet added to Redis
+        self._blocked = {}  # ip -> monotonic time the global window ends
+        self._lock = threading.Lock()
+        self._sync_thread = None
 
-    if count > IP_MAX_REQUESTS:
-        remaining_time = r.ttl(key)
-        return False, max(0, remaining_time)
-    return True, 0
+    def check(self, ip: str) -> tuple[bool, int]:
+        now = time.monotonic()
+        with self._lock:
+            blocked_until = self._blocked.get(ip)
+            if blocked_until is not None:
+                if now < blocked_until:
+                    self.stats["rejected_locally"] += 1
+                    return False, math.ceil(blocked_until - now)
+                del self._blocked[ip]
+            tokens, updated = self._buckets.get(ip, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.refill_rate)
+            if tokens < 1:
+                self._buckets[ip] = (tokens, now)
+                self.stats["rejected_locally"] += 1
+                return False, math.ceil((1 - tokens) / self.refill_rate)
+            self._buckets[ip] = (tokens - 1, now)
+            self._pending[ip] += 1
+            self.stats["allowed"] += 1
+            if self._sync_thread is None:
+                self._sync_thread = threading.Thread(target=self._sync_loop, name="ip-limit-sync", daemon=True)
+                self._sync_thread.start()
+        return True, 0
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(self.sync_seconds)
+            self.sync()
+
+    def sync(self):
+        """Add the locally admitted counts to Redis in one pipeline and block IPs over the global limit."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if pending and not redis_available():
+            with self._lock:
+                self.stats["sync_skipped"] += 1  # degraded: the local buckets are the whole limit for now
+        elif pending:
+            window_index, offset = divmod(time.time(), self.window_seconds)
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for ip, count in pending.items():
+                    key = f"{self.key_prefix}:{ip}:{int(window_index)}"
+                    pipe.incrby(key, count)
+                    pipe.expire(key, self.window_seconds * 2)
+                totals = pipe.execute()[::2]
+            except Exception as e:
+                # the local tier keeps limiting on its own; these counts just don't reach the global total
+                redis_health.record_failure(e)
+                with self._lock:
+                    self.stats["sync_errors"] += 1
+                logging.error(f"IP rate limit sync to Redis failed, limiting locally only: {e}")
+                totals = []
+            else:
+                with self._lock:
+                    self.stats["syncs"] += 1
+            window_ends = time.monotonic() + (self.window_seconds - offset)
+            with self._lock:
+                for ip, total in zip(pending, totals):
+                    if int(total) > self.limit:  # the limit-th request is still allowed, as in the Redis tiers
+                        self._blocked[ip] = window_ends
+                        self.stats["blocked_globally"] += 1
+                        logging.warning(f"IP {ip} reached the global limit of {self.limit} requests per "
+                                        f"{self.window_seconds}s")
+        self._prune()
+
+    def _prune(self):
+        """Forget IPs whose bucket has refilled completely, once too many are tracked."""
+        with self._lock:
+            if len(self._buckets) <= self.max_tracked:
+                return
+            now = time.monotonic()
+            full_after = self.capacity / self.refill_rate
+            for ip in [ip for ip, (_, updated) in self._buckets.items() if now - updated >= full_after]:
+                del self._buckets[ip]
+            for ip in [ip for ip, until in self._blocked.items() if until <= now]:
+                del self._blocked[ip]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats, tracked_ips=len(self._buckets), blocked_ips=len(self._blocked))
+
+
+ip_limiter = LocalTokenBucketTier() if RATE_LIMIT_IP_LOCAL_TIER else None
+
+
+@timed("rate_limit_ip")
+def check_ip_rate_limit(user_ip: str) -> tuple[bool, int]:
+    if ip_limiter is not None:
+        return ip_limiter.check(user_ip)
+    result = check_rate_limit("ip", user_ip)
+    return result.allowed, result.retry_after
 
 
 def reset_rate_limits():
@@ -99,35 +369,17 @@ def reset_rate_limits():
     pass
 
 
+@timed("rate_limit_fingerprint")
 def check_fingerprint_rate_limit(fingerprint: str) -> tuple[bool, int, bool]:
-    key = f"rate_limit:fingerprint:{fingerprint}"
-    count = r.incr(key)
-    if count == 1:
-        r.expire(key, FINGERPRINT_WINDOW_SECONDS)
-    logging.info(f"Fingerprint {fingerprint} current request count: {count}")
-    limit = FINGERPRINT_MAX_REQUESTS
-    if count >= int(limit * 0.9):
-        return True, 0, True  # allowed, no retry, captcha required
-    if count > limit:
-        remaining_time = r.ttl(key)
-        return False, max(0, remaining_time), False
-    return True, 0, False
+    result = check_rate_limit("fingerprint", fingerprint)
+    return result.allowed, result.retry_after, result.captcha_required
 
 
 def mark_captcha_solved_fingerprint(fingerprint: str) -> int:
-    key = f"rate_limit:fingerprint:{fingerprint}"
-    r.set(key, 0, ex=FINGERPRINT_WINDOW_SECONDS)
+    _reset_scope("fingerprint", fingerprint)
     logging.info(f"CAPTCHA solved for fingerprint {fingerprint}. Limit reset to: {FINGERPRINT_MAX_REQUESTS}")
     return FINGERPRINT_MAX_REQUESTS
 
 
 def get_fingerprint_rate_status(fingerprint: str) -> dict:
-    key = f"rate_limit:fingerprint:{fingerprint}"
-    limit = FINGERPRINT_MAX_REQUESTS
-    count = int(r.get(key) or 0)
-    return {
-        "success": True,
-        "count": count,
-        "limit": limit,
-        "captcha_required": count >= int(limit * 0.9)
-    }
+    return _rate_status("fingerprint", fingerprint)
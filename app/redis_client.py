@@ -0,0 +1,138 @@
+# app/redis_client.py
+import logging
+import threading
+import time
+
+import redis
+
+from app.config import (
+    REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD, REDIS_USER,
+    REDIS_MAX_CONNECTIONS, REDIS_CONNECT_TIMEOUT, REDIS_SOCKET_TIMEOUT,
+    REDIS_HEALTH_INTERVAL_SECONDS, REDIS_SLOW_MS, REDIS_FAILURE_THRESHOLD, REDIS_RECOVERY_CHECKS
+)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_redis():
+    """The shared Redis client. Its pool opens connections on first use, so importing never needs Redis."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                pool = redis.BlockingConnectionPool(
+                    host=REDIS_HOST,
+                    port=int(REDIS_PORT),
+                    db=int(REDIS_DB),
+                    username=REDIS_USER,
+                    password=REDIS_PASSWORD,
+                    decode_responses=True,
+                    socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                    socket_timeout=REDIS_SOCKET_TIMEOUT,
+                    max_connections=REDIS_MAX_CONNECTIONS,
+                    timeout=REDIS_SOCKET_TIMEOUT,  # wait for a free pooled connection at most this long
+                )
+                _client = redis.StrictRedis(connection_pool=pool)
+    return _client
+
+
+class RedisHealthMonitor:
+    """
+    Decides whether Redis-backed features should use Redis or their in-process fallbacks.
+    Callers report failed calls; a background probe pings Redis every `interval` seconds, and a ping
+    slower than `slow_ms` counts as a failure. `failure_threshold` consecutive failures switch to
+    degraded mode, where callers skip Redis entirely instead of stalling on timeouts;
+    `recovery_checks` consecutive healthy pings switch back.
+    """
+
+    REDIS = "redis"
+    DEGRADED = "degraded"
+
+    def __init__(self, client_factory=get_redis, interval=REDIS_HEALTH_INTERVAL_SECONDS, slow_ms=REDIS_SLOW_MS,
+                 failure_threshold=REDIS_FAILURE_THRESHOLD, recovery_checks=REDIS_RECOVERY_CHECKS):
+        self.client_factory = client_factory
+        self.interval = interval
+        self.slow_ms = slow_ms
+        self.failure_threshold = failure_threshold
+        self.recovery_checks = recovery_checks
+        self.mode = self.REDIS
+        self.consecutive_failures = 0
+        self.healthy_probes = 0
+        self.last_latency_ms = None
+        self.last_error = None
+        self.switches = 0
+        self.changed_at = time.time()
+        self._lock = threading.Lock()
+        self._probe_thread = None
+
+    def available(self):
+        """True when Redis should be used right now."""
+        if self._probe_thread is None:
+            self._start_probe()
+        return self.mode == self.REDIS
+
+    def record_failure(self, error):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.healthy_probes = 0
+            self.last_error = str(error)
+            if self.mode == self.REDIS and self.consecutive_failures >= self.failure_threshold:
+                self._switch(self.DEGRADED)
+
+    def probe(self):
+        started = time.monotonic()
+        try:
+            self.client_factory().ping()
+        except Exception as e:
+            self.record_failure(e)
+            return
+        latency_ms = (time.monotonic() - started) * 1000
+        self.last_latency_ms = round(latency_ms, 1)
+        if latency_ms > self.slow_ms:
+            self.record_failure(f"ping took {latency_ms:.0f}ms")
+            return
+        with self._lock:
+            self.consecutive_failures = 0
+            self.healthy_probes += 1
+            if self.mode == self.DEGRADED and self.healthy_probes >= self.recovery_checks:
+                self._switch(self.REDIS)
+
+    def _switch(self, mode):
+        self.mode = mode
+        self.switches += 1
+        self.changed_at = time.time()
+        if mode == self.DEGRADED:
+            logging.error(f"Redis degraded ({self.last_error}); rate limits and caches now use in-process fallbacks")
+        else:
+            logging.info("Redis recovered; rate limits and caches use Redis again")
+
+    def _start_probe(self):
+        with self._lock:
+            if self._probe_thread is not None:
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="redis-health", daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        while True:
+            self.probe()
+            time.sleep(self.interval)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "since": self.changed_at,
+                "consecutive_failures": self.consecutive_failures,
+                "last_ping_ms": self.last_latency_ms,
+                "last_error": self.last_error,
+                "switches": self.switches,
+            }
+
+
+redis_health = RedisHealthMonitor()
+
+
+def redis_available():
+    return redis_health.available()
@@ -0,0 +1,295 @@
+# app/resilience.py
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import openai
+import requests
+
+from app.config import (
+    REQUEST_DEADLINE_SECONDS, LLM_REQUEST_TIMEOUT,
+    BREAKER_FAILURE_THRESHOLD, BREAKER_RECOVERY_SECONDS,
+    RETRY_BUDGET_RATIO, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+)
+
+# Per-dependency caps. The effective timeout is min(cap, time left before the request deadline).
+DEPENDENCY_POLICIES = {
+    "serper": {"timeout": 5.0, "retries": 1},
+    "azure_token": {"timeout": 5.0, "retries": 1},
+    "azure_stt": {"timeout": 15.0, "retries": 1},
+    "azure_tts": {"timeout": 15.0, "retries": 1},
+    "openai_embeddings": {"timeout": 8.0, "retries": 1},
+    "chat_http_fallback": {"timeout": 15.0, "retries": 0},
+    "groq": {"timeout": LLM_REQUEST_TIMEOUT, "retries": 0},
+    "openai": {"timeout": LLM_REQUEST_TIMEOUT, "retries": 0},
+}
+DEFAULT_POLICY = {"timeout": 10.0, "retries": 0}
+
+# Monotonic deadline of the request being served on this thread/context, or None outside requests
+_request_deadline = ContextVar("request_deadline", default=None)
+# Event set once the client of the current request has gone away
+_cancel_event = ContextVar("cancel_event", default=None)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the overall request deadline leaves no time for another outbound call."""
+
+
+class RequestCancelledError(Exception):
+    """Raised instead of starting outbound work for a request whose client has disconnected."""
+
+
+class RetryableHTTPError(Exception):
+    """An HTTP response that should count as a dependency failure (5xx or 429)."""
+
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code} from {response.url}")
+        self.response = response
+
+
+# Failures that say the dependency is unhealthy: worth a retry and counted by its circuit breaker.
+# Anything else (a 4xx, a bad payload, a bug in the caller) is re-raised straight away.
+RETRYABLE_ERRORS = (
+    RetryableHTTPError, TimeoutError, ConnectionError,
+    requests.Timeout, requests.ConnectionError,
+    openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError,
+)
+
+
+def start_request_deadline(seconds=REQUEST_DEADLINE_SECONDS):
+    """Start the overall deadline for the current request; outbound calls derive their timeouts from it."""
+    _request_deadline.set(time.monotonic() + seconds)
+
+
+def clear_request_deadline():
+    _request_deadline.set(None)
+
+
+@contextmanager
+def request_deadline(seconds=REQUEST_DEADLINE_SECONDS):
+    token = _request_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _request_deadline.reset(token)
+
+
+def bind_cancellation(event):
+    """Make `event` the cancellation signal for work done in the current context."""
+    _cancel_event.set(event)
+
+
+def is_cancelled():
+    event = _cancel_event.get()
+    return event is not None and event.is_set()
+
+
+def raise_if_cancelled(operation="request"):
+    if is_cancelled():
+        raise RequestCancelledError(f"Client disconnected, skipping {operation}")
+
+
+def remaining_time():
+    """Seconds left before the request deadline, or None when no deadline is active."""
+    deadline = _request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def dependency_timeout(dependency):
+    """Timeout for one call to `dependency`: its own cap, shortened by the request deadline."""
+    cap = DEPENDENCY_POLICIES.get(dependency, DEFAULT_POLICY)["timeout"]
+    remaining = remaining_time()
+    return cap if remaining is None else min(cap, remaining)
+
+
+def raise_for_retryable_status(response):
+    """Return the response unless it is a server error or throttling response."""
+    if response.status_code >= 500 or response.status_code == 429:
+        raise RetryableHTTPError(response)
+    return response
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures; open -> half-open after
+    `recovery_seconds`, where a single probe call decides whether to close again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, recovery_seconds=BREAKER_RECOVERY_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.total_failures = 0
+        self.total_successes = 0
+        self.times_opened = 0
+        self.rejections = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.recovery_seconds:
+                self.state = self.HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            self.rejections += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.total_successes += 1
+            self.consecutive_failures = 0
+            if self.state != self.CLOSED:
+                logging.info(f"Circuit breaker '{self.name}' closed again")
+            self.state = self.CLOSED
+            self.probe_in_flight = False
+
+    def release_probe(self):
+        """The half-open probe ended without telling us anything about the dependency's health."""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.total_failures += 1
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or (
+                    self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.probe_in_flight = False
+                self.times_opened += 1
+                logging.warning(f"Circuit breaker '{self.name}' opened after {self.consecutive_failures} failures")
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failures": self.total_failures,
+                "successes": self.total_successes,
+                "times_opened": self.times_opened,
+                "rejections": self.rejections,
+            }
+
+
+class RetryBudget:
+    """Token bucket limiting retries to roughly `ratio` of successful calls, so retries can't amplify an outage."""
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, max_tokens=10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.exhausted += 1
+            return False
+
+
+_breakers = {}
+_retry_budgets = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(dependency):
+    with _registry_lock:
+        if dependency not in _breakers:
+            _breakers[dependency] = CircuitBreaker(dependency)
+        return _breakers[dependency]
+
+
+def get_retry_budget(dependency):
+    with _registry_lock:
+        if dependency not in _retry_budgets:
+            _retry_budgets[dependency] = RetryBudget()
+        return _retry_budgets[dependency]
+
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def call_with_resilience(dependency, fn, retries=None):
+    """
+    Call fn(timeout) for `dependency` behind its circuit breaker, with the timeout derived from the
+    request deadline and bounded, jittered retries drawn from the dependency's retry budget.
+    Only RETRYABLE_ERRORS are retried and counted as breaker failures.
+    """
+    policy = DEPENDENCY_POLICIES.get(dependency, DEFAULT_POLICY)
+    max_retries = policy["retries"] if retries is None else retries
+    breaker = get_breaker(dependency)
+    budget = get_retry_budget(dependency)
+    attempt = 0
+
+    while True:
+        raise_if_cancelled(dependency)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker for '{dependency}' is open")
+        timeout = dependency_timeout(dependency)
+        if timeout <= 0:
+            raise DeadlineExceededError(f"Request deadline exceeded before calling '{dependency}'")
+
+        try:
+            result = fn(timeout)
+        except RETRYABLE_ERRORS as e:
+            breaker.record_failure()
+            delay = backoff_delay(attempt)
+            remaining = remaining_time()
+            if attempt >= max_retries or (remaining is not None and remaining <= delay) or is_cancelled() \
+                    or not budget.withdraw():
+                raise
+            logging.warning(f"{dependency} call failed ({e}); retry {attempt + 1}/{max_retries} in {delay:.2f}s")
+            time.sleep(delay)
+            attempt += 1
+            continue
+        except Exception:
+            breaker.release_probe()
+            raise
+
+        breaker.record_success()
+        budget.deposit()
+        return result
+
+
+def breaker_snapshot():
+    """State of every circuit breaker, for the health endpoint and metrics."""
+    with _registry_lock:
+        breakers = list(_breakers.values())
+        budgets = dict(_retry_budgets)
+    snapshot = {}
+    for breaker in breakers:
+        snapshot[breaker.name] = breaker.snapshot()
+        if breaker.name in budgets:
+            snapshot[breaker.name]["retry_budget_exhausted"] = budgets[breaker.name].exhausted
+    return snapshot
@@ -1,11 +1,15 @@
 import os
 import base64
-from app.speech import speech_to_text_from_file, save_audio_file
+import json
+import secrets
+from app.speech import speech_to_text_from_file, save_audio_file, TTS_AUDIO_FORMATS
 from flask import (
     Blueprint, request, jsonify, Response,
-    stream_with_context, render_template, send_file, after_this_request, session
+    stream_with_context, render_template, send_file, after_this_request, session, url_for
+)
+from app.controllers.chat_controller import (
+    handle_chat, resume_sse_chat, follow_sse_chat, handle_voice_sse_chat
 )
-from app.controllers.chat_controller import handle_chat
 from app.controllers.feedback_controller import handle_feedback_submission
 from app.controllers.history_controller import handle_history_fetch
 from app.controllers.consent_controller import handle_accept_consent, handle_withdraw_consent, check_consent_status
@@ -17,6 +21,7 @@ from app.rate_limiter import (
     get_fingerprint_rate_status, mark_captcha_solved_fingerprint
 )
 from app.utils import get_client_ip
+from app.audio_store import sts_audio_store
 
 # API ROUTES under /api/v1
 routes = Blueprint("routes", __name__, url_prefix="/api/v1")
@@ -32,6 +37,17 @@ def chat():
     return handle_chat()
 
 
+@routes.route("/chat/stream/<stream_id>", methods=["GET"])
+def resume_chat_stream(stream_id):
+    """Resume an SSE chat stream (EventSource reconnects send Last-Event-ID)."""
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    if not last_event_id:
+        return follow_sse_chat(stream_id)
+    if not last_event_id.startswith(f"{stream_id}-"):
+        return jsonify({"error": "Last-Event-ID does not belong to this stream"}), 400
+    return resume_sse_chat(last_event_id)
+
+
 @routes.route("/feedback", methods=["POST"])
 def submit_feedback():
     return handle_feedback_submission()
@@ -205,20 +221,13 @@ def handle_speech_to_text():
             language = request.form.get('language', 'nl-NL')
             print(f"🌍 Language: {language}")
 
-            # Save uploaded file temporarily
-            import tempfile
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.webm')
-            file.save(temp_file.name)
-            temp_file.close()
-
-            file_size = os.path.getsize(temp_file.name)
-            print(f"💾 File saved: {temp_file.name}")
-            print(f"💾 File size: {file_size} bytes")
+            # Read the upload into memory (it is transcoded through pipes if needed, never written to disk)
+            audio_data = file.read()
+            print(f"💾 File size: {len(audio_data)} bytes")
             
             # Check if file is not empty
-            if file_size == 0:
+            if not audio_data:
                 print("❌ Audio file is empty!")
-                os.unlink(temp_file.name)
                 return jsonify({
                     "error": "Empty audio file",
                     "message": "The recorded audio file is empty."
@@ -226,17 +235,10 @@ def handle_speech_to_text():
 
             # Process speech-to-text
             print("🔍 Starting STT processing...")
-            from app.speech import speech_to_text_from_file_rest
-            stt_result = speech_to_text_from_file_rest(temp_file.name, language=language)
+            from app.speech import speech_to_text_rest
+            stt_result = speech_to_text_rest(audio_data, language=language)
             print(f"📝 STT Result: {stt_result}")
 
-            # Clean up temp file
-            try:
-                os.unlink(temp_file.name)
-                print("🗑️ Temp file cleaned up")
-            except Exception as e:
-                print(f"⚠️ Error removing temp file: {e}")
-
             print("✅ STT request completed")
             print("=" * 60)
             return jsonify(stt_result)
@@ -273,32 +275,27 @@ def handle_speech_to_speech():
             session_id = request.form.get('session_id')
             fingerprint = request.form.get('fingerprint')
 
-            # Save uploaded file temporarily
-            import tempfile
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.webm')
-            file.save(temp_file.name)
-            temp_file.close()
+            # "json" (audio inlined as base64), "url" (JSON with a short-lived audio URL) or "multipart"
+            response_format = request.form.get('response_format', 'json')
+            audio_format = request.form.get('audio_format', 'wav')
+            if response_format not in ("json", "url", "multipart") or audio_format not in TTS_AUDIO_FORMATS:
+                return jsonify({"error": "Unsupported response_format or audio_format",
+                                "audio_formats": list(TTS_AUDIO_FORMATS)}), 400
 
-            file_size = os.path.getsize(temp_file.name)
+            # Read the upload into memory (it is transcoded through pipes if needed, never written to disk)
+            audio_data = file.read()
             
             # Check if file is not empty
-            if file_size == 0:
+            if not audio_data:
                 print("❌ Audio file is empty!")
-                os.unlink(temp_file.name)
                 return jsonify({
                     "error": "Empty audio file",
                     "message": "The recorded audio file is empty. Please try speaking more clearly."
                 }), 400
 
             # Process speech-to-text
-            from app.speech import speech_to_text_from_file_rest
-            stt_result = speech_to_text_from_file_rest(temp_file.name, language=language)
-
-            # Clean up temp file
-            try:
-                os.unlink(temp_file.name)
-            except Exception as e:
-                pass
+            from app.speech import speech_to_text_rest
+            stt_result = speech_to_text_rest(audio_data, language=language)
 
             if stt_result["status"] != "success" or not stt_result["text"]:
                 print(f"❌ Speech recognition failed")
@@ -319,20 +316,21 @@ def handle_speech_to_speech():
             store_message(session_id, user_text, "user")
 
             # Get chatbot response
-            from app.speech import get_chatbot_response, is_first_bot_response_in_session
+            from app.speech import get_chatbot_response, is_first_bot_response_in_session, VOICE_INTROS
 
             is_first_interaction = is_first_bot_response_in_session(session_id)
-            
+
+            # Streaming voice mode: audio per sentence as Server-Sent Events while the reply is generated
+            if "text/event-stream" in request.headers.get("Accept", "") or request.form.get("stream") == "sse":
+                intro = VOICE_INTROS.get(language, VOICE_INTROS["en-US"]) if is_first_interaction else ""
+                return handle_voice_sse_chat(user_text, session_id, language, intro, audio_format)
+
             response_text = get_chatbot_response(user_text, session_id=session_id, language=language)
 
             # Add intro if first interaction
             final_response_text = response_text
             if is_first_interaction:
-                if language == "nl-NL":
-                    intro = "Neem mijn stem niet te serieus, ik ben ook maar een AI. Maar om je vraag te beantwoorden: "
-                else:
-                    intro = "Please go easy on my voice, I'm just an AI. But to answer your question: "
-                final_response_text = intro + response_text
+                final_response_text = VOICE_INTROS.get(language, VOICE_INTROS["en-US"]) + response_text
 
             # Store bot response
             store_message(session_id, final_response_text, "bot")
@@ -341,12 +339,28 @@ def handle_speech_to_speech():
 
             # Generate speech
             from app.speech import text_to_speech_rest
-            tts_output_path = text_to_speech_rest(final_response_text, language=language)
+            tts_output_path = text_to_speech_rest(final_response_text, language=language, audio_format=audio_format)
 
             if not tts_output_path:
                 print("❌ TTS generation failed")
                 return jsonify({"error": "Failed to generate speech response"}), 500
 
+            metadata = {
+                "user_text": user_text,
+                "bot_text": final_response_text,
+                "language": language,
+                "session_id": session_id,
+                "is_first_interaction": is_first_interaction,
+                "mime_type": TTS_AUDIO_FORMATS[audio_format][1]
+            }
+            if response_format == "url":
+                audio_name = sts_audio_store.adopt(tts_output_path, audio_format)
+                print("✅ Speech-to-speech completed")
+                return jsonify(dict(metadata, audio_url=url_for("routes.get_sts_audio", name=audio_name)))
+            if response_format == "multipart":
+                print("✅ Speech-to-speech completed")
+                return _multipart_audio_response(metadata, tts_output_path)
+
             # Read and encode audio
             try:
                 with open(tts_output_path, "rb") as f:
@@ -389,11 +403,70 @@ def handle_speech_to_speech():
         return jsonify({"error": str(e)}), 500
 
 
+@routes.route("/sts/audio/<name>", methods=["GET"])
+def get_sts_audio(name):
+    """Reply audio of a /sts call made with response_format=url; supports Range requests for streaming playback."""
+    path = sts_audio_store.path(name)
+    audio_format = name.rsplit(".", 1)[-1]
+    if path is None or audio_format not in TTS_AUDIO_FORMATS:
+        return jsonify({"error": "Audio not found or expired"}), 404
+    return send_file(path, mimetype=TTS_AUDIO_FORMATS[audio_format][1], conditional=True,
+                     max_age=sts_audio_store.ttl_seconds)
+
+
+def _multipart_audio_response(metadata, audio_path):
+    """multipart/mixed body: the JSON metadata part, then the raw audio part streamed from disk."""
+    boundary = secrets.token_hex(16)
+    size = os.path.getsize(audio_path)
+    head = (f"--{boundary}\r\nContent-Type: application/json\r\n\r\n{json.dumps(metadata)}\r\n"
+            f"--{boundary}\r\nContent-Type: {metadata['mime_type']}\r\nContent-Length: {size}\r\n\r\n").encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+
+    def generate():
+        yield head
+        with open(audio_path, "rb") as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                yield chunk
+        yield tail
+
+    response = Response(generate(), mimetype=f"multipart/mixed; boundary={boundary}",
+                        headers={"Content-Length": str(len(head) + size + len(tail))})
+    response.call_on_close(lambda: os.remove(audio_path))  # also when the client disconnects mid-body
+    return response
+
+
 # === HEALTH CHECK ===
 @routes.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint"""
-    return jsonify({"status": "healthy", "service": "Bravur Chatbot API"})
+    from app.session_state import session_state_store
+    from app.resilience import breaker_snapshot
+    from app.llm_scheduler import llm_scheduler
+    from app.chatbot import agent_connector, chat_flights
+    from app.database import lexical_index_status
+    from app.model_router import model_router
+    from app.web import serper_client
+    from app.rate_limiter import ip_limiter, fallback_limiter
+    from app.redis_client import redis_health
+    from app.speech import tts_cache
+    from app.transcoder import transcoder
+    redis_status = redis_health.snapshot()
+    return jsonify({
+        "status": "healthy" if redis_status["mode"] == redis_health.REDIS else "degraded",
+        "service": "Bravur Chatbot API",
+        "session_state": session_state_store.stats(),
+        "circuit_breakers": breaker_snapshot(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "agents": agent_connector.stats(),
+        "coalesced_turns": dict(chat_flights.stats),
+        "model_router": model_router.stats(),
+        "search_index": lexical_index_status(),
+        "web_search": dict(serper_client.stats, cached_queries=len(serper_client.cache)),
+        "ip_limiter": ip_limiter.snapshot() if ip_limiter is not None else None,
+        "redis": dict(redis_status, fallback_rate_limit_keys=len(fallback_limiter)),
+        "tts_cache": tts_cache.snapshot(),
+        "transcoder": transcoder.snapshot()
+    })
 
 
 # === CORS HEADERS FOR WORDPRESS ===
@@ -401,7 +474,7 @@ def health_check():
 def after_request(response):
     """Add CORS headers for WordPress integration"""
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,Last-Event-ID')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
     return response
 
@@ -410,6 +483,14 @@ def after_request(response):
 frontend = Blueprint("frontend", __name__)
 
 
+@frontend.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint"""
+    from app.metrics import render_metrics
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
 @frontend.route("/", methods=["GET"])
 def serve_home():
     """Keep this for direct testing of your Python app"""
@@ -0,0 +1,152 @@
+# app/session_state.py
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from app.redis_client import get_redis, redis_available, redis_health
+from app.config import (
+    SESSION_STATE_BACKEND, SESSION_STATE_MAX_ENTRIES, SESSION_STATE_TTL_SECONDS, SESSION_STATE_MAX_BYTES
+)
+
+
+def _encode(state, max_bytes):
+    """Serialize state compactly; state over the per-session cap is reset rather than stored."""
+    payload = json.dumps(state, separators=(",", ":"))
+    if len(payload) > max_bytes:
+        logging.warning(f"Session state of {len(payload)} bytes exceeds the {max_bytes} byte cap; resetting it")
+        return "{}"
+    return payload
+
+
+class LocalSessionStateStore:
+    """In-process LRU + TTL store. Memory is bounded by max_entries * max_bytes."""
+
+    backend = "memory"
+
+    def __init__(self, max_entries=SESSION_STATE_MAX_ENTRIES, ttl_seconds=SESSION_STATE_TTL_SECONDS,
+                 max_bytes=SESSION_STATE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.evictions = 0
+
+    def load(self, session_id):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return {}
+            expires_at, payload = entry
+            if expires_at <= time.monotonic():
+                self._remove(session_id)
+                return {}
+            self._entries.move_to_end(session_id)
+        return json.loads(payload)
+
+    def save(self, session_id, state):
+        payload = _encode(state, self.max_bytes)
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is None:
+                expires_at = time.monotonic() + self.ttl_seconds
+            else:
+                # Keep the original expiry so state never outlives the session it belongs to
+                expires_at = entry[0]
+                self._bytes -= len(entry[1])
+            self._entries[session_id] = (expires_at, payload)
+            self._bytes += len(payload)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, session_id):
+        _, payload = self._entries.pop(session_id)
+        self._bytes -= len(payload)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+            }
+
+
+class RedisSessionStateStore:
+    """
+    Redis-backed store shared by all workers; each key expires with the session (TTL set on first write).
+    While Redis is degraded, state lives in an in-process fallback store instead.
+    """
+
+    backend = "redis"
+    key_prefix = "session_state:"
+
+    def __init__(self, redis_client=None, ttl_seconds=SESSION_STATE_TTL_SECONDS, max_bytes=SESSION_STATE_MAX_BYTES):
+        self._redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.writes = 0
+        self.bytes_written = 0
+        self.fallback = LocalSessionStateStore(ttl_seconds=ttl_seconds, max_bytes=max_bytes)
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis()
+        return self._redis
+
+    def load(self, session_id):
+        if not redis_available():
+            return self.fallback.load(session_id)
+        try:
+            payload = self.redis.get(self.key_prefix + session_id)
+        except Exception as e:
+            redis_health.record_failure(e)
+            logging.error(f"Failed to load session state for {session_id}: {e}")
+            return self.fallback.load(session_id)
+        return json.loads(payload) if payload else {}
+
+    def save(self, session_id, state):
+        if not redis_available():
+            self.fallback.save(session_id, state)
+            return
+        payload = _encode(state, self.max_bytes)
+        key = self.key_prefix + session_id
+        try:
+            pipe = self.redis.pipeline()
+            pipe.set(key, payload, keepttl=True)
+            pipe.expire(key, self.ttl_seconds, nx=True)
+            pipe.execute()
+        except Exception as e:
+            redis_health.record_failure(e)
+            logging.error(f"Failed to save session state for {session_id}: {e}")
+            self.fallback.save(session_id, state)
+            return
+        self.writes += 1
+        self.bytes_written += len(payload)
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "ttl_seconds": self.ttl_seconds,
+            "max_bytes_per_session": self.max_bytes,
+            "writes": self.writes,
+            "bytes_written": self.bytes_written,
+            "fallback_entries": self.fallback.stats()["entries"],
+        }
+
+
+def create_session_state_store(backend=SESSION_STATE_BACKEND):
+    if backend == "redis":
+        return RedisSessionStateStore()
+    return LocalSessionStateStore()
+
+
+session_state_store = create_session_state_store()
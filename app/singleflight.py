@@ -0,0 +1,182 @@
+# app/singleflight.py
+import contextvars
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class _Broadcast:
+    """Chunks of one streamed execution, replayed from the start to every subscriber."""
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self.subscribers = 0
+        self.abandoned = threading.Event()  # every subscriber left before the stream finished
+        self._cond = threading.Condition()
+
+    def publish(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def close(self, error=None):
+        with self._cond:
+            self.error = error
+            self.finished = True
+            self._cond.notify_all()
+
+    def subscribe(self):
+        """An iterator over all chunks, or None if the stream was already abandoned and is being stopped."""
+        with self._cond:
+            if self.abandoned.is_set():
+                return None
+            self.subscribers += 1
+        return _Subscription(self)
+
+    def _follow(self):
+        position = 0
+        while True:
+            with self._cond:
+                while position >= len(self.chunks) and not self.finished:
+                    self._cond.wait()
+                pending = self.chunks[position:]
+                position += len(pending)
+                finished, error = self.finished and position >= len(self.chunks), self.error
+            yield from pending
+            if finished:
+                if error is not None:
+                    raise error
+                return
+
+    def _leave(self):
+        with self._cond:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.finished:
+                self.abandoned.set()
+
+
+class _Subscription:
+    """
+    One subscriber's iterator over a _Broadcast. It leaves the broadcast exactly once: when iteration ends,
+    on close(), or when it is dropped, even if it was never iterated.
+    """
+
+    def __init__(self, broadcast):
+        self._broadcast = broadcast
+        self._chunks = broadcast._follow()
+        self._left = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._chunks)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        with self._lock:
+            if self._left:
+                return
+            self._left = True
+        self._chunks.close()
+        self._broadcast._leave()
+
+    def __del__(self):
+        self.close()
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution whose result all callers share."""
+
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+        self.stats = {"runs": 0, "shared": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run fn once per in-flight key. Returns (result, shared) where shared means another caller ran it."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result, False
+
+    def stream(self, key, fn, *args, **kwargs):
+        """
+        Streaming form of do(): fn returns an iterable of chunks, which runs once per in-flight key on a
+        background thread. Returns (chunks, shared); every caller's iterator replays the chunks from the
+        first one, so a caller joining late still gets the whole stream. An error ends all iterators.
+        When every caller has closed its iterator early, the run is stopped and fn's iterator closed.
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            chunks = broadcast.subscribe() if broadcast is not None else None
+            shared = chunks is not None
+            if not shared:
+                broadcast = self._streams[key] = _Broadcast()
+                chunks = broadcast.subscribe()
+            self.stats["shared" if shared else "runs"] += 1
+        if not shared:
+            # the leader's context carries its request trace and deadline into the run
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(self._produce, key, broadcast, fn, args, kwargs),
+                             name="singleflight", daemon=True).start()
+        return chunks, shared
+
+    def _produce(self, key, broadcast, fn, args, kwargs):
+        error, chunks = None, None
+        try:
+            chunks = fn(*args, **kwargs)
+            for chunk in chunks:
+                if broadcast.abandoned.is_set():
+                    break  # nobody is listening any more; closing the source cancels the upstream work
+                broadcast.publish(chunk)
+        except Exception as e:
+            error = e
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+            with self._lock:
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+            broadcast.close(error)
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls or key in self._streams
@@ -9,7 +9,20 @@ from app.database import get_session_messages, store_message
 import re
 from difflib import SequenceMatcher
 import base64
-import subprocess
+import logging
+import threading
+from functools import lru_cache
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from app.config import (
+    AZURE_TOKEN_LIFETIME_SECONDS, AZURE_TOKEN_REFRESH_SECONDS, AZURE_HTTP_POOL_SIZE, TTS_CACHE_ENABLED,
+    STT_DEBUG_AUDIO_ENABLED
+)
+from app.resilience import call_with_resilience, raise_for_retryable_status
+from app.metrics import timed
+from app.tracing import annotate
+from app.tts_cache import TTSCache, tts_cache_key, split_static_segments, join_wavs
+from app.transcoder import transcoder, probe_container
 
 
 class BravurCorrector:
@@ -76,6 +89,113 @@ if not speech_key or not service_region:
 bravur_corrector = BravurCorrector()
 
 
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+
+
+def _http_session(url):
+    """A keep-alive session per Azure host, so repeated calls skip the TCP and TLS handshakes."""
+    host = urlsplit(url).netloc
+    with _http_sessions_lock:
+        session = _http_sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=AZURE_HTTP_POOL_SIZE))
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=AZURE_HTTP_POOL_SIZE))
+            _http_sessions[host] = session
+        return session
+
+
+def azure_post(dependency, url, **kwargs):
+    """POST to Azure Speech with a deadline-derived timeout, bounded retries and a circuit breaker."""
+    session = _http_session(url)
+    return call_with_resilience(
+        dependency,
+        lambda timeout: raise_for_retryable_status(session.post(url, timeout=timeout, **kwargs))
+    )
+
+
+class AzureTokenCache:
+    """
+    The Azure Speech access token, shared by all requests. The first call fetches it; after
+    `refresh_after` seconds a background refresh replaces it, so callers only wait for a fetch when
+    the token is missing or past its `lifetime`.
+    """
+
+    def __init__(self, token_url, subscription_key, lifetime=AZURE_TOKEN_LIFETIME_SECONDS,
+                 refresh_after=AZURE_TOKEN_REFRESH_SECONDS):
+        self.token_url = token_url
+        self.subscription_key = subscription_key
+        self.lifetime = lifetime
+        self.refresh_after = refresh_after
+        self.fetches = 0
+        self._token = None
+        self._fetched_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+    def _valid_token(self):
+        if self._token is not None and time.monotonic() - self._fetched_at < self.lifetime:
+            return self._token
+        return None
+
+    def get(self):
+        with self._lock:
+            token = self._valid_token()
+            if token is not None:
+                if time.monotonic() - self._fetched_at >= self.refresh_after and not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh, name="azure-token", daemon=True).start()
+                return token
+        with self._fetch_lock:  # one synchronous fetch at a time; concurrent callers reuse its token
+            with self._lock:
+                token = self._valid_token()
+            return token if token is not None else self._store(self._request_token())
+
+    def invalidate(self, token):
+        """Drop `token` (e.g. after a 401) unless it has already been replaced."""
+        with self._lock:
+            if self._token == token:
+                self._token = None
+
+    def _refresh(self):
+        try:
+            self._store(self._request_token())
+        except Exception as e:
+            logging.warning(f"Background Azure token refresh failed, keeping the current token: {e}")
+        finally:
+            self._refreshing = False
+
+    def _request_token(self):
+        response = azure_post("azure_token", self.token_url,
+                              headers={'Ocp-Apim-Subscription-Key': self.subscription_key})
+        response.raise_for_status()
+        return response.text
+
+    def _store(self, token):
+        with self._lock:
+            self._token = token
+            self._fetched_at = time.monotonic()
+            self.fetches += 1
+        return token
+
+
+def azure_authorized_post(dependency, url, headers, tokens=None, **kwargs):
+    """azure_post with the cached bearer token; a 401 is retried once with a freshly fetched token."""
+    tokens = tokens or azure_tokens
+    token = tokens.get()
+    response = azure_post(dependency, url, headers=dict(headers, Authorization=f'Bearer {token}'), **kwargs)
+    if response.status_code == 401:
+        tokens.invalidate(token)
+        token = tokens.get()
+        response = azure_post(dependency, url, headers=dict(headers, Authorization=f'Bearer {token}'), **kwargs)
+    return response
+
+
+azure_tokens = AzureTokenCache(f"https://{service_region}.api.cognitive.microsoft.com/sts/v1.0/issueToken", speech_key)
+
+
 def remove_emojis(text):
     """Remove emojis from text for TTS processing"""
     emoji_pattern = re.compile(
@@ -101,28 +221,41 @@ def prepare_text_for_tts(text):
     return clean_text
 
 
-def text_to_speech_rest(text, language="en-US"):
-    """Text-to-speech using Azure REST API"""
-    clean_text = prepare_text_for_tts(text)
+TTS_VOICES = {"en-US": "en-US-JennyNeural", "nl-NL": "nl-NL-FennaNeural"}
 
-    # Choose voice based on language
-    if language == "nl-NL":
-        voice_name = "nl-NL-FennaNeural"
-    else:
-        voice_name = "en-US-JennyNeural"
+# Reply audio formats: name -> (Azure output format, MIME type, how clips are joined or None when they can't be).
+# WAV clips are re-muxed; MPEG frames are self-delimiting, so MP3 clips simply concatenate
+TTS_AUDIO_FORMATS = {
+    "wav": ('riff-16khz-16bit-mono-pcm', "audio/wav", join_wavs),
+    "mp3": ('audio-16khz-32kbitrate-mono-mp3', "audio/mpeg", b"".join),
+    "opus": ('ogg-16khz-16bit-mono-opus', "audio/ogg", None),
+}
 
-    # Get access token
-    token_url = f"https://{service_region}.api.cognitive.microsoft.com/sts/v1.0/issueToken"
-    headers = {
-        'Ocp-Apim-Subscription-Key': speech_key
-    }
+# Spoken before the first answer of a voice session
+VOICE_INTROS = {
+    "en-US": "Please go easy on my voice, I'm just an AI. But to answer your question: ",
+    "nl-NL": "Neem mijn stem niet te serieus, ik ben ook maar een AI. Maar om je vraag te beantwoorden: "
+}
+
+tts_cache = TTSCache()
+
+
+@lru_cache(maxsize=None)
+def static_tts_phrases(language="en-US"):
+    """The fixed phrases spoken in `language`, cleaned the way text_to_speech_rest cleans its input."""
+    from app.chatbot import static_reply_phrases
+    phrases = [VOICE_INTROS.get(language, VOICE_INTROS["en-US"]), *static_reply_phrases(language)]
+    return tuple(prepare_text_for_tts(phrase) for phrase in phrases)
 
-    try:
-        token_response = requests.post(token_url, headers=headers)
-        token_response.raise_for_status()
-        access_token = token_response.text
-    except Exception as e:
-        return None
+
+def synthesize(clean_text, language="en-US", audio_format="wav"):
+    """Audio for already-cleaned text, from the TTS cache or from Azure (and then cached)."""
+    voice_name = TTS_VOICES.get(language, TTS_VOICES["en-US"])
+    output_format = TTS_AUDIO_FORMATS[audio_format][0]
+    key = tts_cache_key(clean_text, voice_name, output_format)
+    audio = tts_cache.get(key) if TTS_CACHE_ENABLED else None
+    if audio is not None:
+        return audio
 
     # Create SSML
     ssml = f'''<speak version='1.0' xml:lang='{language}'>
@@ -134,19 +267,42 @@ def text_to_speech_rest(text, language="en-US"):
     # Make TTS request
     tts_url = f"https://{service_region}.tts.speech.microsoft.com/cognitiveservices/v1"
     headers = {
-        'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/ssml+xml',
-        'X-Microsoft-OutputFormat': 'riff-16khz-16bit-mono-pcm',
+        'X-Microsoft-OutputFormat': output_format,
         'User-Agent': 'BravurChatbot'
     }
+    response = azure_authorized_post("azure_tts", tts_url, headers=headers, data=ssml.encode('utf-8'))
+    response.raise_for_status()
+    if TTS_CACHE_ENABLED:
+        tts_cache.put(key, response.content)
+    return response.content
+
+
+def synthesize_text(text, language="en-US", audio_format="wav"):
+    """Audio for `text` (cleaned here) in one of TTS_AUDIO_FORMATS; raises when Azure fails."""
+    clean_text = prepare_text_for_tts(text)
+    join = TTS_AUDIO_FORMATS[audio_format][2]
+
+    # Fixed phrases inside the text (intro, canned replies) are synthesized separately so they come from
+    # the cache; only the rest of the text, e.g. an LLM answer or a session ID, goes to Azure
+    segments = [clean_text]
+    if TTS_CACHE_ENABLED and join is not None:
+        segments = split_static_segments(clean_text, static_tts_phrases(language)) or segments
+    clips = [synthesize(segment, language, audio_format) for segment in segments]
+    return clips[0] if len(clips) == 1 else join(clips)
+
+
+@timed("tts")
+def text_to_speech_rest(text, language="en-US", audio_format="wav"):
+    """Text-to-speech using Azure REST API"""
+    annotate(language=language, chars=len(prepare_text_for_tts(text)), audio_format=audio_format)
 
     try:
-        response = requests.post(tts_url, headers=headers, data=ssml.encode('utf-8'))
-        response.raise_for_status()
+        audio = synthesize_text(text, language, audio_format)
 
         # Save to temp file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-        temp_file.write(response.content)
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=f".{audio_format}")
+        temp_file.write(audio)
         temp_file.close()
 
         return temp_file.name
@@ -155,29 +311,42 @@ def text_to_speech_rest(text, language="en-US"):
         return None
 
 
+def prewarm_tts_cache(languages=("en-US", "nl-NL"), audio_formats=("wav", "mp3")):
+    """Synthesize the fixed phrases that are not cached yet, so their first use costs no Azure call."""
+    synthesized = 0
+    for language in languages:
+        voice_name = TTS_VOICES.get(language, TTS_VOICES["en-US"])
+        for audio_format in audio_formats:
+            output_format = TTS_AUDIO_FORMATS[audio_format][0]
+            for phrase in static_tts_phrases(language):
+                if tts_cache_key(phrase, voice_name, output_format) in tts_cache:
+                    continue
+                try:
+                    synthesize(phrase, language, audio_format)
+                except Exception as e:
+                    logging.warning(f"TTS prewarm stopped after {synthesized} phrases: {e}")
+                    return synthesized
+                synthesized += 1
+    logging.info(f"TTS prewarm synthesized {synthesized} phrases")
+    return synthesized
+
+
+def _transcode_file(webm_file_path, wav_suffix):
+    with open(webm_file_path, 'rb') as f:
+        wav = transcoder.to_wav(f.read())
+    if wav is None:
+        return None
+    wav_file_path = webm_file_path.replace('.webm', wav_suffix)
+    with open(wav_file_path, 'wb') as f:
+        f.write(wav)
+    return wav_file_path
+
+
+@timed("ffmpeg")
 def convert_webm_to_wav(webm_file_path):
     """Convert WebM file to WAV format using ffmpeg"""
     try:
-        # Create temporary WAV file
-        wav_file_path = webm_file_path.replace('.webm', '.wav')
-        
-        # Use ffmpeg to convert
-        cmd = [
-            'ffmpeg', '-i', webm_file_path,
-            '-acodec', 'pcm_s16le',
-            '-ar', '16000',
-            '-ac', '1',
-            '-y',  # Overwrite output file
-            wav_file_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            return wav_file_path
-        else:
-            return None
-            
+        return _transcode_file(webm_file_path, '.wav')
     except Exception as e:
         return None
 
@@ -186,20 +355,7 @@ def analyze_audio_file(audio_file_path):
     """Analyze audio file format and properties"""
     try:
         with open(audio_file_path, 'rb') as f:
-            data = f.read()
-        
-        # Check for common audio formats
-        if data.startswith(b'RIFF'):
-            return 'wav'
-        elif data.startswith(b'\x1aE\xdf\xa3') or data.startswith(b'E\xdf\xa3'):
-            return 'webm'
-        elif data.startswith(b'ID3') or data.startswith(b'\xff\xfb'):
-            return 'mp3'
-        elif data.startswith(b'OggS'):
-            return 'ogg'
-        else:
-            return 'unknown'
-            
+            return probe_container(f.read(16))
     except Exception as e:
         return 'error'
 
@@ -227,20 +383,21 @@ def analyze_audio_content(audio_file_path):
 
 def speech_to_text_from_file_rest(audio_file_path, language=None):
     """Speech-to-text from file using Azure REST API"""
-    # Get access token
-    token_url = f"https://{service_region}.api.cognitive.microsoft.com/sts/v1.0/issueToken"
-    headers = {
-        'Ocp-Apim-Subscription-Key': speech_key
-    }
+    try:
+        with open(audio_file_path, 'rb') as audio_file:
+            audio_data = audio_file.read()
+    except Exception as e:
+        return {"text": "", "status": "error", "message": f"File read error: {str(e)}"}
+    return speech_to_text_rest(audio_data, language)
 
+
+@timed("stt")
+def speech_to_text_rest(audio_data, language=None):
+    """Speech-to-text for uploaded audio bytes using Azure REST API"""
+    annotate(language=language or "auto")
+    # Get access token (cached; only fetched when missing or expired)
     try:
-        token_response = requests.post(token_url, headers=headers)
-        
-        if token_response.status_code != 200:
-            return {"text": "", "status": "error", "message": f"Token error: {token_response.status_code} - {token_response.text}"}
-        
-        token_response.raise_for_status()
-        access_token = token_response.text
+        azure_tokens.get()
     except Exception as e:
         return {"text": "", "status": "error", "message": f"Token error: {str(e)}"}
 
@@ -252,24 +409,21 @@ def speech_to_text_from_file_rest(audio_file_path, language=None):
     else:
         recognition_language = "nl-NL"  # Default to Dutch
 
-    # Read audio file and determine format
+    # Determine the format (probed once, from the magic bytes)
     try:
-        with open(audio_file_path, 'rb') as audio_file:
-            audio_data = audio_file.read()
-        
         # Check if audio data is not empty
         if len(audio_data) == 0:
             return {"text": "", "status": "error", "message": "Audio file is empty"}
             
         # Analyze the audio file format
-        file_format = analyze_audio_file(audio_file_path)
+        file_format = probe_container(audio_data)
         
         # Handle different formats
         if file_format == 'wav':
             content_type = 'audio/wav; codecs=audio/pcm; samplerate=16000'
         elif file_format == 'webm':
-            # Save debug copy
-            save_audio_for_debug(audio_file_path, "debug")
+            if STT_DEBUG_AUDIO_ENABLED:
+                save_audio_for_debug(audio_data, "debug")
             
             # Try sending WebM directly to Azure first
             content_type = 'audio/webm; codecs=opus'
@@ -292,25 +446,24 @@ def speech_to_text_from_file_rest(audio_file_path, language=None):
         'format': 'detailed'
     }
     headers = {
-        'Authorization': f'Bearer {access_token}',
         'Content-Type': content_type,
         'Accept': 'application/json'
     }
 
     try:
-        response = requests.post(stt_url, headers=headers, params=params, data=audio_data)
+        response = azure_authorized_post("azure_stt", stt_url, headers=headers, params=params, data=audio_data)
         
         if response.status_code != 200:
             # If WebM failed, try different content types
             if content_type == 'audio/webm; codecs=opus' and file_format == 'webm':
                 # Try without codec specification
                 headers['Content-Type'] = 'audio/webm'
-                response = requests.post(stt_url, headers=headers, params=params, data=audio_data)
+                response = azure_authorized_post("azure_stt", stt_url, headers=headers, params=params, data=audio_data)
                 
                 if response.status_code != 200:
                     # Try with vorbis codec
                     headers['Content-Type'] = 'audio/webm; codecs=vorbis'
-                    response = requests.post(stt_url, headers=headers, params=params, data=audio_data)
+                    response = azure_authorized_post("azure_stt", stt_url, headers=headers, params=params, data=audio_data)
                     
                     if response.status_code != 200:
                         return {"text": "", "status": "error", "message": f"STT API error: {response.status_code} - {response.text}"}
@@ -350,42 +503,28 @@ def speech_to_text_from_file_rest(audio_file_path, language=None):
             else:
                 # If WebM failed and we have a WebM file, try repair
                 if file_format == 'webm' and 'original_audio_data' in locals():
-                    repaired_wav_path = try_repair_webm(audio_file_path)
-                    
-                    if repaired_wav_path:
-                        with open(repaired_wav_path, 'rb') as wav_file:
-                            audio_data = wav_file.read()
+                    repaired_wav = transcoder.to_wav(audio_data, file_format)
+
+                    if repaired_wav:
+                        audio_data = repaired_wav
                         content_type = 'audio/wav; codecs=audio/pcm; samplerate=16000'
-                        
+
                         # Retry with repaired WAV
                         headers['Content-Type'] = content_type
-                        response = requests.post(stt_url, headers=headers, params=params, data=audio_data)
-                        
+                        response = azure_authorized_post("azure_stt", stt_url, headers=headers, params=params, data=audio_data)
+
                         if response.status_code == 200:
                             result = response.json()
-                            
+
                             if result.get('RecognitionStatus') == 'Success':
                                 recognized_text = result.get('DisplayText', '')
                                 if recognized_text:
                                     corrected_text = bravur_corrector.correct_text(recognized_text)
-                                    
-                                    # Clean up repaired file
-                                    try:
-                                        os.remove(repaired_wav_path)
-                                    except:
-                                        pass
-                                    
                                     return {
                                         "text": corrected_text,
                                         "status": "success"
                                     }
-                        
-                        # Clean up repaired file
-                        try:
-                            os.remove(repaired_wav_path)
-                        except:
-                            pass
-                
+
                 return {"text": "", "status": "error", "message": "No speech detected"}
         else:
             return {"text": "", "status": "error", "message": f"Recognition failed: {result.get('RecognitionStatus')}"}
@@ -420,10 +559,11 @@ def get_chatbot_response(user_text, session_id=None, language=None):
 
     # First, try calling the chatbot function directly (more reliable)
     try:
-        from app.chatbot import company_info_handler_streaming
+        from app.chatbot import agent_connector, BRAVUR_INFORMATION_AGENT
         print(f"🧠 Calling chatbot directly...")
         response_chunks = []
-        for chunk in company_info_handler_streaming(user_text, session_id=session_id, language=language):
+        for chunk in agent_connector.stream(BRAVUR_INFORMATION_AGENT, user_text, session_id=session_id,
+                                            language=language):
             response_chunks.append(chunk)
         result = "".join(response_chunks)
         print(f"✅ Direct chatbot call successful: {len(result)} chars")
@@ -445,7 +585,8 @@ def get_chatbot_response(user_text, session_id=None, language=None):
         print(f"🌐 Fallback: Making HTTP request to: {url}")
 
         try:
-            response = requests.post(url, data=data, timeout=15)
+            response = call_with_resilience(
+                "chat_http_fallback", lambda timeout: requests.post(url, data=data, timeout=timeout))
             print(f"📡 Response status: {response.status_code}")
 
             if response.status_code == 200:
@@ -523,11 +664,7 @@ def speech_to_speech_from_file_rest(audio_file_path, language=None, session_id=N
     # Add intro joke only if this is the first bot response in this session
     final_response_text = response_text
     if is_first_interaction:
-        if response_language == "nl-NL":
-            intro = "Neem mijn stem niet te serieus, ik ben ook maar een AI. Maar om je vraag te beantwoorden: "
-        else:
-            intro = "Please go easy on my voice, I'm just an AI. But to answer your question: "
-        final_response_text = intro + response_text
+        final_response_text = VOICE_INTROS.get(response_language, VOICE_INTROS["en-US"]) + response_text
 
     # Store the bot response in the database
     bot_message_id = store_message(session_id, final_response_text, "bot")
@@ -626,16 +763,16 @@ def test_azure_speech_setup():
         return False
 
 
-def save_audio_for_debug(audio_file_path, session_id):
-    """Save a copy of the audio file for manual inspection"""
+def save_audio_for_debug(audio_data, session_id):
+    """Save a copy of the uploaded audio for manual inspection"""
     try:
-        import shutil
         debug_dir = "debug_audio"
         if not os.path.exists(debug_dir):
             os.makedirs(debug_dir)
         
-        debug_file = os.path.join(debug_dir, f"session_{session_id}_{os.path.basename(audio_file_path)}")
-        shutil.copy2(audio_file_path, debug_file)
+        debug_file = os.path.join(debug_dir, f"session_{session_id}_{int(time.time() * 1000)}.{probe_container(audio_data)}")
+        with open(debug_file, 'wb') as f:
+            f.write(audio_data)
         return debug_file
     except Exception as e:
         return None
@@ -644,29 +781,6 @@ def save_audio_for_debug(audio_file_path, session_id):
 def try_repair_webm(webm_file_path):
     """Try to repair corrupted WebM file using different approaches"""
     try:
-        # Try different ffmpeg approaches
-        approaches = [
-            # Approach 1: Force format detection
-            ['ffmpeg', '-f', 'webm', '-i', webm_file_path, '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', '-y'],
-            # Approach 2: Ignore errors and continue
-            ['ffmpeg', '-i', webm_file_path, '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', '-y', '-err_detect', 'ignore_err'],
-            # Approach 3: Force matroska format
-            ['ffmpeg', '-f', 'matroska', '-i', webm_file_path, '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', '-y'],
-        ]
-        
-        for i, cmd in enumerate(approaches):
-            wav_file_path = webm_file_path.replace('.webm', f'_repaired_{i}.wav')
-            cmd.append(wav_file_path)
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0 and os.path.exists(wav_file_path):
-                return wav_file_path
-            else:
-                if os.path.exists(wav_file_path):
-                    os.remove(wav_file_path)
-        
-        return None
-        
+        return _transcode_file(webm_file_path, '_repaired.wav')
     except Exception as e:
-        return None
\ No newline at end of file
+        return None
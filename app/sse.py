@@ -0,0 +1,129 @@
+# app/sse.py
+import json
+import re
+import secrets
+import threading
+import time
+
+from app.config import SSE_HEARTBEAT_SECONDS, SSE_REPLAY_TTL_SECONDS
+
+HEARTBEAT = ": keep-alive\n\n"
+
+_ROW_ID_PATTERN = re.compile(r"Row ID:?\s*(\d+)", re.IGNORECASE)
+_LINK_PATTERN = re.compile(r"https?://[^\s\)\]>\"']+")
+
+
+class StatusChunk(str):
+    """
+    Progress text yielded by the chat pipeline (e.g. "Searching the web..."). Plain-text clients see it
+    inline as before; SSE clients get it as a `status` event, and it is not stored as part of the answer.
+    """
+
+
+def format_event(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def extract_citations(text):
+    """Row IDs and source links cited in a finished answer."""
+    row_ids = list(dict.fromkeys(int(row_id) for row_id in _ROW_ID_PATTERN.findall(text)))
+    links = list(dict.fromkeys(link.rstrip(".,;:") for link in _LINK_PATTERN.findall(text)))
+    return {"row_ids": row_ids, "links": links}
+
+
+def parse_last_event_id(value):
+    """'<stream id>-<sequence>' -> (stream id, sequence), or (None, -1) when malformed."""
+    stream_id, _, sequence = (value or "").rpartition("-")
+    if not stream_id or not sequence.isdigit():
+        return None, -1
+    return stream_id, int(sequence)
+
+
+class EventStream:
+    """The events of one SSE response, kept for a while after it ends so a reconnecting client can resume."""
+
+    def __init__(self, stream_id=None):
+        self.stream_id = stream_id or secrets.token_urlsafe(12)
+        self.events = []  # (sequence, event, data)
+        self.finished_at = None
+        self.followers = 0
+        self.detached_at = time.monotonic()  # when the last follower left (or the stream was created)
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    def publish(self, event, data):
+        with self._cond:
+            sequence = len(self.events)
+            self.events.append((sequence, event, data))
+            self._cond.notify_all()
+            return sequence
+
+    def close(self):
+        with self._cond:
+            if self.finished_at is None:
+                self.finished_at = time.monotonic()
+            self._cond.notify_all()
+
+    def abandoned(self, grace_seconds):
+        """True once nobody has been following the unfinished stream for `grace_seconds`."""
+        with self._cond:
+            return not self.finished and self.followers == 0 and time.monotonic() - self.detached_at > grace_seconds
+
+    def follow(self, after=-1, heartbeat=SSE_HEARTBEAT_SECONDS):
+        """Yield formatted events after sequence `after` until the stream ends, with heartbeats while idle."""
+        position = after + 1
+        with self._cond:
+            self.followers += 1
+        try:
+            while True:
+                with self._cond:
+                    if position >= len(self.events) and not self.finished:
+                        self._cond.wait(heartbeat)
+                    pending = self.events[position:]
+                    position += len(pending)
+                    done = self.finished and position >= len(self.events)
+                if not pending and not done:
+                    yield HEARTBEAT
+                for sequence, event, data in pending:
+                    yield format_event(f"{self.stream_id}-{sequence}", event, data)
+                if done:
+                    return
+        finally:
+            with self._cond:
+                self.followers -= 1
+                self.detached_at = time.monotonic()
+
+
+class EventStreamStore:
+    """In-process registry of recent event streams (resume works against the worker that served the stream)."""
+
+    def __init__(self, ttl_seconds=SSE_REPLAY_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def create(self):
+        stream = EventStream()
+        with self._lock:
+            self._sweep()
+            self._streams[stream.stream_id] = stream
+        return stream
+
+    def get(self, stream_id):
+        with self._lock:
+            self._sweep()
+            return self._streams.get(stream_id)
+
+    def _sweep(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        for stream_id in [s.stream_id for s in self._streams.values() if s.finished and s.finished_at < cutoff]:
+            del self._streams[stream_id]
+
+    def __len__(self):
+        return len(self._streams)
+
+
+event_streams = EventStreamStore()
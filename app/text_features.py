@@ -0,0 +1,119 @@
+# app/text_features.py
+import logging
+from collections import deque
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:  # Slower pure-python fallback with the same scoring function
+    from fuzzywuzzy import fuzz
+    process = None
+    logging.warning("rapidfuzz not installed; falling back to fuzzywuzzy for keyword matching.")
+
+
+class PhraseAutomaton:
+    """Aho-Corasick automaton: finds every tagged phrase occurring in a text in one pass."""
+
+    def __init__(self, phrases_by_tag):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+        for tag, phrases in phrases_by_tag.items():
+            for phrase in phrases:
+                self._add(phrase.lower(), tag)
+        self._build_failure_links()
+
+    def _add(self, phrase, tag):
+        state = 0
+        for char in phrase:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        self._out[state].add(tag)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._out[child] |= self._out[self._fail[child]]
+
+    def search(self, text):
+        """Return the set of tags with at least one phrase occurring (as a substring) in text."""
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if self._out[state]:
+                found |= self._out[state]
+        return found
+
+
+class TextFeatures:
+    """Everything the intent branches need to know about one user input, computed once."""
+
+    def __init__(self, text, lower, stripped, words, tags, scores):
+        self.text = text
+        self.lower = lower
+        self.stripped = stripped
+        self.words = words
+        self.tags = tags
+        self._scores = scores
+
+    def has_phrase(self, tag):
+        return tag in self.tags
+
+    def fuzzy_score(self, group):
+        return self._scores[group]
+
+    def fuzzy_match(self, group, threshold):
+        return self._scores[group] > threshold
+
+
+class TextMatcher:
+    """
+    Precompiled keyword matcher. `phrase_groups` are matched exactly (substring semantics) with an
+    Aho-Corasick automaton; `fuzzy_groups` are scored with partial_ratio against all templates at once.
+    Groups listed in `stripped_groups` are scored against the whitespace-stripped text.
+    """
+
+    def __init__(self, phrase_groups, fuzzy_groups, stripped_groups=()):
+        self.automaton = PhraseAutomaton(phrase_groups)
+        self.templates = []
+        self.group_indices = {}
+        for group, templates in fuzzy_groups.items():
+            indices = []
+            for template in templates:
+                if template not in self.templates:
+                    self.templates.append(template)
+                indices.append(self.templates.index(template))
+            self.group_indices[group] = indices
+        self.stripped_groups = set(stripped_groups)
+
+    def _score_rows(self, queries):
+        if process is not None:
+            try:
+                return process.cdist(queries, self.templates, scorer=fuzz.partial_ratio).tolist()
+            except ImportError:  # cdist needs numpy
+                pass
+        return [[fuzz.partial_ratio(query, template) for template in self.templates] for query in queries]
+
+    def analyze(self, text):
+        lower = text.lower()
+        stripped = lower.strip()
+        queries = [lower] if stripped == lower else [lower, stripped]
+        rows = self._score_rows(queries)
+        scores = {}
+        for group, indices in self.group_indices.items():
+            row = rows[-1] if group in self.stripped_groups else rows[0]
+            scores[group] = max((row[i] for i in indices), default=0)
+        return TextFeatures(text, lower, stripped, lower.split(), self.automaton.search(lower), scores)
@@ -0,0 +1,188 @@
+# app/tracing.py
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+
+from app.config import TRACING_ENABLED, TRACE_LOG_PATH, TRACE_LOG_MAX_BYTES, TRACE_LOG_BACKUP_COUNT
+
+TRACE_HEADER = "X-Trace-Id"
+MAX_SPANS_PER_TRACE = 500
+_TRACE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+_current_trace = ContextVar("current_trace", default=None)
+_current_span = ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation. Field names follow OTLP so traces can be shipped to a collector later."""
+
+    __slots__ = ("name", "span_id", "parent_span_id", "start", "duration_ms", "status", "attributes", "_started")
+
+    def __init__(self, name, parent_span_id=None, attributes=None):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.start = time.time()
+        self.duration_ms = None
+        self.status = "ok"
+        self.attributes = dict(attributes) if attributes else {}
+        self._started = time.perf_counter()
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def end(self):
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 3)
+
+    def to_dict(self):
+        return {
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """All spans recorded while serving one request."""
+
+    def __init__(self, name, trace_id=None):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.root = Span(name)
+        self.spans = []
+        self.dropped_spans = 0
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            if len(self.spans) < MAX_SPANS_PER_TRACE:
+                self.spans.append(span)
+            else:
+                self.dropped_spans += 1
+
+    def to_dict(self):
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        record = {"trace_id": self.trace_id, **self.root.to_dict(), "spans": spans}
+        if self.dropped_spans:
+            record["dropped_spans"] = self.dropped_spans
+        return record
+
+
+def _build_trace_logger():
+    trace_logger = logging.getLogger("bravur.traces")
+    trace_logger.propagate = False
+    if TRACING_ENABLED and not trace_logger.handlers:
+        try:
+            os.makedirs(os.path.dirname(TRACE_LOG_PATH) or ".", exist_ok=True)
+            handler = RotatingFileHandler(TRACE_LOG_PATH, maxBytes=TRACE_LOG_MAX_BYTES,
+                                          backupCount=TRACE_LOG_BACKUP_COUNT, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            trace_logger.addHandler(handler)
+            trace_logger.setLevel(logging.INFO)
+        except OSError as e:
+            logging.error(f"Could not open trace log {TRACE_LOG_PATH}, traces will not be written: {e}")
+    return trace_logger
+
+
+trace_logger = _build_trace_logger()
+
+
+def start_trace(name, trace_id=None):
+    """Start a trace for the current request. A valid incoming trace id is reused to correlate with the client."""
+    if not TRACING_ENABLED:
+        return None
+    if trace_id and not _TRACE_ID_PATTERN.match(trace_id):
+        trace_id = None
+    trace = Trace(name, trace_id)
+    _current_trace.set(trace)
+    _current_span.set(None)
+    return trace
+
+
+def clear_trace():
+    _current_trace.set(None)
+    _current_span.set(None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def finish_trace(trace):
+    """End the root span and append the trace as one JSON line to the rotating trace log."""
+    if trace is None:
+        return
+    trace.root.end()
+    try:
+        trace_logger.info(json.dumps(trace.to_dict(), default=str, separators=(",", ":")))
+    except Exception as e:
+        logging.error(f"Failed to write trace {trace.trace_id}: {e}")
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time a block as a child of the current span. Yields the span so callers can add attributes."""
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else trace.root.span_id if trace else None, attributes)
+    # set()/set(previous) rather than a reset token: generator-held spans may be closed from another context
+    _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            current.status = "error"
+            current.set("error", str(e)[:200])
+        raise
+    finally:
+        current.end()
+        _current_span.set(parent)
+        if trace is not None:
+            trace.add(current)
+
+
+def annotate(**attributes):
+    """Add attributes to the innermost open span (or the request's root span)."""
+    current = _current_span.get()
+    if current is None:
+        trace = _current_trace.get()
+        current = trace.root if trace else None
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def annotate_trace(**attributes):
+    """Add attributes to the request's root span, e.g. the final intent of a chat turn."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.root.attributes.update(attributes)
+
+
+def trace_attribute(name, default=None):
+    """An attribute of the request's root span, e.g. one set by the agent that served the request."""
+    trace = _current_trace.get()
+    return trace.root.attributes.get(name, default) if trace is not None else default
+
+
+def record_span(name, started_monotonic, ended_monotonic=None, **attributes):
+    """Record an already finished operation, e.g. a stream that was consumed across generator yields."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    ended_monotonic = ended_monotonic if ended_monotonic is not None else time.monotonic()
+    parent = _current_span.get()
+    completed = Span(name, parent.span_id if parent else trace.root.span_id, attributes)
+    completed.start = time.time() - (time.monotonic() - started_monotonic)
+    completed.duration_ms = round((ended_monotonic - started_monotonic) * 1000, 3)
+    trace.add(completed)
@@ -0,0 +1,180 @@
+# app/transcoder.py
+import logging
+import re
+import struct
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import (
+    FFMPEG_BINARY, TRANSCODE_WORKERS, TRANSCODE_TIMEOUT_SECONDS, TRANSCODE_QUEUE_TIMEOUT_SECONDS,
+    TRANSCODE_STRATEGY_CACHE_SIZE
+)
+from app.metrics import observe_transcode, observe_transcode_wait
+
+# ffmpeg demuxer to force for each container recognized by probe_container
+_DEMUXERS = {"wav": "wav", "webm": "webm", "mp3": "mp3", "ogg": "ogg"}
+
+# Fallbacks for damaged uploads (e.g. MediaRecorder WebM without a proper header)
+REPAIR_STRATEGIES = (
+    ("ignore_errors", ["-err_detect", "ignore_err"]),
+    ("matroska", ["-f", "matroska"]),
+)
+
+_WRITING_APP = re.compile(rb"\x57\x41[\x81-\xbf]")  # Matroska WritingApp element with a one-byte size
+
+
+def probe_container(data):
+    """The container of an upload from its magic bytes: 'wav', 'webm', 'mp3', 'ogg' or 'unknown'."""
+    if data.startswith(b'RIFF'):
+        return 'wav'
+    if data.startswith(b'\x1aE\xdf\xa3') or data.startswith(b'E\xdf\xa3'):
+        return 'webm'
+    if data.startswith(b'ID3') or data.startswith(b'\xff\xfb'):
+        return 'mp3'
+    if data.startswith(b'OggS'):
+        return 'ogg'
+    return 'unknown'
+
+
+def codec_fingerprint(data, container=None):
+    """What produced an upload, e.g. 'webm/opus/Chrome': the browsers whose recordings need the same repair."""
+    container = container or probe_container(data)
+    head = data[:4096]
+    codec = next((name for marker, name in ((b"A_OPUS", "opus"), (b"A_VORBIS", "vorbis"), (b"OpusHead", "opus"),
+                                              (b"\x01vorbis", "vorbis")) if marker in head), "-")
+    writing_app = "-"
+    match = _WRITING_APP.search(head)
+    if match:
+        size = match.group()[2] & 0x7f
+        writing_app = head[match.end():match.end() + size].decode("ascii", "replace").split("-")[0] or "-"
+    return f"{container}/{codec}/{writing_app}"
+
+
+def _fix_wav_sizes(wav):
+    """ffmpeg can't seek back in a pipe, so it leaves the RIFF and data sizes unset; fill them in."""
+    wav = bytearray(wav)
+    if wav[:4] != b"RIFF" or len(wav) < 12:
+        return bytes(wav)
+    struct.pack_into("<I", wav, 4, len(wav) - 8)
+    position = 12
+    while position + 8 <= len(wav):
+        chunk_id, size = wav[position:position + 4], struct.unpack_from("<I", wav, position + 4)[0]
+        if chunk_id == b"data":
+            struct.pack_into("<I", wav, position + 4, len(wav) - position - 8)
+            break
+        position += 8 + size + (size & 1)
+    return bytes(wav)
+
+
+class AudioTranscoder:
+    """
+    Converts uploads to 16 kHz mono PCM WAV by piping them through ffmpeg (stdin -> stdout, no temp files).
+    At most `workers` uploads are transcoded at once; the others queue for a worker. The upload is probed
+    once from its magic bytes, and the strategy that last worked for its codec fingerprint is tried first.
+    """
+
+    def __init__(self, binary=FFMPEG_BINARY, workers=TRANSCODE_WORKERS, timeout=TRANSCODE_TIMEOUT_SECONDS,
+                 queue_timeout=TRANSCODE_QUEUE_TIMEOUT_SECONDS, strategy_cache_size=TRANSCODE_STRATEGY_CACHE_SIZE):
+        self.binary = binary
+        self.workers = workers
+        self.timeout = timeout  # per ffmpeg run
+        self.queue_timeout = queue_timeout
+        self.strategy_cache_size = strategy_cache_size
+        self.stats = {"runs": 0, "failures": 0, "queue_timeouts": 0, "cached_strategy_hits": 0}
+        self.queued = 0
+        self.active = 0
+        self._slots = threading.BoundedSemaphore(workers)
+        self._strategies = OrderedDict()  # codec fingerprint -> name of the strategy that worked
+        self._lock = threading.Lock()
+
+    def strategies(self, container):
+        probed = _DEMUXERS.get(container)
+        first = (container, ["-f", probed]) if probed else ("auto", [])
+        return [first, *REPAIR_STRATEGIES]
+
+    def to_wav(self, data, container=None, fingerprint=None):
+        """WAV bytes for the upload `data`, or None when every strategy failed (or no worker was free in time)."""
+        container = container or probe_container(data)
+        fingerprint = fingerprint or codec_fingerprint(data, container)
+        strategies = self.strategies(container)
+        with self._lock:
+            known = self._strategies.get(fingerprint)
+        if known is not None:
+            strategies.sort(key=lambda strategy: strategy[0] != known)
+
+        if not self._acquire():
+            return None
+        try:
+            for name, input_args in strategies:  # one worker slot per upload, whichever strategies it needs
+                wav = self._run(name, input_args, data)
+                if wav is not None:
+                    self._remember(fingerprint, name, known)
+                    return wav
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.active -= 1
+        logging.warning(f"Could not transcode {len(data)} byte {fingerprint} upload with any strategy")
+        return None
+
+    def _acquire(self):
+        queued_at = time.monotonic()
+        with self._lock:
+            self.queued += 1
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.queued -= 1
+            if acquired:
+                self.active += 1
+            else:
+                self.stats["queue_timeouts"] += 1
+        observe_transcode_wait(time.monotonic() - queued_at)
+        if not acquired:
+            logging.warning(f"No transcoding worker free within {self.queue_timeout}s ({self.workers} busy)")
+        return acquired
+
+    def _remember(self, fingerprint, name, known):
+        with self._lock:
+            if name == known:
+                self.stats["cached_strategy_hits"] += 1
+            self._strategies[fingerprint] = name
+            self._strategies.move_to_end(fingerprint)
+            while len(self._strategies) > self.strategy_cache_size:
+                self._strategies.popitem(last=False)
+
+    def _run(self, name, input_args, data):
+        cmd = [self.binary, '-hide_banner', '-loglevel', 'error', *input_args, '-i', 'pipe:0',
+               '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', '-f', 'wav', 'pipe:1']
+        started = time.monotonic()
+        outcome, wav = "error", None
+        try:
+            process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            try:
+                output, errors = process.communicate(input=data, timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                outcome = "timeout"
+            else:
+                if process.returncode == 0 and output:
+                    outcome, wav = "ok", _fix_wav_sizes(output)
+                else:
+                    logging.info(f"ffmpeg strategy {name} failed: {errors.decode('utf-8', 'replace').strip()[:200]}")
+        except OSError as e:
+            logging.error(f"Could not start {self.binary}: {e}")
+        with self._lock:
+            self.stats["runs"] += 1
+            if wav is None:
+                self.stats["failures"] += 1
+        observe_transcode(name, outcome, time.monotonic() - started)
+        return wav
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, workers=self.workers, active=self.active, queued=self.queued,
+                        cached_fingerprints=len(self._strategies))
+
+
+transcoder = AudioTranscoder()
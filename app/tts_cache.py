@@ -0,0 +1,157 @@
+# app/tts_cache.py
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+import wave
+from collections import OrderedDict
+
+from app.config import TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES, TTS_CACHE_MEMORY_MAX_BYTES
+
+
+def tts_cache_key(text, voice, output_format):
+    """Content address of one synthesized clip: the cleaned text, the voice and the audio format."""
+    return hashlib.sha256(f"{voice}\n{output_format}\n{text}".encode("utf-8")).hexdigest()
+
+
+def split_static_segments(text, phrases):
+    """
+    Split `text` around any of the known static `phrases` it contains, so those parts can be served
+    from the cache and only the rest (an LLM answer, a session ID) needs synthesizing.
+    """
+    phrases = sorted({p for p in phrases if p}, key=len, reverse=True)  # longest match wins
+    if not phrases:
+        return [text] if text else []
+    pattern = re.compile("(" + "|".join(re.escape(p) for p in phrases) + ")")
+    return [segment.strip() for segment in pattern.split(text) if segment.strip()]
+
+
+def join_wavs(clips):
+    """Concatenate WAV clips of the same format into one WAV."""
+    if len(clips) == 1:
+        return clips[0]
+    output = io.BytesIO()
+    with wave.open(output, "wb") as writer:
+        for i, clip in enumerate(clips):
+            with wave.open(io.BytesIO(clip), "rb") as reader:
+                if i == 0:
+                    writer.setparams(reader.getparams())
+                writer.writeframes(reader.readframes(reader.getnframes()))
+    return output.getvalue()
+
+
+class TTSCache:
+    """
+    Synthesized audio by content address: an in-memory LRU in front of a directory of audio files.
+    Both tiers are bounded in bytes; the disk tier evicts the least recently used files and survives
+    restarts, so fixed phrases are synthesized once per deployment rather than once per request.
+    """
+
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES,
+                 memory_max_bytes=TTS_CACHE_MEMORY_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_max_bytes = memory_max_bytes
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None  # scanned on first write
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.audio")
+
+    def get(self, key):
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return audio
+        try:
+            with open(self._path(key), "rb") as f:
+                audio = f.read()
+            os.utime(self._path(key))  # recently used: evicted last
+        except OSError:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        with self._lock:
+            self.stats["disk_hits"] += 1
+            self._remember(key, audio)
+        return audio
+
+    def put(self, key, audio):
+        with self._lock:
+            self._remember(key, audio)
+        path = self._path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+        except OSError as e:
+            logging.warning(f"Could not write TTS cache entry {key[:12]}: {e}")
+            return
+        with self._lock:
+            # concurrent misses for the same text may both write it: count only what the replace adds
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            try:
+                os.replace(tmp_path, path)  # readers never see a partial file
+            except OSError as e:
+                logging.warning(f"Could not write TTS cache entry {key[:12]}: {e}")
+                return
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, _, size in self._disk_entries())
+            else:
+                self._disk_bytes += len(audio) - replaced
+            if self._disk_bytes > self.max_bytes:
+                self._evict_disk()
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._memory:
+                return True
+        return os.path.exists(self._path(key))
+
+    def _remember(self, key, audio):
+        if len(audio) > self.memory_max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _disk_entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".audio"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime_ns, name, stat.st_size))
+        return entries
+
+    def _evict_disk(self):
+        for _, name, size in sorted(self._disk_entries()):
+            if self._disk_bytes <= self.max_bytes * 0.9:  # leave headroom so eviction isn't per write
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            self._disk_bytes -= size
+            self.stats["evictions"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, memory_entries=len(self._memory), memory_bytes=self._memory_bytes,
+                        disk_bytes=self._disk_bytes)
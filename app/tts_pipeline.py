@@ -0,0 +1,102 @@
+# app/tts_pipeline.py
+import contextvars
+import logging
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from app.config import TTS_PIPELINE_WORKERS, TTS_SENTENCE_MIN_CHARS
+from app.metrics import timed
+
+# A sentence ends at . ! ? or … (optionally followed by closing quotes/brackets) and whitespace, or at a line break;
+# "3.5" and URLs don't split because no whitespace follows the dot
+_SENTENCE_END = re.compile(r"[.!?…][\"')\]]*\s+|\n+")
+
+_pool = ThreadPoolExecutor(max_workers=TTS_PIPELINE_WORKERS, thread_name_prefix="tts-pipeline")
+
+
+class SentenceSplitter:
+    """
+    Cuts streamed reply text into speakable pieces. Everything up to the last sentence end in the
+    buffer is released at once, so a canned reply that arrives as one chunk stays one piece (and
+    matches the TTS cache), while an LLM token stream is released sentence by sentence.
+    """
+
+    def __init__(self, min_chars=TTS_SENTENCE_MIN_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text):
+        """Add streamed text; returns a finished piece or None."""
+        self._buffer += text
+        last_end = None
+        for match in _SENTENCE_END.finditer(self._buffer):
+            last_end = match.end()
+        if last_end is None or len(self._buffer[:last_end].strip()) < self.min_chars:
+            return None
+        piece, self._buffer = self._buffer[:last_end].strip(), self._buffer[last_end:]
+        return piece
+
+    def flush(self):
+        """The rest of the text once the stream has ended, or None."""
+        piece, self._buffer = self._buffer.strip(), ""
+        return piece or None
+
+
+class SpeechPipeline:
+    """
+    Synthesizes the pieces of one reply concurrently and passes each clip to `deliver(index, text, audio)`
+    in submission order, as soon as it and every earlier clip are done (not when the next token arrives).
+    """
+
+    def __init__(self, synthesize, language, deliver, pool=None):
+        self.synthesize = synthesize
+        self.language = language
+        self.deliver = deliver
+        self.pool = pool or _pool
+        self._pending = deque()  # (index, text, future)
+        self._submitted = 0
+        self._lock = threading.RLock()
+
+    def submit(self, text):
+        context = contextvars.copy_context()  # deadline and trace follow the piece into the pool
+        future = self.pool.submit(context.run, _synthesize_piece, self.synthesize, text, self.language)
+        with self._lock:
+            self._pending.append((self._submitted, text, future))
+            self._submitted += 1
+        future.add_done_callback(lambda _: self._deliver_ready())
+
+    def _deliver_ready(self):
+        with self._lock:
+            while self._pending and self._pending[0][2].done():
+                self.deliver(*self._result(self._pending.popleft()))
+
+    def wait(self):
+        """Block until every submitted clip has been delivered."""
+        with self._lock:
+            futures = [future for _, _, future in self._pending]
+        wait(futures)
+        self._deliver_ready()
+
+    def cancel(self):
+        """Drop the clips nobody will hear; pieces not started yet are never synthesized."""
+        with self._lock:
+            entries = list(self._pending)
+            self._pending.clear()
+        for _, _, future in entries:
+            future.cancel()
+
+    @staticmethod
+    def _result(entry):
+        index, text, future = entry
+        try:
+            return index, text, future.result()
+        except Exception as e:
+            logging.warning(f"Speech synthesis failed for piece {index}: {e}")
+            return index, text, None  # the text is still delivered, just without audio
+
+
+@timed("tts_sentence")
+def _synthesize_piece(synthesize, text, language):
+    return synthesize(text, language)
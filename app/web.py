@@ -1,45 +1,174 @@
 # app/web.py
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
 import requests
 import logging
+from requests.adapters import HTTPAdapter
+
+from app.config import (
+    SERPER_CONNECT_TIMEOUT, SERPER_READ_TIMEOUT, SERPER_CACHE_TTL_SECONDS,
+    SERPER_STALE_TTL_SECONDS, SERPER_CACHE_MAX_ENTRIES
+)
+from app.resilience import call_with_resilience, raise_for_retryable_status, CircuitOpenError
+from app.singleflight import SingleFlight
+from app.metrics import stage_timer
+from app.tracing import span
 
 SERPER_API_KEY = os.getenv("SERPER_API_KEY")
+SERPER_URL = "https://google.serper.dev/search"
 
 if not SERPER_API_KEY:
     logging.warning("SERPER_API_KEY not set. SerperAPI searches will fail.")
 
 
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and trim trailing punctuation so trivially different queries share a cache entry."""
+    return re.sub(r"\s+", " ", query.lower()).strip(" ?!.,;:")
+
+
+class SearchCache:
+    """LRU cache of organic results with a fresh TTL and a longer stale window for stale-while-revalidate."""
+
+    def __init__(self, ttl_seconds=SERPER_CACHE_TTL_SECONDS, stale_seconds=SERPER_STALE_TTL_SECONDS,
+                 max_entries=SERPER_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (results, is_fresh), or (None, False) when missing or too old to serve."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            stored_at, results = entry
+            age = time.monotonic() - stored_at
+            if age > self.stale_seconds:
+                del self._entries[key]
+                return None, False
+            self._entries.move_to_end(key)
+            return results, age <= self.ttl_seconds
+
+    def put(self, key, results):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SerperClient:
+    """
+    Serper search over a keep-alive connection pool, with a TTL cache, single-flight coalescing of
+    identical concurrent searches, and stale results served while Serper is slow or failing.
+    """
+
+    def __init__(self, api_key=SERPER_API_KEY, url=SERPER_URL, cache=None, pool_size=10):
+        self.api_key = api_key
+        self.url = url
+        self.cache = cache if cache is not None else SearchCache()
+        self.single_flight = SingleFlight()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "upstream_calls": 0, "errors": 0}
+
+    def search(self, query: str, site_constraint: str = None):
+        with span("web_search", site_constraint=site_constraint or "") as current:
+            result, outcome = self._search(query, site_constraint)
+            current.set("cache", outcome)
+            current.set("results", len(result.get("organic", [])))
+            return result
+
+    def _search(self, query, site_constraint):
+        """Returns (response, cache outcome)."""
+        if not self.api_key:
+            logging.error("SERPER_API_KEY is not configured. Cannot perform web search.")
+            # Return a structure consistent with successful calls but indicating no results due to config error
+            return {"error": "Serper API key not configured.", "organic": []}, "not_configured"
+
+        key = (normalize_query(query), site_constraint or "")
+        results, is_fresh = self.cache.get(key)
+        if results is not None:
+            if is_fresh:
+                self.stats["hits"] += 1
+                return {"organic": results}, "hit"
+            # Serve stale immediately and refresh once in the background
+            self.stats["stale_hits"] += 1
+            if not self.single_flight.in_flight(key):
+                threading.Thread(target=self._refresh, args=(key, query, site_constraint), daemon=True).start()
+            return {"organic": results}, "stale"
+
+        self.stats["misses"] += 1
+        try:
+            results, shared = self.single_flight.do(key, self._fetch, key, query, site_constraint)
+        except CircuitOpenError as e:
+            logging.warning(f"SerperAPI unavailable: {e}")
+            return {"error": str(e), "organic": []}, "error"
+        except requests.exceptions.RequestException as e:
+            logging.error(f"SerperAPI request failed: {e}")
+            return {"error": str(e), "organic": []}, "error"  # Ensure "organic" key for consistent error handling
+        except Exception as e:
+            logging.error(f"Error processing SerperAPI response: {e}")
+            return {"error": str(e), "organic": []}, "error"
+        if shared:
+            self.stats["coalesced"] += 1
+            return {"organic": results}, "coalesced"
+        return {"organic": results}, "miss"
+
+    def _refresh(self, key, query, site_constraint):
+        try:
+            self.single_flight.do(key, self._fetch, key, query, site_constraint)
+        except Exception as e:
+            logging.warning(f"Background SerperAPI refresh failed, keeping stale results: {e}")
+
+    def _fetch(self, key, query, site_constraint):
+        actual_search_query = query
+        if site_constraint:
+            actual_search_query = f"{query} {site_constraint}"
+
+        # Request more results to get a broader context, will pick top 5 relevant ones later
+        payload = {"q": actual_search_query, "num": 7}
+        headers = {
+            "X-API-KEY": self.api_key,
+            "Content-Type": "application/json"
+        }
+        logging.info(f"SerperAPI search query: {actual_search_query}")
+
+        def post(timeout):
+            self.stats["upstream_calls"] += 1
+            response = self.session.post(self.url, headers=headers, json=payload,
+                                         timeout=(min(SERPER_CONNECT_TIMEOUT, timeout), min(SERPER_READ_TIMEOUT, timeout)))
+            return raise_for_retryable_status(response)
+
+        try:
+            with stage_timer("serper"):
+                response = call_with_resilience("serper", post)
+            response.raise_for_status()  # Raise an exception for remaining HTTP errors
+            results = response.json().get("organic", [])
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        self.cache.put(key, results)
+        return results
+
+
+serper_client = SerperClient()
+
+
 def search_web(query: str, site_constraint: str = None):
     """
     Performs a web search using Serper API.
     Optionally adds site constraints to the query (e.g., "site:mckinsey.com OR site:gartner.com").
     """
-    if not SERPER_API_KEY:
-        logging.error("SERPER_API_KEY is not configured. Cannot perform web search.")
-        # Return a structure consistent with successful calls but indicating no results due to config error
-        return {"error": "Serper API key not configured.", "organic": []}
-
-    url = "https://google.serper.dev/search"
-    headers = {
-        "X-API-KEY": SERPER_API_KEY,
-        "Content-Type": "application/json"
-    }
-
-    actual_search_query = query
-    if site_constraint:
-        actual_search_query = f"{query} {site_constraint}"
-
-    # Request more results to get a broader context, will pick top 5 relevant ones later
-    payload = {"q": actual_search_query, "num": 7}
-    logging.info(f"SerperAPI search query: {actual_search_query}")
-
-    try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logging.error(f"SerperAPI request failed: {e}")
-        return {"error": str(e), "organic": []}  # Ensure "organic" key for consistent error handling
-    except Exception as e:
-        logging.error(f"Error processing SerperAPI response: {e}")
-        return {"error": str(e), "organic": []}
\ No newline at end of file
+    return serper_client.search(query, site_constraint)
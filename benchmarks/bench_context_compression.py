@@ -0,0 +1,64 @@
+# benchmarks/bench_context_compression.py
+"""
+Prompt tokens sent for retrieved context, and the CPU cost of compressing it, for the RAG path
+(before: first 50 words of each hit) and the IT Trends path (before: full Serper snippets).
+
+Run from the project root (needs the same .env as the app):
+    python -m benchmarks.bench_context_compression
+"""
+import time
+
+from app.config import RAG_SOURCE_TOKEN_BUDGET, WEB_SOURCE_TOKEN_BUDGET
+from app.context_budget import count_tokens
+from app.context_compression import compress_sources
+
+QUERY = "Which cloud and data services does Bravur offer to healthcare companies?"
+
+DOCUMENTS = [
+    "Bravur was founded in 2015 by a group of engineers from Utrecht. Over the years the company grew to "
+    "more than forty consultants. We value craftsmanship and honest advice. For healthcare organisations "
+    "Bravur delivers cloud migrations to Azure and AWS, with attention to NEN 7510 compliance. Our data "
+    "engineers build pipelines and dashboards that turn patient-flow data into planning insights. "
+    "Every project starts with a free intake session.",
+    "Our team works from offices in Utrecht and Eindhoven. Friday afternoons are reserved for knowledge "
+    "sharing. Bravur supports clients with managed cloud services, including monitoring, cost optimisation "
+    "and security reviews. We also offer training in Terraform and Kubernetes.",
+    "Bravur has partnerships with Microsoft and Google Cloud. Case study: a regional hospital moved its "
+    "scheduling system to the cloud in three months, cutting outage time by 80 percent. The data platform "
+    "we built now feeds weekly capacity reports.",
+]
+
+SNIPPETS = [
+    "Cloud adoption in healthcare accelerated in 2024 as hospitals moved EHR workloads to hybrid platforms; "
+    "Gartner expects 70% of providers to run core systems in the cloud by 2027.",
+    "McKinsey's technology trends outlook names applied AI and cloud-edge computing among the top trends. "
+    "Investment fell slightly in 2023 but adoption kept rising.",
+    "Data services and analytics are the fastest-growing IT budget line for European healthcare organisations, "
+    "according to a 2024 IDC survey of 400 CIOs.",
+]
+
+
+def first_fifty_words(texts):
+    return [" ".join(t.split()[:50]) + "..." for t in texts]
+
+
+def tokens(texts):
+    return sum(count_tokens(t, "gpt-4o-mini") for t in texts)
+
+
+def bench(rounds=500):
+    started = time.process_time()
+    for _ in range(rounds):
+        compress_sources(QUERY, DOCUMENTS, RAG_SOURCE_TOKEN_BUDGET, "gpt-4o-mini")
+        compress_sources(QUERY, SNIPPETS, WEB_SOURCE_TOKEN_BUDGET, "gpt-4o-mini")
+    return (time.process_time() - started) / rounds
+
+
+if __name__ == "__main__":
+    rag_after = compress_sources(QUERY, DOCUMENTS, RAG_SOURCE_TOKEN_BUDGET, "gpt-4o-mini")
+    web_after = compress_sources(QUERY, SNIPPETS, WEB_SOURCE_TOKEN_BUDGET, "gpt-4o-mini")
+    print(f"RAG context tokens:  {tokens(first_fifty_words(DOCUMENTS)):4d} -> {tokens(rag_after):4d}")
+    print(f"web context tokens:  {tokens(SNIPPETS):4d} -> {tokens(web_after):4d}")
+    print(f"compression CPU per turn (both paths): {bench() * 1e6:8.1f} µs")
+    for text in rag_after:
+        print(f"  - {text}")
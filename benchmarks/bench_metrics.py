@@ -0,0 +1,40 @@
+# benchmarks/bench_metrics.py
+"""
+Hot-path overhead of the per-stage Prometheus instrumentation.
+
+Run from the project root:
+    python -m benchmarks.bench_metrics
+"""
+import time
+
+from app.metrics import start_turn, stage_timer, observe_llm
+
+ITERATIONS = 100_000
+
+
+def main():
+    start_turn("en-US", "Company Info")
+
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        pass
+    baseline = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        with stage_timer("bench"):
+            pass
+    timed_block = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        observe_llm("groq", "bench", "ttft", 0.1)
+    llm_observation = time.perf_counter() - started
+
+    print(f"stage_timer block:   {(timed_block - baseline) / ITERATIONS * 1e6:.2f} µs per stage")
+    print(f"LLM latency sample:  {llm_observation / ITERATIONS * 1e6:.2f} µs per observation")
+    print("A turn records ~10 stages, so instrumentation costs well under 0.1 ms of a multi-second turn.")
+
+
+if __name__ == "__main__":
+    main()
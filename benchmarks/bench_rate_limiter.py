@@ -0,0 +1,82 @@
+# benchmarks/bench_rate_limiter.py
+"""
+Redis commands and latency per rate-limited chat request: the previous INCR/EXPIRE/HGET/TTL sequence
+plus the status re-reads, against the single Lua script call; and the local IP tier under a flood.
+
+Needs a reachable Redis (the REDIS_* settings). Run from the project root:
+    python -m benchmarks.bench_rate_limiter
+"""
+import time
+import uuid
+
+from app.rate_limiter import (
+    r, check_rate_limit, LocalTokenBucketTier, SESSION_MAX_REQUESTS, SESSION_WINDOW_SECONDS
+)
+
+ITERATIONS = 2_000
+
+
+def legacy_session_check(session_id):
+    """The session check as it was: the limiter's own calls, then the controller's status and log reads."""
+    key = f"rate_limit:session:{session_id}"
+    count = r.incr(key)
+    if count == 1:
+        r.expire(key, SESSION_WINDOW_SECONDS)
+    limit = int(r.hget(f"rate_limit:meta:{session_id}", "limit") or SESSION_MAX_REQUESTS)
+    if count > limit:
+        r.ttl(key)
+    r.hget(f"rate_limit:meta:{session_id}", "limit")  # get_session_rate_status
+    r.get(key)
+    r.get(key)  # the "has made N requests" log line
+
+
+class CommandCounter:
+    def __init__(self):
+        self.commands = 0
+        self._execute = r.execute_command
+
+    def __enter__(self):
+        def counted(*args, **kwargs):
+            self.commands += 1
+            return self._execute(*args, **kwargs)
+        r.execute_command = counted
+        return self
+
+    def __exit__(self, *exc):
+        del r.execute_command
+
+
+def measure(label, check):
+    session_id = f"bench-{uuid.uuid4().hex}"
+    r.hset(f"rate_limit:meta:{session_id}", mapping={"limit": ITERATIONS * 2})
+    check(session_id)  # warm-up (loads the script)
+    with CommandCounter() as counter:
+        started = time.perf_counter()
+        for _ in range(ITERATIONS):
+            check(session_id)
+        elapsed = time.perf_counter() - started
+    r.delete(f"rate_limit:meta:{session_id}", f"rate_limit:session:{session_id}")
+    print(f"{label:<14} {counter.commands / ITERATIONS:.1f} Redis calls, "
+          f"{elapsed / ITERATIONS * 1e6:.0f} µs per request")
+
+
+def measure_flood():
+    """An IP flooding one worker: after its local share is used up, rejections never reach Redis."""
+    tier = LocalTokenBucketTier(limit=1000, window_seconds=60, share=0.25, sync_seconds=3600)
+    with CommandCounter() as counter:
+        started = time.perf_counter()
+        for _ in range(ITERATIONS * 10):
+            tier.check("203.0.113.7")
+        elapsed = time.perf_counter() - started
+    print(f"{'IP flood:':<14} {counter.commands / (ITERATIONS * 10):.1f} Redis calls, "
+          f"{elapsed / (ITERATIONS * 10) * 1e6:.1f} µs per request ({tier.stats['rejected_locally']} rejected locally)")
+
+
+def main():
+    measure("before:", legacy_session_check)
+    measure("Lua script:", lambda session_id: check_rate_limit("session", session_id))
+    measure_flood()
+
+
+if __name__ == "__main__":
+    main()
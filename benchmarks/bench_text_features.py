@@ -0,0 +1,79 @@
+# benchmarks/bench_text_features.py
+"""
+CPU cost per chat turn of keyword/fuzzy matching, before and after the compiled TextMatcher.
+
+Run from the project root (needs the same .env as the app):
+    python -m benchmarks.bench_text_features
+"""
+import time
+
+from fuzzywuzzy import fuzz as legacy_fuzz
+
+from app.chatbot import (
+    text_matcher, has_strong_contextual_cues, is_gratitude_expression, detect_mood,
+    MEMORY_PROMPTS_KEYWORDS, LAST_QUESTION_PROMPTS, LAST_ANSWER_PROMPTS, SUMMARIZE_PROMPTS,
+    STRONG_CONTEXTUAL_PHRASES, GRATITUDE_QUESTION_PHRASES, GRATITUDE_EXAMPLES, ANGRY_KEYWORDS, HAPPY_KEYWORDS
+)
+
+SAMPLE_INPUTS = [
+    "What services does Bravur offer?",
+    "Tell me more about that",
+    "What was my last question?",
+    "Can you summarize our talk",
+    "Thanks a lot, that was really helpful!",
+    "What are the latest AI trends according to McKinsey and Gartner?",
+    "Wat zijn de nieuwste trends in cloud computing voor het MKB?",
+    "This is useless, I hate this bot 😡",
+    "ok",
+    "Where is Bravur located and which industries do you serve? 🚀✨",
+]
+
+
+def legacy_turn(user_input):
+    """The matching work one turn did before: repeated per-branch fuzz loops and substring scans."""
+    text = user_input.lower().strip()
+    lower = user_input.lower()
+    # is_gratitude_expression
+    if not (text.endswith("?") or any(p in text for p in GRATITUDE_QUESTION_PHRASES)):
+        any(legacy_fuzz.partial_ratio(text, e) > 85 for e in GRATITUDE_EXAMPLES)
+    # detect_mood (initial_classify_intent + handler)
+    for _ in range(2):
+        any(w in lower for w in ANGRY_KEYWORDS) or any(w in lower for w in HAPPY_KEYWORDS)
+    # has_strong_contextual_cues (condition + log line)
+    for _ in range(2):
+        any(legacy_fuzz.partial_ratio(lower, p) > 85 for p in MEMORY_PROMPTS_KEYWORDS) or \
+            any(p in lower for p in STRONG_CONTEXTUAL_PHRASES)
+    # handler memory check + resolve_contextual_query sub-lists
+    any(legacy_fuzz.partial_ratio(lower, p) > 80 for p in MEMORY_PROMPTS_KEYWORDS)
+    any(legacy_fuzz.partial_ratio(lower, p) > 80 for p in MEMORY_PROMPTS_KEYWORDS)
+    for group in (LAST_QUESTION_PROMPTS, LAST_ANSWER_PROMPTS, SUMMARIZE_PROMPTS):
+        any(legacy_fuzz.partial_ratio(lower, p) > 80 for p in group)
+
+
+def compiled_turn(user_input):
+    """The same decisions, all read from one TextFeatures computed per turn."""
+    features = text_matcher.analyze(user_input)
+    is_gratitude_expression(user_input, features)
+    detect_mood(user_input, features)
+    has_strong_contextual_cues(user_input, features)
+    features.fuzzy_match("memory", 80)
+    for group in ("last_question", "last_answer", "summarize"):
+        features.fuzzy_match(group, 80)
+
+
+def bench(fn, rounds):
+    started = time.process_time()
+    for _ in range(rounds):
+        for user_input in SAMPLE_INPUTS:
+            fn(user_input)
+    return (time.process_time() - started) / (rounds * len(SAMPLE_INPUTS))
+
+
+if __name__ == "__main__":
+    rounds = 200
+    before = bench(legacy_turn, rounds)
+    after = bench(compiled_turn, rounds)
+    print(f"turns measured:  {rounds * len(SAMPLE_INPUTS)}")
+    print(f"before (per turn): {before * 1e6:9.1f} µs CPU")
+    print(f"after  (per turn): {after * 1e6:9.1f} µs CPU")
+    print(f"speedup:           {before / after:9.1f}x")
@@ -604,6 +604,9 @@ async function processWAVRecording(wavBlob) {
         formData.append('audio', wavBlob, 'voice_input.wav');
         formData.append('session_id', currentSessionId);
         formData.append('language', selectedLanguage);
+        // Ask for compressed audio behind a short-lived URL instead of base64 inside the JSON
+        formData.append('response_format', 'url');
+        formData.append('audio_format', 'mp3');
 
         console.log("Sending WAV data to server...");
         console.log(`File: voice_input.wav, Size: ${wavBlob.size}, Language: ${selectedLanguage}`);
@@ -667,34 +670,44 @@ async function processWAVRecording(wavBlob) {
                     currentAudio.currentTime = 0;
                 }
 
-                if (data.audio_base64) {
-                    const audioBytes = Uint8Array.from(atob(data.audio_base64), c => c.charCodeAt(0));
-                    const audioResponseBlob = new Blob([audioBytes], { type: "audio/wav" });
-                    const audioUrl = URL.createObjectURL(audioResponseBlob);
-                    currentAudio = new Audio(audioUrl);
-                    currentAudio.play();
+                // Replay from the reply's audio URL; once it has expired, synthesize the text again
+                const replayFromTts = () => {
+                    fetch("/api/v1/tts", {
+                        method: "POST",
+                        headers: {
+                            "Content-Type": "application/json",
+                        },
+                        body: JSON.stringify({ text: botMsg.textContent, language: selectedLanguage }),
+                    })
+                        .then(res => res.blob())
+                        .then(blob => {
+                            const audioUrl = URL.createObjectURL(blob);
+                            currentAudio = new Audio(audioUrl);
+                            currentAudio.play();
+                            currentAudio.onended = function () {
+                                URL.revokeObjectURL(audioUrl); // Free up memory
+                            };
+                        })
+                        .catch(err => console.error("TTS error:", err));
+                };
 
-                    currentAudio.onended = function() {
-                        URL.revokeObjectURL(audioUrl);
-                    };
+                if (!data.audio_url) {
+                    replayFromTts();
+                    return;
                 }
+                currentAudio = new Audio(data.audio_url);
+                currentAudio.onerror = replayFromTts;
+                currentAudio.play().catch(() => {});  // a failed load is handled by onerror
             };
 
             container.appendChild(botMsg);
             container.appendChild(speakButton);
             chatBox.appendChild(container);
 
-            // Auto-play response
-            if (data.audio_base64) {
-                const audioBytes = Uint8Array.from(atob(data.audio_base64), c => c.charCodeAt(0));
-                const audioResponseBlob = new Blob([audioBytes], { type: "audio/wav" });
-                const audioUrl = URL.createObjectURL(audioResponseBlob);
-                currentAudio = new Audio(audioUrl);
+            // Auto-play response (the browser streams it from the URL with range requests)
+            if (data.audio_url) {
+                currentAudio = new Audio(data.audio_url);
                 currentAudio.play();
-
-                currentAudio.onended = function() {
-                    URL.revokeObjectURL(audioUrl);
-                };
             }
         }
 
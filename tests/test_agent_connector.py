@@ -0,0 +1,96 @@
+# tests/test_agent_connector.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.agentConnector import AgentConnector, AgentTimeoutError, AgentBusyError, AgentNotFoundError
+
+
+def streaming_agent(user_input, session_id=None, language="en-US"):
+    for word in ["hello ", "from ", "stream"]:
+        yield word
+
+
+def slow_agent(user_input, session_id=None):
+    time.sleep(1.0)
+    return "slow answer"
+
+
+async def async_agent(user_input, session_id=None):
+    await asyncio.sleep(0.05)
+    return f"async: {user_input}"
+
+
+async def async_streaming_agent(user_input, session_id=None):
+    for word in ["a", "b", "c"]:
+        await asyncio.sleep(0.01)
+        yield word
+
+
+def failing_agent(user_input, session_id=None):
+    raise RuntimeError("agent broke")
+
+
+@pytest.fixture
+def connector():
+    connector = AgentConnector(max_workers=8)
+    connector.register_agent("stream", streaming_agent)
+    connector.register_agent("slow", slow_agent, timeout=0.2)
+    connector.register_agent("async", async_agent)
+    connector.register_agent("async_stream", async_streaming_agent)
+    connector.register_agent("failing", failing_agent)
+    return connector
+
+
+def test_runs_sync_streaming_and_async_agents(connector):
+    assert list(connector.stream("stream", "hi", language="nl-NL")) == ["hello ", "from ", "stream"]
+    assert connector.run("stream", "hi").output == "hello from stream"
+    assert connector.run("async", "hi").output == "async: hi"
+    assert connector.run("async_stream", "hi").output == "abc"
+    assert connector.process_request("async", "hi") == "async: hi"
+    assert connector.process_request("missing", "hi") == "Agent not found"
+    with pytest.raises(AgentNotFoundError):
+        connector.run("missing", "hi")
+
+
+def test_per_agent_deadline(connector):
+    with pytest.raises(AgentTimeoutError):
+        list(connector.stream("slow", "hi"))
+    result = connector.run("slow", "hi")
+    assert isinstance(result.error, AgentTimeoutError)
+    assert connector.stats()["slow"]["timeouts"] == 2
+
+
+def test_fan_out_first_result_does_not_wait_for_slow_agents(connector):
+    connector.register_agent("slow", slow_agent, timeout=5)
+    started = time.monotonic()
+    result = connector.fan_out(["slow", "failing", "async"], "hi", policy="first")
+    assert result.agent == "async" and result.output == "async: hi"
+    assert time.monotonic() - started < 0.5
+
+
+def test_fan_out_merge_runs_agents_concurrently(connector):
+    connector.register_agent("slow_a", lambda text, session_id=None: time.sleep(0.3) or "A", timeout=2)
+    connector.register_agent("slow_b", lambda text, session_id=None: time.sleep(0.3) or "B", timeout=2)
+    started = time.monotonic()
+    result = connector.fan_out(["slow_a", "slow_b", "failing"], "hi", policy="merge")
+    assert time.monotonic() - started < 0.55  # not 0.6s of serial latency
+    assert result.output == "A\n\nB"
+    assert [part.ok for part in result.parts] == [True, True, False]
+
+
+def test_concurrency_limit_rejects_when_full():
+    release = threading.Event()
+    connector = AgentConnector(max_workers=4)
+    connector.register_agent("single", lambda text, session_id=None: release.wait(2) and "done", max_concurrency=1)
+
+    first = threading.Thread(target=connector.run, args=("single", "one"))
+    first.start()
+    time.sleep(0.05)
+    with pytest.raises(AgentBusyError):
+        list(connector.stream("single", "two", timeout=0.1))
+    release.set()
+    first.join()
+    assert connector.stats()["single"]["rejected"] == 1
@@ -0,0 +1,83 @@
+# tests/test_azure_speech.py
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.speech import AzureTokenCache, azure_authorized_post
+
+
+class MockAzureServer:
+    """Local token endpoint plus a speech endpoint that only accepts the newest token."""
+
+    def __init__(self):
+        self.tokens_issued = 0
+        self.speech_requests = []
+        self.connections = set()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                server.connections.add(self.client_address)
+                if self.path == "/issueToken":
+                    server.tokens_issued += 1
+                    status, body = 200, f"token-{server.tokens_issued}"
+                else:
+                    server.speech_requests.append(self.headers["Authorization"])
+                    valid = self.headers["Authorization"] == f"Bearer token-{server.tokens_issued}"
+                    status, body = (200, "audio") if valid else (401, "expired")
+                data = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+@pytest.fixture
+def azure():
+    server = MockAzureServer()
+    yield server
+    server.stop()
+
+
+def test_token_is_fetched_once_and_connections_are_reused(azure):
+    tokens = AzureTokenCache(f"{azure.url}/issueToken", "key")
+    for _ in range(5):
+        response = azure_authorized_post("azure_tts", f"{azure.url}/tts", headers={}, tokens=tokens, data=b"x")
+        assert response.status_code == 200
+    assert azure.tokens_issued == 1 and tokens.fetches == 1
+    assert len(azure.connections) == 1  # one keep-alive connection for the whole host
+
+
+def test_token_is_refreshed_in_the_background_before_it_expires(azure):
+    tokens = AzureTokenCache(f"{azure.url}/issueToken", "key", lifetime=60, refresh_after=0.05)
+    assert tokens.get() == "token-1"
+    time.sleep(0.06)
+    assert tokens.get() == "token-1"  # still valid, served without waiting while the refresh runs
+    deadline = time.monotonic() + 2
+    while tokens.fetches < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert tokens.get() == "token-2"
+
+
+def test_401_is_retried_once_with_a_fresh_token(azure):
+    tokens = AzureTokenCache(f"{azure.url}/issueToken", "key")
+    tokens.get()
+    azure.tokens_issued += 1  # the service rotated its token behind our back
+    response = azure_authorized_post("azure_stt", f"{azure.url}/stt", headers={}, tokens=tokens, data=b"x")
+    assert response.status_code == 200
+    assert azure.speech_requests == ["Bearer token-1", "Bearer token-3"]
@@ -0,0 +1,52 @@
+# tests/test_bm25_index.py
+from app.bm25_index import BM25Index, analyze
+
+ROWS = [
+    (1, "Cloud services", "Bravur helps companies migrate their applications to Azure and AWS."),
+    (2, "Over ons", "Bravur is een IT-bedrijf uit Utrecht. Wij bouwen maatwerksoftware en datadiensten."),
+    (3, "Careers", "We are hiring developers who enjoy working on data engineering projects."),
+    (4, "Contact", "Call us or send an email to get in touch with our team."),
+]
+
+
+def build():
+    index = BM25Index()
+    for row in ROWS:
+        index.upsert(*row)
+    return index
+
+
+def test_english_and_dutch_analyzers_stem_and_drop_stopwords():
+    assert analyze("Which companies offer cloud services?") == ["company", "offer", "cloud", "servic"]
+    assert analyze("the company offers a service") == analyze("companies offering services")
+    assert analyze("Wij bouwen de diensten", "nl") == ["bouw", "dienst"]
+
+
+def test_search_ranks_matching_documents_in_either_language():
+    index = build()
+    assert [row[0] for row in index.search("migrate to the cloud", top_k=2)][0] == 1
+    assert index.search("Waar zit het bedrijf? Utrecht?", language="nl-NL")[0][:2] == (2, "Over ons")
+    assert index.search("quantum blockchain") == []
+
+
+def test_updates_and_deletes_are_applied_incrementally():
+    index = build()
+    index.upsert(4, "Contact", "Our Utrecht office welcomes visitors.")
+    assert {row[0] for row in index.search("utrecht")} == {2, 4}
+    assert not index.search("email")
+
+    index.sync([(5, "Security", "Penetration testing and security audits.")], live_ids=[1, 2, 3, 5])
+    assert 4 not in index and len(index) == 4
+    assert index.search("security audit")[0][0] == 5
+
+    for n in range(40):  # enough churn to trigger compaction
+        index.upsert(5, "Security", f"Security audits round {n}.")
+    assert len(index._entry_ids) < 40 and index.search("security")[0][0] == 5
+
+
+def test_rerank_promotes_vector_hits_that_also_match_lexically():
+    index = build()
+    vector_rows = [(4, "Contact", "...", 0.21), (3, "Careers", "...", 0.22), (1, "Cloud services", "...", 0.23)]
+    reranked = index.rerank("cloud migration services", vector_rows, top_k=2)
+    assert reranked[0] == vector_rows[2]
+    assert len(reranked) == 2 and reranked[1] == vector_rows[0]
@@ -0,0 +1,81 @@
+# tests/test_cancellation.py
+import contextvars
+import threading
+import time
+
+import pytest
+
+from app.metrics import CANCELLED_TOKENS_SAVED
+from app.resilience import RequestCancelledError, bind_cancellation, call_with_resilience
+from app.singleflight import SingleFlight
+from app.sse import EventStream
+from tests.test_llm_providers import MockLLMServer, make_gateway
+
+
+def test_closing_a_gateway_stream_closes_upstream_and_counts_saved_tokens():
+    groq_server, openai_server = MockLLMServer(reply="one two three four five"), MockLLMServer()
+    try:
+        gateway = make_gateway(groq_server, openai_server)
+        before = CANCELLED_TOKENS_SAVED.labels("groq", "llama-3.3-70b-versatile")._value.get()
+        chunks = gateway.stream("rag", [{"role": "user", "content": "hi"}], max_tokens=300)
+        assert next(chunks).strip() == "one"
+        chunks.close()
+        saved = CANCELLED_TOKENS_SAVED.labels("groq", "llama-3.3-70b-versatile")._value.get() - before
+        assert 290 <= saved < 300
+    finally:
+        groq_server.stop()
+        openai_server.stop()
+
+
+def test_cancelled_context_skips_outbound_calls_and_retries():
+    calls = []
+
+    def flaky(timeout):
+        calls.append(1)
+        cancelled.set()  # the client leaves while the first attempt is running
+        raise ConnectionError("upstream reset")
+
+    def run():
+        bind_cancellation(cancelled)
+        with pytest.raises(ConnectionError):
+            call_with_resilience("cancel-test", flaky, retries=3)
+        with pytest.raises(RequestCancelledError):
+            call_with_resilience("cancel-test", lambda timeout: calls.append(1))
+
+    cancelled = threading.Event()
+    contextvars.copy_context().run(run)
+    assert calls == [1]
+
+
+def test_singleflight_stops_the_source_when_every_subscriber_leaves():
+    flights, closed = SingleFlight(), threading.Event()
+
+    def endless():
+        try:
+            while True:
+                time.sleep(0.01)
+                yield "token "
+        finally:
+            closed.set()
+
+    first, _ = flights.stream("key", endless)
+    second, shared = flights.stream("key", endless)
+    assert shared
+    next(first), next(second)
+    first.close()
+    assert not closed.wait(0.1)  # one subscriber is still listening
+    second.close()
+    assert closed.wait(1)
+    assert not flights.in_flight("key")
+
+
+def test_event_stream_is_abandoned_only_after_the_grace_period():
+    stream = EventStream()
+    follower = stream.follow(heartbeat=0.01)
+    stream.publish("status", {"stage": "started"})
+    next(follower)
+    assert not stream.abandoned(0.05)
+    follower.close()
+    assert not stream.abandoned(0.05)
+    time.sleep(0.06)
+    assert stream.abandoned(0.05)
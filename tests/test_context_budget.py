@@ -0,0 +1,78 @@
+# tests/test_context_budget.py
+import app.context_budget as context_budget
+from app.context_budget import (
+    count_tokens, count_message_tokens, pack_messages, history_budget, MESSAGE_OVERHEAD_TOKENS
+)
+
+
+def make_messages(*contents):
+    return [{"id": i + 1, "role": "user" if i % 2 == 0 else "assistant", "content": c}
+            for i, c in enumerate(contents)]
+
+
+def test_count_tokens_is_not_word_based_for_emoji_and_dutch():
+    assert count_tokens("") == 0
+    assert count_tokens("😊🚀✨") >= 3
+    assert count_tokens("arbeidsongeschiktheidsverzekering") > 1
+
+
+def test_pack_messages_keeps_newest_within_exact_budget():
+    messages = make_messages("first question", "first answer", "second question", "second answer")
+    costs = [MESSAGE_OVERHEAD_TOKENS + count_tokens(m["content"]) for m in messages]
+    budget = costs[-1] + costs[-2]
+
+    selected, dropped = pack_messages(messages, budget)
+
+    assert [m["id"] for m in selected] == [3, 4]
+    assert [m["id"] for m in dropped] == [1, 2]
+    assert count_message_tokens(selected) - context_budget.REPLY_PRIMING_TOKENS <= budget
+
+
+def test_history_budget_respects_cap_and_model_limit():
+    assert history_budget("gpt-4o-mini", cap=400) == 400
+    assert history_budget("unknown-model", max_output_tokens=10000, cap=400) == 0
+
+
+def test_recent_conversation_fits_what_the_model_context_leaves(monkeypatch):
+    import app.chatbot as chatbot
+
+    rows = [(i + 1, f"message number {i}", None, "user" if i % 2 == 0 else "bot") for i in range(6)]
+    monkeypatch.setattr(chatbot, "get_session_messages", lambda session_id: rows)
+    monkeypatch.setattr(chatbot, "get_session_summary", lambda session_id: (None, 6))
+    newest = MESSAGE_OVERHEAD_TOKENS + count_tokens("message number 5")
+    fixed = [{"role": "user", "content": "What did I ask?"}]
+    monkeypatch.setitem(context_budget.MODEL_CONTEXT_LIMITS, "tiny-model",
+                        count_message_tokens(fixed, "tiny-model") + newest)
+
+    recent = chatbot.get_recent_conversation("session-1", model="tiny-model", fixed_messages=fixed)
+    assert recent == [{"role": "assistant", "content": "message number 5"}]
+
+
+def test_update_session_summary_folds_only_new_turns(monkeypatch):
+    stored = {"summary": "User asked about Bravur.", "last_id": 2}
+    folded_batches = []
+
+    monkeypatch.setattr(context_budget, "get_session_summary",
+                        lambda session_id: (stored["summary"], stored["last_id"]))
+
+    def fake_upsert(session_id, summary, last_message_id):
+        stored.update(summary=summary, last_id=last_message_id)
+        return True
+
+    def fake_fold(summary, turns, language, stage):
+        folded_batches.append(([t["id"] for t in turns], stage))
+        return f"{summary} +{len(turns)}"
+
+    monkeypatch.setattr(context_budget, "upsert_session_summary", fake_upsert)
+    monkeypatch.setattr(context_budget, "_fold_into_summary", fake_fold)
+
+    messages = make_messages("q1", "a1", "q2", "a2", "q3")
+    summary = context_budget.update_session_summary("abc", messages=messages, stage="summarize_reply")
+
+    assert folded_batches == [([3, 4, 5], "summarize_reply")]
+    assert stored["last_id"] == 5
+    assert summary == "User asked about Bravur. +3"
+
+    # Nothing new: answered straight from the stored summary
+    assert context_budget.update_session_summary("abc", messages=messages) == summary
+    assert len(folded_batches) == 1
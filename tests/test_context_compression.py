@@ -0,0 +1,43 @@
+# tests/test_context_compression.py
+from app.context_budget import count_tokens
+from app.context_compression import compress_sources, split_sentences
+
+DOCUMENT = (
+    "Bravur is an IT consultancy founded in Utrecht. "
+    "The team enjoys a Friday lunch together every week. "
+    "Bravur offers cloud migration, custom software development and data engineering services. "
+    "Our office has a view of the canal.\n"
+    "Contact us through the website for a free intake."
+)
+
+
+def test_keeps_sentences_that_answer_the_query_within_budget():
+    budget = 30
+    [compressed] = compress_sources("Which services does Bravur offer?", [DOCUMENT], budget)
+    assert "cloud migration" in compressed
+    assert "Friday lunch" not in compressed and "canal" not in compressed
+    assert count_tokens(compressed) <= budget
+
+
+def test_selected_sentences_keep_document_order():
+    [compressed] = compress_sources("Where was Bravur founded and which services does it offer?", [DOCUMENT], 60)
+    assert compressed.index("Utrecht") < compressed.index("cloud migration")
+
+
+def test_one_result_per_source_and_long_sentences_are_truncated():
+    long_sentence = " ".join(["kubernetes"] * 200)
+    results = compress_sources("kubernetes trends", [long_sentence, "", DOCUMENT], 20)
+    assert len(results) == 3
+    assert results[0].endswith("...") and count_tokens(results[0]) <= 20
+    assert results[1] == ""
+    assert split_sentences("One. Two!\n- three") == ["One.", "Two!", "- three"]
+
+
+def test_disabled_compression_keeps_web_snippets_whole(monkeypatch):
+    import app.chatbot as chatbot
+
+    monkeypatch.setattr(chatbot, "CONTEXT_COMPRESSION_ENABLED", False)
+    snippet = " ".join(["cloud"] * 80)
+    assert chatbot.compress_retrieved("cloud", [snippet], 20) == [snippet]
+    [document] = chatbot.compress_retrieved("cloud", [snippet], 20, fallback_words=50)
+    assert document == " ".join(["cloud"] * 50) + "..."
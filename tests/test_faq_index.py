@@ -0,0 +1,48 @@
+# tests/test_faq_index.py
+from app.faq_index import FAQIndex, is_question_title
+
+ROWS = [
+    (1, "What is Bravur?", "Bravur is an IT consultancy from Utrecht. We build custom software and data platforms."),
+    (2, "Where is Bravur located?", "Our office is in Utrecht, close to the central station."),
+    (3, "Wat doet Bravur?", "Bravur is een IT-bedrijf dat maatwerksoftware bouwt voor het MKB en de zorg."),
+    (4, "Cloud services", "Bravur helps companies migrate their applications to Azure and AWS."),
+]
+
+
+def test_exact_and_fuzzy_title_matches_in_the_users_language():
+    index = FAQIndex()
+    index.rebuild(ROWS)
+    assert len(index) == 3  # "Cloud services" is not a question
+
+    exact = index.match("what is bravur", "en-US")
+    assert (exact.entry_id, exact.method, exact.confidence) == (1, "exact", 1.0)
+    fuzzy = index.match("Where's Bravur located at?", "en-US")
+    assert (fuzzy.entry_id, fuzzy.method) == (2, "fuzzy")
+    assert index.match("Wat doet Bravur?", "nl-NL").entry_id == 3
+    assert index.match("What is Bravur?", "nl-NL") is None  # no Dutch row with that title
+
+
+def test_unrelated_or_partial_questions_fall_through():
+    index = FAQIndex()
+    index.rebuild(ROWS)
+    assert index.match("What is Bravur's hourly rate for Kubernetes consulting?", "en-US") is None
+    assert index.match("Tell me a joke", "en-US") is None
+    assert index.match("???", "en-US") is None
+    assert not is_question_title("Cloud services")
+
+
+def test_near_misses_are_confirmed_with_embeddings():
+    vectors = {"Where is Bravur located?": [1.0, 0.0], "Where can I find Bravur's office?": [0.95, 0.1],
+               "Where is Bravur hiring?": [0.2, 0.9]}
+    calls = []
+
+    def embed(text):
+        calls.append(text)
+        return vectors.get(text)
+
+    index = FAQIndex(embed=embed, embedding_candidate_threshold=0.5)
+    index.rebuild(ROWS)
+    match = index.match("Where can I find Bravur's office?", "en-US")
+    assert (match.entry_id, match.method) == (2, "embedding")
+    assert index.match("Where is Bravur hiring?", "en-US") is None
+    assert calls.count("Where is Bravur located?") == 1  # title embeddings are cached
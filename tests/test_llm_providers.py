@@ -0,0 +1,138 @@
+# tests/test_llm_providers.py
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from groq import Groq
+from openai import OpenAI
+
+from app import llm_providers
+from app.llm_providers import LLMGateway, LLMProvider, LatencyTracker, LLMUnavailableError
+from app.resilience import CircuitBreaker
+
+
+class MockLLMServer:
+    """Local OpenAI-compatible chat completions server with configurable delay and failures."""
+
+    def __init__(self, reply="hello from mock", delay=0.0, status=200):
+        self.reply = reply
+        self.delay = delay
+        self.status = status
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.requests += 1
+                time.sleep(server.delay)
+                if server.status != 200:
+                    self.send_response(server.status)
+                    self.send_header("Content-Type", "application/json")
+                    self.end_headers()
+                    self.wfile.write(json.dumps({"error": {"message": "mock failure"}}).encode())
+                    return
+                if body.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.end_headers()
+                    for word in server.reply.split(" "):
+                        chunk = {"id": "mock", "object": "chat.completion.chunk", "created": 0,
+                                 "model": body["model"],
+                                 "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    return
+                payload = {"id": "mock", "object": "chat.completion", "created": 0, "model": body["model"],
+                           "choices": [{"index": 0, "finish_reason": "stop",
+                                        "message": {"role": "assistant", "content": server.reply}}]}
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+@pytest.fixture
+def servers():
+    groq_server = MockLLMServer(reply="groq answer")
+    openai_server = MockLLMServer(reply="openai answer")
+    yield groq_server, openai_server
+    groq_server.stop()
+    openai_server.stop()
+
+
+def make_gateway(groq_server, openai_server, **kwargs):
+    groq = Groq(api_key="test", base_url=groq_server.url, max_retries=0)
+    openai = OpenAI(api_key="test", base_url=f"{openai_server.url}/v1", max_retries=0)
+    kwargs.setdefault("request_timeout", 5)
+    return LLMGateway({
+        "groq": LLMProvider("groq", groq, "llama-3.3-70b-versatile"),
+        "openai": LLMProvider("openai", openai, "gpt-4o-mini"),
+    }, **kwargs)
+
+
+def test_complete_uses_primary_provider(servers):
+    groq_server, openai_server = servers
+    gateway = make_gateway(groq_server, openai_server)
+    assert gateway.complete("classify", [{"role": "user", "content": "hi"}]) == "groq answer"
+    assert openai_server.requests == 0
+
+
+def test_complete_fails_over_on_error(servers):
+    groq_server, openai_server = servers
+    groq_server.status = 500
+    gateway = make_gateway(groq_server, openai_server)
+    assert gateway.complete("classify", [{"role": "user", "content": "hi"}]) == "openai answer"
+
+
+def test_stream_hedges_to_other_provider_when_slow(servers):
+    groq_server, openai_server = servers
+    groq_server.delay = 2.0
+    gateway = make_gateway(groq_server, openai_server, hedge_default_delay=0.2, hedge_min_delay=0.1)
+    started = time.monotonic()
+    reply = "".join(gateway.stream("it_trends", [{"role": "user", "content": "hi"}]))
+    assert reply.strip() == "openai answer"
+    assert time.monotonic() - started < 1.5
+
+
+def test_raises_when_all_providers_fail(servers):
+    groq_server, openai_server = servers
+    groq_server.status = 500
+    openai_server.status = 500
+    gateway = make_gateway(groq_server, openai_server)
+    with pytest.raises(LLMUnavailableError):
+        gateway.complete("classify", [{"role": "user", "content": "hi"}])
+
+
+def test_hedge_delay_follows_rolling_p95():
+    tracker = LatencyTracker()
+    for i in range(1, 101):
+        tracker.record("groq", "m", "ttft", i / 100)
+    gateway = LLMGateway({}, tracker=tracker, hedge_min_samples=20, hedge_min_delay=0.1)
+    assert gateway.hedge_delay("groq", "m") == pytest.approx(0.95, abs=0.01)
+    assert gateway.hedge_delay("openai", "m") == gateway.hedge_default_delay
+
+
+def test_skips_provider_with_open_circuit(servers, monkeypatch):
+    groq_server, openai_server = servers
+    breaker = CircuitBreaker("groq", failure_threshold=1, recovery_seconds=60)
+    breaker.record_failure()
+    monkeypatch.setattr(llm_providers, "get_breaker",
+                        lambda name: breaker if name == "groq" else CircuitBreaker(name))
+    gateway = make_gateway(groq_server, openai_server)
+    assert gateway.complete("classify", [{"role": "user", "content": "hi"}]) == "openai answer"
+    assert groq_server.requests == 0
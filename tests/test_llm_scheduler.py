@@ -0,0 +1,62 @@
+# tests/test_llm_scheduler.py
+import threading
+import time
+import uuid
+
+import pytest
+
+from app.llm_scheduler import (
+    LLMScheduler, LocalTokenBuckets, RedisTokenBuckets, SchedulerTimeoutError,
+    PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+)
+
+
+def test_local_buckets_enforce_requests_and_tokens_per_minute():
+    buckets = LocalTokenBuckets()
+    assert buckets.try_acquire("k", 2, 1000, 100) == 0
+    assert buckets.try_acquire("k", 2, 1000, 100) == 0
+    assert buckets.try_acquire("k", 2, 1000, 100) > 0  # out of requests
+
+    assert buckets.try_acquire("t", 100, 1000, 900) == 0
+    assert buckets.try_acquire("t", 100, 1000, 200) == pytest.approx(6.0, abs=0.1)  # 100 tokens short
+
+
+def test_acquire_times_out_when_saturated():
+    scheduler = LLMScheduler(LocalTokenBuckets(), provider_limits={"groq": (1, 1000)}, max_wait=0.2)
+    assert scheduler.acquire("groq", "m", 10) < 0.1
+    with pytest.raises(SchedulerTimeoutError):
+        scheduler.acquire("groq", "m", 10)
+    stats = scheduler.stats()["queues"]["groq:m"]
+    assert stats["admitted"] == 1 and stats["timeouts"] == 1
+
+
+def test_interactive_calls_are_admitted_before_background():
+    # 120 requests/min refills one request every 0.5s once the burst is spent
+    scheduler = LLMScheduler(LocalTokenBuckets(), provider_limits={"groq": (120, 100000)}, max_wait=5)
+    for _ in range(120):
+        scheduler.acquire("groq", "m", 1)
+
+    order = []
+
+    def call(name, priority, delay):
+        time.sleep(delay)
+        scheduler.acquire("groq", "m", 1, priority)
+        order.append(name)
+
+    threads = [threading.Thread(target=call, args=("background", PRIORITY_BACKGROUND, 0)),
+               threading.Thread(target=call, args=("background", PRIORITY_BACKGROUND, 0)),
+               threading.Thread(target=call, args=("interactive", PRIORITY_INTERACTIVE, 0.1))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert order[0] == "interactive"
+
+
+def test_redis_buckets_are_shared_between_workers():
+    key = f"test:{uuid.uuid4().hex}"
+    worker_a, worker_b = RedisTokenBuckets(), RedisTokenBuckets()
+    assert worker_a.try_acquire(key, 2, 1000, 10) == 0
+    assert worker_b.try_acquire(key, 2, 1000, 10) == 0
+    assert worker_a.try_acquire(key, 2, 1000, 10) > 0
+    assert worker_b.fallback.try_acquire(key, 2, 1000, 10) == 0  # Redis was used, not the local fallback
@@ -0,0 +1,57 @@
+# tests/test_metrics.py
+import pytest
+
+from app.metrics import (
+    STAGE_DURATION, STAGE_ERRORS, CHAT_TURNS, chat_turn, stage_timer, set_intent, render_metrics, timed
+)
+
+
+def sample(metric, suffix, **labels):
+    for family in metric.collect():
+        for s in family.samples:
+            if s.name.endswith(suffix) and s.labels == labels:
+                return s.value
+    return 0.0
+
+
+def test_stages_inside_a_turn_are_labelled_with_its_intent_and_language():
+    @chat_turn
+    def handler(user_input, session_id=None, language="en-US"):
+        with stage_timer("intent_classification"):
+            set_intent("Company Info")
+        with stage_timer("test_stage"):
+            pass
+        yield "reply"
+
+    before = sample(CHAT_TURNS, "_total", intent="Company Info", language="nl-NL")
+    assert list(handler("hoi", "s1", "nl-NL")) == ["reply"]
+    assert sample(STAGE_DURATION, "_count", stage="test_stage", intent="Company Info", language="nl-NL") >= 1
+    assert sample(CHAT_TURNS, "_total", intent="Company Info", language="nl-NL") == before + 1
+
+
+def test_unknown_languages_are_bucketed_and_errors_counted():
+    @timed("failing_stage")
+    def fail():
+        raise ValueError("boom")
+
+    @chat_turn
+    def handler(user_input, session_id=None, language="en-US"):
+        fail()
+        yield "unreachable"
+
+    with pytest.raises(ValueError):
+        list(handler("hi", None, "xx-YY"))
+    assert sample(STAGE_ERRORS, "_total", stage="failing_stage", intent="unclassified", language="other") == 1
+
+
+def test_metrics_endpoint_exports_stage_and_runtime_metrics():
+    from app import create_app
+
+    response = create_app().test_client().get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    body = response.get_data(as_text=True)
+    assert "bravur_stage_duration_seconds" in body
+    assert "bravur_web_search_lookups_total" in body
+    body, _ = render_metrics()
+    assert b"bravur_llm_latency_seconds" in body
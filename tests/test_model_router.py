@@ -0,0 +1,96 @@
+# tests/test_model_router.py
+import json
+import os
+
+import pytest
+
+from app.model_router import ModelRouter, outputs_agree
+
+FAST = ("groq", "llama-3.1-8b-instant")
+REFERENCE = ("groq", "llama-3.3-70b-versatile")
+
+
+class FakeGateway:
+    """Answers with a per-model canned reply and records which model served each call."""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.calls = []
+
+    def complete(self, stage, messages, provider=None, model=None, temperature=0.0, max_tokens=256):
+        self.calls.append((stage, provider, model))
+        return self.replies[model]
+
+    def stream(self, stage, messages, provider=None, model=None, temperature=0.5, max_tokens=300):
+        self.calls.append((stage, provider, model))
+        yield self.replies[model]
+
+
+def write_routes(path, candidates, **overrides):
+    config = {"enabled": True, "agreement_threshold": 0.9, "min_samples": 5, "shadow_rate": 0.0,
+              "warmup_shadow_rate": 0.0,
+              "stages": {"classify": {"agreement": "exact",
+                                      "candidates": [{"provider": p, "model": m} for p, m in candidates]}}}
+    config.update(overrides)
+    path.write_text(json.dumps(config), encoding="utf-8")
+
+
+@pytest.fixture
+def routes_file(tmp_path):
+    path = tmp_path / "routes.json"
+    write_routes(path, [FAST, REFERENCE])
+    return path
+
+
+def seed(router, candidate, latency, agreements):
+    stats = router._route_stats("classify", candidate)
+    stats.latencies.extend([latency] * 10)
+    stats.agreements.extend(agreements)
+
+
+def test_routes_to_faster_model_once_it_agrees_with_reference(routes_file):
+    router = ModelRouter(FakeGateway({FAST[1]: "Unknown", REFERENCE[1]: "Unknown"}), path=str(routes_file))
+    assert router.route("classify") == REFERENCE  # not enough evidence yet
+
+    seed(router, REFERENCE, 0.8, [])
+    seed(router, FAST, 0.1, [1] * 10)
+    assert router.route("classify") == FAST
+    assert router.complete("classify", [{"role": "user", "content": "hi"}]) == "Unknown"
+    assert router.gateway.calls[-1] == ("classify", *FAST)
+    assert router.stats()["classify"]["routed_to"] == "groq:llama-3.1-8b-instant"
+
+
+def test_stays_on_reference_when_agreement_is_below_threshold(routes_file):
+    router = ModelRouter(FakeGateway({FAST[1]: "Unknown", REFERENCE[1]: "Unknown"}), path=str(routes_file))
+    seed(router, REFERENCE, 0.8, [])
+    seed(router, FAST, 0.1, [1] * 8 + [0] * 2)
+    route = router.route("classify")
+    assert route == REFERENCE
+
+    seed(router, FAST, 0.1, [1] * 90)  # routing flips between choosing and calling: the chosen route still serves
+    router.complete("classify", [{"role": "user", "content": "hi"}], route=route)
+    assert router.gateway.calls[-1] == ("classify", *REFERENCE)
+
+
+def test_shadow_comparison_records_agreement(routes_file):
+    write_routes(routes_file, [FAST, REFERENCE], warmup_shadow_rate=1.0)
+    router = ModelRouter(FakeGateway({FAST[1]: "IT Trends", REFERENCE[1]: "'it trends'"}), path=str(routes_file))
+    router.complete("classify", [{"role": "user", "content": "cloud news?"}])
+    router._shadow_executor.shutdown(wait=True)
+    assert ("shadow", *FAST) in router.gateway.calls
+    assert list(router._route_stats("classify", FAST).agreements) == [1]
+    assert outputs_agree("similarity", "Bravur builds software", "Bravur builds custom software")
+    assert not outputs_agree("exact", "Company Info", "Unknown")
+
+
+def test_routes_file_is_reloaded_without_restart(routes_file):
+    router = ModelRouter(FakeGateway({}), path=str(routes_file), reload_seconds=0)
+    assert router.route("classify") == REFERENCE
+
+    write_routes(routes_file, [("openai", "gpt-4o-mini")])
+    os.utime(routes_file, (1, 1))  # force a visible mtime change
+    assert router.route("classify") == ("openai", "gpt-4o-mini")
+
+    routes_file.write_text("{not json", encoding="utf-8")
+    os.utime(routes_file, (2, 2))
+    assert router.route("classify") == ("openai", "gpt-4o-mini")  # bad edits keep the last good routes
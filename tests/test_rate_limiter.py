@@ -0,0 +1,79 @@
+# tests/test_rate_limiter.py
+import time
+import uuid
+
+import pytest
+
+from app.rate_limiter import (
+    r, check_rate_limit, peek_rate_limit, check_session_rate_limit, check_fingerprint_rate_limit,
+    mark_captcha_solved, mark_captcha_solved_fingerprint, get_fingerprint_rate_status,
+    LocalTokenBucketTier, RATE_LIMIT_SCOPES, IP_WINDOW_SECONDS, FINGERPRINT_MAX_REQUESTS
+)
+
+
+def test_ip_scope_counts_and_sets_the_window_once():
+    ip = f"test-{uuid.uuid4().hex}"
+    first = check_rate_limit("ip", ip)
+    second = check_rate_limit("ip", ip)
+    assert (first.allowed, first.count, second.count) == (True, 1, 2)
+    assert 0 < r.ttl(f"rate_limit:ip:{ip}") <= IP_WINDOW_SECONDS
+    r.delete(f"rate_limit:ip:{ip}")
+
+
+def test_fingerprint_asks_for_captcha_near_the_limit():
+    fingerprint = f"test-{uuid.uuid4().hex}"
+    results = [check_rate_limit("fingerprint", fingerprint) for _ in range(FINGERPRINT_MAX_REQUESTS)]
+    assert not results[2].captcha_required
+    assert results[3].captcha_required and results[3].allowed
+    assert results[-1].limit == FINGERPRINT_MAX_REQUESTS
+    r.delete(f"rate_limit:fingerprint:{fingerprint}")
+
+
+def test_session_limit_override_and_retry_after():
+    session_id = f"test-{uuid.uuid4().hex}"
+    r.hset(f"rate_limit:meta:{session_id}", mapping={"limit": 1})
+    assert check_rate_limit("session", session_id).captcha_required  # floor(1 * 0.9) == 0
+    mark_captcha_solved(session_id)
+    assert check_session_rate_limit(session_id) == (True, 0, False)
+    r.delete(f"rate_limit:meta:{session_id}", f"rate_limit:session:{session_id}")
+
+
+@pytest.mark.parametrize("algorithm", ["gcra", "sliding_log"])
+def test_smooth_algorithms_deny_past_the_limit_without_a_window_reset(monkeypatch, algorithm):
+    monkeypatch.setitem(RATE_LIMIT_SCOPES, "ip", (3, 60, 0, False, algorithm))
+    ip = f"test-{uuid.uuid4().hex}"
+    results = [check_rate_limit("ip", ip) for _ in range(4)]
+    assert [result.count for result in results[:3]] == [1, 2, 3]
+    assert results[3].allowed is False and 1 <= results[3].retry_after <= 60
+    assert peek_rate_limit("ip", ip).count == 3  # the denied request wasn't recorded
+    r.delete(f"rate_limit:{'gcra' if algorithm == 'gcra' else 'log'}:ip:{ip}")
+
+
+def test_gcra_keeps_captcha_threshold_and_resets_on_captcha(monkeypatch):
+    monkeypatch.setitem(RATE_LIMIT_SCOPES, "fingerprint", (5, 3600, 0.9, False, "gcra"))
+    fingerprint = f"test-{uuid.uuid4().hex}"
+    results = [check_fingerprint_rate_limit(fingerprint) for _ in range(4)]
+    assert results[2] == (True, 0, False)
+    assert results[3] == (True, 0, True)  # floor(5 * 0.9) == 4
+    assert get_fingerprint_rate_status(fingerprint)["captcha_required"]
+    mark_captcha_solved_fingerprint(fingerprint)
+    assert get_fingerprint_rate_status(fingerprint)["count"] == 0
+
+
+def test_local_ip_tier_rejects_floods_without_redis_and_honours_the_global_count():
+    tier = LocalTokenBucketTier(limit=8, window_seconds=60, share=0.5, sync_seconds=60)
+    ip = f"test-{uuid.uuid4().hex}"
+    assert [tier.check(ip)[0] for _ in range(5)] == [True] * 4 + [False]  # the worker's share is 4
+    assert tier.stats["syncs"] == 0  # nothing has touched Redis yet
+
+    key = f"{tier.key_prefix}:{ip}:{int(time.time() // 60)}"
+    r.set(key, 4, ex=120)  # other workers already admitted 4 requests from this IP
+    tier.sync()
+    assert int(r.get(key)) == 8
+    tier._buckets[ip] = (tier.capacity, time.monotonic())
+    assert tier.check(ip)[0]  # exactly at the global limit is still allowed
+    tier.sync()
+    assert int(r.get(key)) == 9
+    allowed, retry_after = tier.check(ip)
+    assert not allowed and 0 < retry_after <= 60
+    r.delete(key)
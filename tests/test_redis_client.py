@@ -0,0 +1,46 @@
+# tests/test_redis_client.py
+import uuid
+
+import redis
+
+from app import rate_limiter, session_state
+from app.redis_client import RedisHealthMonitor
+
+
+def test_monitor_degrades_after_failures_and_recovers_after_healthy_pings():
+    unreachable = redis.StrictRedis(port=1, socket_connect_timeout=0.2)
+    client = {"current": unreachable}
+    monitor = RedisHealthMonitor(client_factory=lambda: client["current"], failure_threshold=2, recovery_checks=2)
+    monitor._probe_thread = object()  # probe by hand instead of from the background thread
+
+    monitor.probe()
+    assert monitor.available()
+    monitor.probe()
+    assert not monitor.available() and monitor.snapshot()["mode"] == "degraded"
+
+    client["current"] = rate_limiter.r
+    monitor.probe()
+    assert not monitor.available()  # one healthy ping isn't enough
+    monitor.probe()
+    assert monitor.available() and monitor.switches == 2
+
+
+def test_rate_limits_use_the_in_process_limiter_while_degraded(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "redis_available", lambda: False)
+    fingerprint = f"test-{uuid.uuid4().hex}"
+    results = [rate_limiter.check_fingerprint_rate_limit(fingerprint) for _ in range(4)]
+    assert results[2] == (True, 0, False) and results[3] == (True, 0, True)
+    assert rate_limiter.get_fingerprint_rate_status(fingerprint)["count"] == 4
+    assert rate_limiter.r.exists(f"rate_limit:fingerprint:{fingerprint}") == 0
+    rate_limiter.mark_captcha_solved_fingerprint(fingerprint)
+    assert rate_limiter.get_fingerprint_rate_status(fingerprint)["count"] == 0
+
+
+def test_session_state_falls_back_to_memory_while_degraded(monkeypatch):
+    store = session_state.RedisSessionStateStore(ttl_seconds=60)
+    session_id = f"test-{uuid.uuid4().hex}"
+    monkeypatch.setattr(session_state, "redis_available", lambda: False)
+    store.save(session_id, {"gratitude": {"en-US": [1]}})
+    assert store.load(session_id) == {"gratitude": {"en-US": [1]}}
+    assert store.redis.exists(store.key_prefix + session_id) == 0
+    assert store.stats()["fallback_entries"] == 1
@@ -0,0 +1,72 @@
+# tests/test_resilience.py
+import time
+
+import pytest
+
+from app import resilience
+from app.resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceededError, call_with_resilience,
+    get_breaker, request_deadline, dependency_timeout
+)
+
+
+def test_breaker_opens_after_threshold_and_probes_once():
+    breaker = CircuitBreaker("test", failure_threshold=3, recovery_seconds=0.1)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.15)
+    assert breaker.allow()  # the single half-open probe
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_retries_then_succeeds(monkeypatch):
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 0)
+    calls = []
+
+    def flaky(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            raise ConnectionError("boom")
+        return "ok"
+
+    assert call_with_resilience("test_retry", flaky, retries=1) == "ok"
+    assert len(calls) == 2
+
+
+def test_non_transient_errors_are_not_retried_or_counted(monkeypatch):
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 0)
+    calls = []
+
+    def bad_request(timeout):
+        calls.append(timeout)
+        raise ValueError("HTTP 400: invalid voice")
+
+    with pytest.raises(ValueError):
+        call_with_resilience("test_bad_request", bad_request, retries=3)
+    assert len(calls) == 1
+    assert get_breaker("test_bad_request").snapshot()["failures"] == 0
+
+
+def test_open_breaker_short_circuits_calls():
+    breaker = get_breaker("test_open")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        call_with_resilience("test_open", lambda timeout: "unreachable")
+
+
+def test_timeouts_follow_request_deadline():
+    with request_deadline(1.0):
+        assert dependency_timeout("serper") <= 1.0
+    assert dependency_timeout("serper") == resilience.DEPENDENCY_POLICIES["serper"]["timeout"]
+
+    with request_deadline(0):
+        with pytest.raises(DeadlineExceededError):
+            call_with_resilience("test_deadline", lambda timeout: "late")
@@ -0,0 +1,57 @@
+# tests/test_session_state.py
+import time
+
+from app.session_state import LocalSessionStateStore, RedisSessionStateStore
+from app.chatbot import get_random_unknown_message, UNKNOWN_INTENT_MESSAGES
+import app.chatbot as chatbot
+
+
+def test_local_store_evicts_least_recently_used():
+    store = LocalSessionStateStore(max_entries=2, ttl_seconds=60)
+    store.save("a", {"x": 1})
+    store.save("b", {"x": 2})
+    store.load("a")  # a is now most recently used
+    store.save("c", {"x": 3})
+
+    assert store.load("b") == {}
+    assert store.load("a") == {"x": 1}
+    stats = store.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert stats["bytes"] > 0
+
+
+def test_local_store_expires_entries_from_first_write():
+    store = LocalSessionStateStore(ttl_seconds=0.05)
+    store.save("a", {"x": 1})
+    time.sleep(0.06)
+    store.save("b", {"x": 1})
+    assert store.load("a") == {}
+    assert store.stats()["entries"] == 1
+
+
+def test_state_over_size_cap_is_reset():
+    store = LocalSessionStateStore(max_bytes=32)
+    store.save("a", {"gratitude": {"en-US": ["0123456789ab"] * 10}})
+    assert store.load("a") == {}
+
+
+def test_redis_store_sets_ttl_once_per_session():
+    store = RedisSessionStateStore(ttl_seconds=120)
+    session_id = f"test-{time.time()}"
+    store.save(session_id, {"unknown": {"en-US": {"m": [1, 2]}}})
+    store.redis.expire(store.key_prefix + session_id, 30)
+    store.save(session_id, {"unknown": {"en-US": {"m": [2]}}})
+
+    assert store.load(session_id) == {"unknown": {"en-US": {"m": [2]}}}
+    assert 0 < store.redis.ttl(store.key_prefix + session_id) <= 30
+    store.redis.delete(store.key_prefix + session_id)
+
+
+def test_unknown_messages_cycle_without_repeats(monkeypatch):
+    monkeypatch.setattr(chatbot, "session_state_store", LocalSessionStateStore())
+    seen = set()
+    for _ in UNKNOWN_INTENT_MESSAGES["en-US"]:
+        message = get_random_unknown_message("abcdef123", "en-US")
+        seen.add(next(m for m in UNKNOWN_INTENT_MESSAGES["en-US"] if message.startswith(m)))
+    assert seen == set(UNKNOWN_INTENT_MESSAGES["en-US"])
@@ -0,0 +1,109 @@
+# tests/test_singleflight.py
+import threading
+import time
+
+import pytest
+
+import app.chatbot as chatbot
+from app.singleflight import SingleFlight
+
+
+def slow_stream(release, runs, words=("one ", "two ", "three")):
+    runs.append(1)
+    for word in words:
+        release.wait(2)
+        yield word
+
+
+def test_concurrent_identical_streams_share_one_run():
+    flights, release, runs, outputs = SingleFlight(), threading.Event(), [], []
+
+    def client():
+        chunks, _ = flights.stream("key", slow_stream, release, runs)
+        outputs.append("".join(chunks))
+
+    clients = [threading.Thread(target=client) for _ in range(5)]
+    for thread in clients:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in clients:
+        thread.join(2)
+
+    assert runs == [1]
+    assert outputs == ["one two three"] * 5
+    assert flights.stats == {"runs": 1, "shared": 4}
+    assert not flights.in_flight("key")
+
+
+def test_late_joiner_gets_the_whole_stream_and_errors_reach_everyone():
+    flights, gate = SingleFlight(), threading.Event()
+
+    def failing():
+        yield "partial "
+        gate.wait(2)
+        raise RuntimeError("upstream failed")
+
+    first, shared_first = flights.stream("k", failing)
+    assert next(first) == "partial " and not shared_first
+    late, shared_late = flights.stream("k", failing)
+    assert shared_late and next(late) == "partial "
+    gate.set()
+    for chunks in (first, late):
+        with pytest.raises(RuntimeError):
+            list(chunks)
+
+
+def test_subscriber_closed_before_reading_leaves_once_and_stops_the_run():
+    flights, release, runs = SingleFlight(), threading.Event(), []
+    chunks, _ = flights.stream("idle", slow_stream, release, runs)
+    broadcast = flights._streams["idle"]
+    chunks.close()
+    chunks.close()
+    assert broadcast.subscribers == 0 and broadcast.abandoned.is_set()
+    release.set()
+    deadline = time.monotonic() + 2
+    while flights.in_flight("idle") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not flights.in_flight("idle") and broadcast.chunks == []
+
+
+def test_only_stateless_turns_are_coalesced():
+    assert chatbot.coalescing_key("What is Bravur?", "session-1", "en-US") == ("what is bravur", "en-US")
+    assert chatbot.coalescing_key("Tell me more about that", "session-1", "en-US") is None
+    assert chatbot.coalescing_key("Can you elaborate on the cloud services?", "session-1", "en-US") is None
+    assert chatbot.coalescing_key("What about pricing?", "session-1", "en-US") is None
+    assert chatbot.coalescing_key("What is Bravur?", None, "en-US") is None
+
+
+def test_duplicates_of_a_running_turn_share_one_run_but_keep_their_session_id(monkeypatch):
+    release, sessions = threading.Event(), []
+
+    def fake_agent(agent_name, user_input, session_id, language):
+        sessions.append(session_id)
+        release.wait(2)
+        yield "Please mail support." + chatbot.get_session_id_suffix(session_id, language)
+
+    monkeypatch.setattr(chatbot.agent_connector, "stream", fake_agent)
+    monkeypatch.setattr(chatbot, "is_session_expired", lambda session_id: False)
+    replies = {}
+
+    def turn(session_id):
+        replies[session_id] = "".join(chatbot.stream_chat_turn("Who runs Bravur?", session_id, "en-US"))
+
+    first = threading.Thread(target=turn, args=("aaaaaa-1",))
+    first.start()
+    deadline = time.monotonic() + 2
+    while not sessions and time.monotonic() < deadline:
+        time.sleep(0.01)
+    duplicates = [threading.Thread(target=turn, args=(session_id,)) for session_id in ("bbbbbb-2", "cccccc-3")]
+    for thread in duplicates:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [first, *duplicates]:
+        thread.join(2)
+
+    assert len(sessions) == 2 and set(sessions) == {"aaaaaa-1", None}  # the lone turn ran on its own session
+    for session_id, reply in replies.items():
+        assert reply == f"Please mail support. Please mention your session ID: {session_id[:6]} when contacting them."
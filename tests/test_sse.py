@@ -0,0 +1,81 @@
+# tests/test_sse.py
+import json
+
+import pytest
+
+import app.controllers.chat_controller as chat_controller
+from app.sse import EventStream, StatusChunk, extract_citations, parse_last_event_id, HEARTBEAT
+
+
+def parse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        if block.startswith(":"):
+            continue
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["id"], fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from app import create_app
+
+    def fake_turn(user_input, session_id, language):
+        yield StatusChunk("Searching the web for the latest IT trends... 🌐\n")
+        yield "Cloud is growing "
+        yield "(Row ID: 7), see https://www.gartner.com/en/trends."
+
+    stored = []
+    monkeypatch.setattr(chat_controller, "stream_chat_turn", fake_turn)
+    monkeypatch.setattr(chat_controller, "store_message", lambda *args: stored.append(args))
+    monkeypatch.setattr(chat_controller, "_handle_session", lambda session_id: "session-1")
+    monkeypatch.setattr(chat_controller, "_check_rate_limits", lambda session_id, fingerprint: None)
+    test_client = create_app().test_client()
+    test_client.stored = stored
+    return test_client
+
+
+def test_sse_mode_emits_typed_events(client):
+    response = client.post("/api/v1/chat", json={"message": "IT trends?", "session_id": "session-1"},
+                           headers={"Accept": "text/event-stream"})
+    assert response.mimetype == "text/event-stream"
+    events = parse(response.get_data(as_text=True))
+
+    assert [event for _, event, _ in events] == ["status", "status", "token", "token", "citation", "metrics", "done"]
+    assert events[1][2]["message"].startswith("Searching the web")
+    assert events[4][2] == {"row_ids": [7], "links": ["https://www.gartner.com/en/trends"]}
+    assert events[5][2]["first_token_ms"] is not None
+    # status text is streamed but not stored as part of the answer
+    assert client.stored[-1] == ("session-1", "Cloud is growing (Row ID: 7), see https://www.gartner.com/en/trends.", "bot")
+
+
+def test_reconnect_with_last_event_id_replays_the_rest(client):
+    response = client.post("/api/v1/chat", json={"message": "IT trends?", "stream": "sse"})
+    events = parse(response.get_data(as_text=True))
+    stream_id = response.headers["X-Stream-Id"]
+
+    resumed = client.get(f"/api/v1/chat/stream/{stream_id}", headers={"Last-Event-ID": events[2][0]})
+    assert parse(resumed.get_data(as_text=True)) == events[3:]
+    assert client.post("/api/v1/chat", headers={"Last-Event-ID": "gone-3"}).status_code == 410
+
+
+def test_stream_without_last_event_id_replays_from_the_start(client):
+    response = client.post("/api/v1/chat", json={"message": "IT trends?", "stream": "sse"})
+    events = parse(response.get_data(as_text=True))
+
+    replayed = client.get(f"/api/v1/chat/stream/{response.headers['X-Stream-Id']}")
+    assert replayed.status_code == 200 and parse(replayed.get_data(as_text=True)) == events
+    assert client.get("/api/v1/chat/stream/gone").status_code == 410
+
+
+def test_idle_streams_send_heartbeats_and_helpers_parse():
+    stream = EventStream("abc")
+    follower = stream.follow(heartbeat=0.01)
+    assert next(follower) == HEARTBEAT
+    stream.publish("token", {"text": "hi"})
+    stream.close()
+    assert list(follower) == ['id: abc-0\nevent: token\ndata: {"text": "hi"}\n\n']
+    assert parse_last_event_id("a-b-12") == ("a-b", 12)
+    assert parse_last_event_id("nonsense") == (None, -1)
+    assert extract_citations("(Row ID: 3) and Row ID 3") == {"row_ids": [3], "links": []}
@@ -0,0 +1,81 @@
+# tests/test_sts_responses.py
+import importlib
+import io
+import json
+import os
+import time
+
+import pytest
+
+import app.speech as speech
+from app.audio_store import AudioFileStore
+
+routes = importlib.import_module("app.routes")  # `app.routes` as an attribute is the blueprint
+
+AUDIO = bytes(range(256)) * 40  # stands in for an MP3 reply
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    from app import create_app
+
+    def fake_tts(text, language="en-US", audio_format="wav"):
+        path = tmp_path / f"reply.{audio_format}"
+        path.write_bytes(AUDIO)
+        return str(path)
+
+    monkeypatch.setattr(speech, "speech_to_text_rest",
+                        lambda audio_data, language=None: {"status": "success", "text": "Who is Bravur?"})
+    monkeypatch.setattr(speech, "is_first_bot_response_in_session", lambda session_id: False)
+    monkeypatch.setattr(speech, "get_chatbot_response", lambda *args, **kwargs: "Bravur is an IT consultancy.")
+    monkeypatch.setattr(speech, "text_to_speech_rest", fake_tts)
+    monkeypatch.setattr(routes, "store_message", lambda *args: None)
+    monkeypatch.setattr(routes, "sts_audio_store", AudioFileStore(str(tmp_path / "store"), ttl_seconds=60))
+    return create_app().test_client()
+
+
+def post_sts(client, **fields):
+    data = {"audio": (io.BytesIO(b"RIFF" + b"\0" * 100), "voice.wav"), "session_id": "session-1",
+            "language": "en-US", **fields}
+    return client.post("/api/v1/sts", data=data, content_type="multipart/form-data")
+
+
+def test_url_response_serves_the_audio_with_range_support(client):
+    response = post_sts(client, response_format="url", audio_format="mp3")
+    data = response.get_json()
+    assert "audio_base64" not in data and data["mime_type"] == "audio/mpeg"
+
+    full = client.get(data["audio_url"])
+    assert full.data == AUDIO and full.headers["Content-Length"] == str(len(AUDIO))
+    partial = client.get(data["audio_url"], headers={"Range": "bytes=100-199"})
+    assert partial.status_code == 206 and partial.data == AUDIO[100:200]
+    assert client.get("/api/v1/sts/audio/..%2Fsecret.mp3").status_code == 404
+
+
+def test_multipart_response_carries_metadata_and_raw_audio(client, tmp_path):
+    response = post_sts(client, response_format="multipart", audio_format="mp3")
+    assert response.mimetype == "multipart/mixed"
+    boundary = response.mimetype_params["boundary"].encode()
+    body = response.get_data()
+    assert len(body) == int(response.headers["Content-Length"])
+    response.close()
+    assert not (tmp_path / "reply.mp3").exists()  # the temp file goes once the response is closed
+
+    parts = [part for part in body.split(b"--" + boundary) if part.strip(b"-\r\n")]
+    metadata_headers, metadata = parts[0].strip(b"\r\n").split(b"\r\n\r\n", 1)
+    audio_headers, audio = parts[1].lstrip(b"\r\n").split(b"\r\n\r\n", 1)
+    assert json.loads(metadata)["bot_text"] == "Bravur is an IT consultancy."
+    assert b"audio/mpeg" in audio_headers and audio[:-2] == AUDIO
+
+
+def test_unknown_formats_are_rejected_and_stored_audio_expires(client, tmp_path):
+    assert post_sts(client, audio_format="flac").status_code == 400
+
+    store = AudioFileStore(str(tmp_path / "expiring"), ttl_seconds=60)
+    source = tmp_path / "clip.mp3"
+    source.write_bytes(AUDIO)
+    name = store.adopt(str(source), "mp3")
+    assert store.path(name) is not None and not source.exists()
+    old = time.time() - 120
+    os.utime(store.path(name), (old, old))
+    assert store.path(name) is None and store.path("../../etc/passwd") is None
@@ -0,0 +1,38 @@
+# tests/test_text_features.py
+from app.text_features import PhraseAutomaton, TextMatcher
+from app.chatbot import text_matcher, has_strong_contextual_cues, is_gratitude_expression, detect_mood
+
+
+def test_automaton_matches_overlapping_phrases():
+    automaton = PhraseAutomaton({"pronoun": ["he", "she"], "possessive": ["hers"], "other": ["his"]})
+    assert automaton.search("ushers") == {"pronoun", "possessive"}
+    assert automaton.search("nothing here") == {"pronoun"}
+    assert automaton.search("xyz") == set()
+
+
+def test_automaton_keeps_substring_semantics():
+    automaton = PhraseAutomaton({"happy": ["nice", "cool"]})
+    assert automaton.search("that's a niceee idea") == {"happy"}
+    assert automaton.search("coo l") == set()
+
+
+def test_matcher_scores_each_group_once():
+    matcher = TextMatcher(
+        phrase_groups={"greeting": ["hello"]},
+        fuzzy_groups={"memory": ["what was my last question", "recap this"], "recap": ["recap this"]},
+    )
+    features = matcher.analyze("Hello, can you recap this?")
+    assert features.has_phrase("greeting")
+    assert features.fuzzy_match("recap", 80)
+    assert features.fuzzy_score("memory") == features.fuzzy_score("recap")
+
+
+def test_chatbot_branches_reuse_features():
+    features = text_matcher.analyze("Thanks a lot!")
+    assert is_gratitude_expression("Thanks a lot!", features)
+    assert detect_mood("Thanks a lot!", features) == "happy"
+    assert not is_gratitude_expression("What is the best way to say thanks?")
+    assert detect_mood("this bot is useless") == "angry"
+    assert has_strong_contextual_cues("What was my last question")
+    assert has_strong_contextual_cues("tell me more about that one")
+    assert not has_strong_contextual_cues("What services does Bravur offer?")
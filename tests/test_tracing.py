@@ -0,0 +1,85 @@
+# tests/test_tracing.py
+import json
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+import trace_waterfall
+from app import tracing
+from app.llm_providers import LLMGateway
+from app.tracing import start_trace, finish_trace, span, annotate, clear_trace, TRACE_HEADER
+
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    logger = logging.getLogger(f"test.traces.{tmp_path.name}")
+    logger.propagate = False
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    monkeypatch.setattr(tracing, "trace_logger", logger)
+    yield path
+    logger.removeHandler(handler)
+    handler.close()
+    clear_trace()
+
+
+class EchoProvider:
+    """Minimal provider answering every completion immediately."""
+
+    name = "echo"
+    default_model = "echo-1"
+
+    def create(self, model, messages, temperature, max_tokens, stream=False, timeout=None):
+        message = SimpleNamespace(content="pong")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_spans_nest_and_carry_attributes(trace_file):
+    trace = start_trace("POST /api/v1/chat")
+    with span("turn"):
+        with span("semantic_search", top_k=3):
+            annotate(rows=2)
+    finish_trace(trace)
+
+    record = read_records(trace_file)[0]
+    spans = {s["name"]: s for s in record["spans"]}
+    assert record["trace_id"] == trace.trace_id
+    assert spans["turn"]["parent_span_id"] == record["span_id"]
+    assert spans["semantic_search"]["parent_span_id"] == spans["turn"]["span_id"]
+    assert spans["semantic_search"]["attributes"] == {"top_k": 3, "rows": 2}
+
+
+def test_llm_attempts_in_worker_threads_join_the_request_trace(trace_file):
+    gateway = LLMGateway({"echo": EchoProvider()}, hedge_enabled=False)
+    trace = start_trace("POST /api/v1/chat")
+    assert gateway.complete("classify", [{"role": "user", "content": "ping"}], provider="echo") == "pong"
+    finish_trace(trace)
+
+    llm_span = next(s for s in read_records(trace_file)[0]["spans"] if s["name"] == "llm")
+    assert llm_span["attributes"]["model"] == "echo-1"
+    assert llm_span["attributes"]["stage"] == "classify"
+
+
+def test_api_responses_carry_trace_id_and_waterfall_renders(trace_file, capsys):
+    from app import create_app
+
+    response = create_app().test_client().get("/api/v1/health")
+    trace_id = response.headers[TRACE_HEADER]
+    response.close()
+
+    record = read_records(trace_file)[0]
+    assert record["trace_id"] == trace_id
+    assert record["attributes"]["status_code"] == 200
+    assert any(s["name"] == "rate_limit_ip" for s in record["spans"])
+
+    assert trace_waterfall.main([trace_id, "--file", str(trace_file)]) == 0
+    output = capsys.readouterr().out
+    assert "GET /api/v1/health" in output and "rate_limit_ip" in output
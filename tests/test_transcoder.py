@@ -0,0 +1,74 @@
+# tests/test_transcoder.py
+import io
+import struct
+import sys
+import threading
+import time
+import wave
+
+from app.transcoder import AudioTranscoder, codec_fingerprint, probe_container
+
+# MediaRecorder-style WebM start: EBML header, an Opus track and WritingApp "Chrome"
+CHROME_WEBM = b"\x1aE\xdf\xa3\x9fB\x86\x81\x01" + b"\x57\x41\x86Chrome" + b"\x86\x86A_OPUS" + b"\0" * 64
+
+
+def fake_ffmpeg(tmp_path, works_with="matroska", sleep=0.0):
+    """A stand-in for ffmpeg that logs its runs and, like ffmpeg writing to a pipe, leaves WAV sizes unset."""
+    log = tmp_path / "runs.log"
+    script = tmp_path / "ffmpeg"
+    script.write_text(f"""#!{sys.executable}
+import struct, sys, time
+sys.stdin.buffer.read()
+with open({str(log)!r}, "a") as f:
+    f.write(" ".join(sys.argv[1:]) + "\\n")
+time.sleep({sleep})
+if {works_with!r} not in sys.argv:
+    sys.exit(1)
+fmt = struct.pack("<HHIIHH", 1, 1, 16000, 32000, 2, 16)
+sys.stdout.buffer.write(b"RIFF\\xff\\xff\\xff\\xffWAVEfmt " + struct.pack("<I", 16) + fmt
+                        + b"data\\xff\\xff\\xff\\xff" + b"\\x01\\x00" * 800)
+""")
+    script.chmod(0o755)
+    return str(script), log
+
+
+def test_probe_and_fingerprint_from_magic_bytes():
+    assert probe_container(CHROME_WEBM) == "webm"
+    assert probe_container(b"RIFF....WAVE") == "wav" and probe_container(b"junk") == "unknown"
+    assert codec_fingerprint(CHROME_WEBM) == "webm/opus/Chrome"
+
+
+def test_working_repair_strategy_is_tried_first_next_time(tmp_path):
+    binary, log = fake_ffmpeg(tmp_path, works_with="matroska")
+    transcoder = AudioTranscoder(binary=binary, workers=2, timeout=5, queue_timeout=5)
+
+    wav = transcoder.to_wav(CHROME_WEBM)
+    with wave.open(io.BytesIO(wav), "rb") as reader:
+        assert reader.getnframes() == 800 and reader.getframerate() == 16000
+    assert struct.unpack_from("<I", wav, 4)[0] == len(wav) - 8
+    assert len(log.read_text().splitlines()) == 3  # webm, ignore_errors, then matroska
+
+    assert transcoder.to_wav(CHROME_WEBM) == wav
+    runs = log.read_text().splitlines()
+    assert len(runs) == 4 and "-f matroska -i pipe:0" in runs[-1]
+    assert transcoder.snapshot()["cached_strategy_hits"] == 1
+
+
+def test_pool_bounds_concurrent_processes_and_times_out_the_queue(tmp_path):
+    binary, _ = fake_ffmpeg(tmp_path, works_with="wav", sleep=0.3)
+    wav_upload = b"RIFF" + b"\0" * 64
+    transcoder = AudioTranscoder(binary=binary, workers=1, timeout=5, queue_timeout=0.1)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(transcoder.to_wav(wav_upload))) for _ in range(2)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    assert transcoder.snapshot()["active"] == 1
+    for thread in threads:
+        thread.join()
+
+    # one upload got the single worker; the other gave up waiting for it
+    assert sum(result is not None for result in results) == 1
+    assert transcoder.snapshot()["queue_timeouts"] == 1 and transcoder.snapshot()["runs"] == 1
+    assert time.monotonic() - started < 1.5
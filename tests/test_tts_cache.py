@@ -0,0 +1,96 @@
+# tests/test_tts_cache.py
+import io
+import os
+import wave
+
+import pytest
+
+import app.speech as speech
+from app.chatbot import FRUSTRATION_REPLIES, HUMAN_SUPPORT_REPLIES, get_session_id_suffix
+from app.tts_cache import TTSCache, join_wavs, split_static_segments, tts_cache_key
+
+
+def make_wav(frames):
+    output = io.BytesIO()
+    with wave.open(output, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(16000)
+        writer.writeframes(b"\x01\x00" * frames)
+    return output.getvalue()
+
+
+def frame_count(path):
+    with wave.open(path, "rb") as reader:
+        return reader.getnframes()
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def azure_calls(tmp_path, monkeypatch):
+    """Swap in an empty cache and count TTS requests; every synthesized clip is 100 frames."""
+    calls = []
+
+    def fake_post(dependency, url, headers, **kwargs):
+        calls.append(kwargs["data"].decode())
+        return FakeResponse(make_wav(100))
+
+    monkeypatch.setattr(speech, "tts_cache", TTSCache(str(tmp_path), max_bytes=10 ** 7, memory_max_bytes=10 ** 6))
+    monkeypatch.setattr(speech, "azure_authorized_post", fake_post)
+    return calls
+
+
+def test_cache_serves_from_disk_after_restart_and_evicts_oldest(tmp_path):
+    clip = make_wav(1000)  # ~2 KB
+    cache = TTSCache(str(tmp_path), max_bytes=len(clip) * 3, memory_max_bytes=len(clip))
+    keys = [tts_cache_key(f"phrase {i}", "en-US-JennyNeural", "riff-16khz-16bit-mono-pcm") for i in range(4)]
+    cache.put(keys[0], clip)
+    cache.put(keys[0], clip)  # two misses for the same text both write it
+    assert cache._disk_bytes == len(clip) and keys[0] in cache
+    for age, key in enumerate(keys):
+        cache.put(key, clip)
+        os.utime(cache._path(key), (age, age))  # distinct ages, oldest first
+
+    assert cache.get(keys[3]) == clip and cache.stats["memory_hits"] == 1
+    assert keys[0] not in cache  # oldest file evicted once the disk tier went over its budget
+    restarted = TTSCache(str(tmp_path), max_bytes=len(clip) * 3, memory_max_bytes=len(clip))
+    assert restarted.get(keys[2]) == clip and restarted.stats["disk_hits"] == 1
+    assert restarted.get(keys[0]) is None and restarted.stats["misses"] == 1
+
+
+def test_static_phrases_are_split_out_and_clips_joined():
+    text = "Please go easy on my voice. Bravur builds software. How can I help?"
+    segments = split_static_segments(text, ["Please go easy on my voice.", "How can I help?"])
+    assert segments == ["Please go easy on my voice.", "Bravur builds software.", "How can I help?"]
+
+    joined = join_wavs([make_wav(10), make_wav(20), make_wav(30)])
+    with wave.open(io.BytesIO(joined), "rb") as reader:
+        assert reader.getnframes() == 60 and reader.getframerate() == 16000
+
+
+def test_prewarmed_phrases_need_no_azure_calls(azure_calls):
+    assert speech.prewarm_tts_cache(languages=("en-US",), audio_formats=("wav",)) == \
+        len(speech.static_tts_phrases("en-US"))
+    azure_calls.clear()
+    assert speech.prewarm_tts_cache(languages=("en-US",), audio_formats=("wav",)) == 0
+
+    path = speech.text_to_speech_rest(speech.VOICE_INTROS["en-US"] + FRUSTRATION_REPLIES["en-US"])
+    assert azure_calls == [] and frame_count(path) == 200
+
+
+def test_only_the_session_id_suffix_is_synthesized_for_a_support_reply(azure_calls):
+    speech.prewarm_tts_cache(languages=("nl-NL",), audio_formats=("wav",))
+    azure_calls.clear()
+    contact, closing = HUMAN_SUPPORT_REPLIES["nl-NL"]
+    suffix = get_session_id_suffix("abc123def", "nl-NL")
+
+    path = speech.text_to_speech_rest(contact + suffix + closing, language="nl-NL")
+    assert len(azure_calls) == 1 and "abc123" in azure_calls[0]
+    assert "nl-NL-FennaNeural" in azure_calls[0] and frame_count(path) == 300
@@ -0,0 +1,64 @@
+# tests/test_tts_pipeline.py
+import base64
+import time
+
+import app.controllers.chat_controller as chat_controller
+import app.speech as speech
+from app.sse import EventStream
+from app.tts_pipeline import SentenceSplitter, SpeechPipeline
+
+
+def test_splitter_releases_sentences_and_keeps_whole_chunks_together():
+    splitter = SentenceSplitter(min_chars=10)
+    pieces = [splitter.feed(token) for token in ["Bravur builds", " software.", " It costs 3.5", "k.", " Ok."]]
+    assert [p for p in pieces if p] == ["Bravur builds software.", "It costs 3.5k."]
+    assert splitter.flush() == "Ok."
+
+    canned = "Glad you liked that! 😊 Let me know if you have more questions."
+    assert splitter.feed(canned + " ") == canned  # one chunk stays one piece
+    assert splitter.feed("Hi. ") is None  # too short on its own: merged with what follows
+    assert splitter.feed("How can I help you today? ") == "Hi. How can I help you today?"
+
+
+def test_pipeline_synthesizes_concurrently_and_returns_clips_in_order():
+    def synthesize(text, language):
+        time.sleep({"one": 0.2, "two": 0.05, "three": 0.1}[text])
+        if text == "two":
+            raise ConnectionError("azure down")
+        return text.upper().encode()
+
+    delivered = []
+    pipeline = SpeechPipeline(synthesize, "en-US", lambda *clip: delivered.append(clip))
+    started = time.monotonic()
+    for text in ("one", "two", "three"):
+        pipeline.submit(text)
+    pipeline.wait()
+    assert delivered == [(0, "one", b"ONE"), (1, "two", None), (2, "three", b"THREE")]
+    assert time.monotonic() - started < 0.3
+
+
+def test_first_sentence_is_spoken_while_the_reply_is_still_streaming(monkeypatch):
+    stream, stored = EventStream(), []
+
+    def fake_turn(user_input, session_id, language):
+        yield "Bravur is an IT consultancy. "
+        deadline = time.monotonic() + 2
+        while not any(event == "audio" for _, event, _ in stream.events) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        yield "It is based in the Netherlands."
+
+    monkeypatch.setattr(chat_controller, "stream_chat_turn", fake_turn)
+    monkeypatch.setattr(chat_controller, "store_message", lambda *args: stored.append(args))
+    monkeypatch.setattr(speech, "synthesize_text", lambda text, language, audio_format: f"wav:{text}".encode())
+    intro = speech.VOICE_INTROS["en-US"]
+    chat_controller._publish_voice_turn(stream, "Who is Bravur?", "session-1", "en-US", intro)
+
+    events = [(event, data) for _, event, data in stream.events]
+    audio = [data for event, data in events if event == "audio"]
+    assert [a["index"] for a in audio] == [0, 1, 2]
+    assert audio[0]["text"] == intro.strip()
+    assert base64.b64decode(audio[2]["audio_base64"]) == b"wav:It is based in the Netherlands."
+    second_token = events.index(("token", {"text": "It is based in the Netherlands."}))
+    assert events.index(("audio", audio[1])) < second_token
+    assert stored[-1] == ("session-1", intro + "Bravur is an IT consultancy. It is based in the Netherlands.", "bot")
+    assert events[-1][0] == "done" and events[-2][1]["first_audio_ms"] is not None
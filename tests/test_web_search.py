@@ -0,0 +1,86 @@
+# tests/test_web_search.py
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.web import SerperClient, SearchCache, normalize_query
+
+
+class MockSerperServer:
+    """Local stand-in for the Serper search endpoint that counts requests."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.requests += 1
+                time.sleep(server.delay)
+                data = json.dumps({"organic": [{"title": body["q"], "link": "https://example.com",
+                                                "snippet": f"result {server.requests}"}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/search"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+@pytest.fixture
+def server():
+    server = MockSerperServer()
+    yield server
+    server.stop()
+
+
+def test_normalize_query():
+    assert normalize_query("  What is  AI?  ") == "what is ai"
+
+
+def test_repeated_search_is_served_from_cache(server):
+    client = SerperClient(api_key="test", url=server.url)
+    first = client.search("What is AI?")
+    second = client.search("what is ai")
+    assert first == second
+    assert server.requests == 1
+    assert client.stats["hits"] == 1
+
+
+def test_concurrent_identical_searches_are_coalesced(server):
+    server.delay = 0.3
+    client = SerperClient(api_key="test", url=server.url)
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = list(pool.map(lambda _: client.search("ai trends"), range(5)))
+    assert server.requests == 1
+    assert all(result == results[0] for result in results)
+
+
+def test_stale_results_are_served_while_refreshing(server):
+    client = SerperClient(api_key="test", url=server.url, cache=SearchCache(ttl_seconds=0.1, stale_seconds=60))
+    first = client.search("ai trends")
+    time.sleep(0.15)
+    stale = client.search("ai trends")
+    assert stale == first
+    assert client.stats["stale_hits"] == 1
+
+    deadline = time.monotonic() + 2
+    while server.requests < 2 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    time.sleep(0.05)
+    assert client.search("ai trends")["organic"][0]["snippet"] == "result 2"
@@ -0,0 +1,126 @@
+# trace_waterfall.py
+"""
+Print the span waterfall of one request from the local trace log.
+
+    python trace_waterfall.py <trace_id>         # waterfall of one trace (the X-Trace-Id response header)
+    python trace_waterfall.py --recent 20        # the latest traces with their duration and intent
+    python trace_waterfall.py --slowest 10       # the slowest traces in the log
+
+Reads TRACE_LOG_PATH (default logs/traces.jsonl) and its rotated backups. Only uses the standard
+library, so it works without the app's environment or services.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+
+BAR_WIDTH = 50
+
+
+def trace_files(path):
+    """The current log first, then rotated backups from newest (.1) to oldest."""
+    backups = sorted(glob.glob(f"{path}.*"), key=lambda name: int(name.rsplit(".", 1)[1]) if
+                     name.rsplit(".", 1)[1].isdigit() else 0)
+    return [name for name in [path] + backups if os.path.exists(name)]
+
+
+def read_traces(path):
+    for name in trace_files(path):
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def find_trace(path, trace_id):
+    for trace in read_traces(path):
+        if trace.get("trace_id") == trace_id:
+            return trace
+    return None
+
+
+def _depths(trace):
+    parents = {span["span_id"]: span.get("parent_span_id") for span in trace["spans"]}
+    root_id = trace["span_id"]
+
+    def depth(span_id):
+        level = 0
+        while span_id and span_id != root_id and level < 20:
+            span_id = parents.get(span_id)
+            level += 1
+        return level
+
+    return {span["span_id"]: depth(span["span_id"]) for span in trace["spans"]}
+
+
+def format_attributes(attributes):
+    return " ".join(f"{key}={value}" for key, value in attributes.items())
+
+
+def render_waterfall(trace):
+    total_ms = trace.get("duration_ms") or max(
+        [(s["start"] - trace["start"]) * 1000 + (s["duration_ms"] or 0) for s in trace["spans"]] or [1])
+    scale = BAR_WIDTH / max(total_ms, 1e-6)
+    depths = _depths(trace)
+
+    lines = [f"Trace {trace['trace_id']}  {trace['name']}  {total_ms:.0f} ms  {format_attributes(trace['attributes'])}"]
+    rows = [(0.0, 0, trace["name"], total_ms, trace.get("status", "ok"), {})]
+    for span in sorted(trace["spans"], key=lambda s: s["start"]):
+        offset = (span["start"] - trace["start"]) * 1000
+        rows.append((offset, depths[span["span_id"]], span["name"], span["duration_ms"] or 0,
+                     span.get("status", "ok"), span.get("attributes", {})))
+
+    label_width = max(len("  " * depth + name) for _, depth, name, _, _, _ in rows) + 2
+    for offset, depth, name, duration, status, attributes in rows:
+        start_col = min(BAR_WIDTH - 1, int(offset * scale))
+        length = max(1, int(duration * scale))
+        bar = " " * start_col + ("!" if status == "error" else "█") * min(length, BAR_WIDTH - start_col)
+        label = ("  " * depth + name).ljust(label_width)
+        lines.append(f"{label}|{bar.ljust(BAR_WIDTH)}| {offset:8.1f} +{duration:8.1f} ms  "
+                     f"{format_attributes(attributes)}".rstrip())
+    if trace.get("dropped_spans"):
+        lines.append(f"({trace['dropped_spans']} spans dropped)")
+    return "\n".join(lines)
+
+
+def render_summary(traces):
+    lines = []
+    for trace in traces:
+        attributes = trace.get("attributes", {})
+        lines.append(f"{trace['trace_id']}  {trace.get('duration_ms', 0):9.1f} ms  {trace['name']:<28} "
+                     f"status={attributes.get('status_code', '-')} intent={attributes.get('intent', '-')}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print request trace waterfalls from the local trace log.")
+    parser.add_argument("trace_id", nargs="?", help="trace id from the X-Trace-Id response header")
+    parser.add_argument("--file", default=os.getenv("TRACE_LOG_PATH", "logs/traces.jsonl"))
+    parser.add_argument("--recent", type=int, metavar="N", help="list the N most recent traces")
+    parser.add_argument("--slowest", type=int, metavar="N", help="list the N slowest traces")
+    args = parser.parse_args(argv)
+
+    if args.trace_id:
+        trace = find_trace(args.file, args.trace_id)
+        if trace is None:
+            print(f"Trace {args.trace_id} not found in {args.file}", file=sys.stderr)
+            return 1
+        print(render_waterfall(trace))
+        return 0
+
+    traces = list(read_traces(args.file))
+    if args.slowest:
+        print(render_summary(sorted(traces, key=lambda t: t.get("duration_ms") or 0, reverse=True)[:args.slowest]))
+    else:
+        print(render_summary(sorted(traces, key=lambda t: t["start"], reverse=True)[:args.recent or 20]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())